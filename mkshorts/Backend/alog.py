@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import signal
+import logging
+import logging.handlers
+import multiprocessing
+
+from proglog import ProgressBarLogger
+
+LOG_PATH = "/app/log/alog.log"
+MAX_BYTES = 5 * 2**20
+BACKUP_COUNT = 3
+
+# Render progress is written at most this often (seconds); verbose mode logs more.
+PROGRESS_INTERVAL = 10.0
+VERBOSE_PROGRESS_INTERVAL = 1.0
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+_listener = None
+# Spawned stage workers log into this; a second listener hands their records to ours
+_worker_queue = None
+_forwarder = None
+_verbose = os.getenv("ALOG_VERBOSE", "") not in ("", "0")
+
+logger = logging.getLogger("mkshorts")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Color escape codes are stripped, structured fields
+    passed as `extra={"event": {...}}` are merged in.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _ANSI.sub("", record.getMessage()),
+        }
+        entry.update(getattr(record, "event", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _stop() -> None:
+    global _listener
+    if _listener is None:
+        return
+    atexit.unregister(_listener.stop)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def _route_to(log_queue) -> None:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.DEBUG if _verbose else logging.INFO)
+
+
+class _ToRoot(logging.Handler):
+    # Hands a worker's record to this process's root logger, i.e. to the writer thread
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger().handle(record)
+
+
+def _start(file_handler: logging.Handler) -> None:
+    global _listener
+    file_handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    _route_to(log_queue)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def setup(path: str = LOG_PATH) -> logging.Logger:
+    """
+    Routes all logging (ours and MoviePy's) through a queue to a single writer thread
+    that owns the rotating log file. Safe to call more than once.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        logging.Logger: The pipeline logger.
+    """
+    if _listener is not None:
+        return logger
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _start(logging.handlers.RotatingFileHandler(
+        path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8"))
+
+    try:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: set_verbose(not _verbose))
+    except ValueError:
+        pass  # not in the main thread
+    return logger
+
+
+def worker_queue():
+    """
+    The queue spawned stage workers log into (see setup_worker). Their records go
+    through the parent's writer thread like its own, so only the parent ever opens,
+    writes or rotates the log file.
+    """
+    global _worker_queue, _forwarder
+    if _worker_queue is None:
+        setup()
+        _worker_queue = multiprocessing.get_context("spawn").Queue()
+        _forwarder = logging.handlers.QueueListener(_worker_queue, _ToRoot())
+        _forwarder.start()
+        atexit.register(_forwarder.stop)
+    return _worker_queue
+
+
+def setup_worker(log_queue, verbose: bool = False) -> logging.Logger:
+    """
+    Logging for a short-lived stage worker process: every record is sent to the
+    parent over `log_queue`, from worker_queue().
+
+    A spawned worker re-imports the parent's __main__ (main.py) before its initializer
+    runs, and that import already called setup(); its listener and file handler are
+    stopped here, so the worker never touches the log file.
+    """
+    global _verbose
+    _verbose = verbose
+    _stop()
+    _route_to(log_queue)
+    return logger
+
+
+def set_verbose(enabled: bool) -> None:
+    """
+    Switches debug logging and frequent progress updates on or off at runtime,
+    also reachable with `kill -USR1 <pid>`.
+    """
+    global _verbose
+    _verbose = enabled
+    logging.getLogger().setLevel(logging.DEBUG if enabled else logging.INFO)
+    logger.info("verbose logging %s", "on" if enabled else "off")
+
+
+def is_verbose() -> bool:
+    return _verbose
+
+
+def log(msg: str, level: int = logging.INFO) -> None:
+    logger.log(level, msg)
+
+
+def event(name: str, level: int = logging.INFO, **fields) -> None:
+    """
+    Logs a structured event, e.g. event("render_done", seconds=12.3, fps=4.1).
+    """
+    logger.log(level, name, extra={"event": dict(fields, event=name)})
+
+
+class ProgressLogger(ProgressBarLogger):
+    """
+    A proglog logger for MoviePy's write_videofile/write_audiofile that turns
+    progress bars into rate-limited progress events instead of terminal output.
+    """
+
+    def __init__(self, label: str):
+        super().__init__()
+        self.label = label
+        self._last = 0.0
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if attr != "index":
+            return
+        now = time.monotonic()
+        total = self.bars[bar].get("total") or 0
+        done = total and value + 1 >= total
+        interval = VERBOSE_PROGRESS_INTERVAL if _verbose else PROGRESS_INTERVAL
+        if not done and now - self._last < interval:
+            return
+        self._last = now
+        event("progress", label=self.label, bar=bar, index=value, total=total)
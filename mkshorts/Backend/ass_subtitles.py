@@ -0,0 +1,121 @@
+import shutil
+import subprocess
+
+from typing import List, Tuple
+from PIL import ImageColor, ImageFont
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+from overlay import SubtitleStyle
+from subtitles import Subtitles
+
+# The Debian ffmpeg in the image is built with libass, the bundled imageio one may not be.
+ASS_FFMPEG_BINARY = shutil.which("ffmpeg") or FFMPEG_BINARY
+
+# numpad-style ASS alignment for "horizontal,vertical" positions
+_ALIGNMENT = {
+    ("left", "bottom"): 1, ("center", "bottom"): 2, ("right", "bottom"): 3,
+    ("left", "center"): 4, ("center", "center"): 5, ("right", "center"): 6,
+    ("left", "top"): 7, ("center", "top"): 8, ("right", "top"): 9,
+}
+
+
+def _ass_color(color: str) -> str:
+    # ASS colors are &HAABBGGRR with inverted alpha (00 = opaque)
+    r, g, b, a = ImageColor.getcolor(color, "RGBA")
+    return f"&H{255 - a:02X}{b:02X}{g:02X}{r:02X}"
+
+
+def _ass_time(seconds: float) -> str:
+    cs = int(round(seconds * 100))
+    h, cs = divmod(cs, 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+def _ass_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("{", "\\{").replace("}", "\\}").replace("\n", "\\N")
+
+
+def to_ass(subtitles: Subtitles, style: SubtitleStyle,
+           video_size: Tuple[int, int] = (1080, 1920)) -> str:
+    """
+    Renders subtitles as an ASS script styled like the MoviePy/NumPy renderers.
+
+    Args:
+        subtitles (Subtitles): The subtitles.
+        style (SubtitleStyle): The subtitle style from CONFIG.
+        video_size (Tuple[int, int]): The frame size, used as the script resolution
+            so that sizes are in output pixels.
+
+    Returns:
+        str: The ASS script.
+    """
+    font_name = ImageFont.truetype(style.font, style.font_size).getname()[0]
+    horizontal, _, vertical = style.position.partition(",")
+    alignment = _ALIGNMENT.get((horizontal.strip(), vertical.strip()), 5)
+
+    has_box = bool(style.bg_color) and ImageColor.getcolor(style.bg_color, "RGBA")[3] > 0
+    back = _ass_color(style.bg_color) if has_box else "&HFF000000"
+    # BorderStyle 4 (libass >= 0.17) draws a BackColour box behind the text and keeps the outline
+    border_style = 4 if has_box else 1
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {video_size[0]}",
+        f"PlayResY: {video_size[1]}",
+        "WrapStyle: 2",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{font_name},{style.font_size},{_ass_color(style.color)},&H000000FF,"
+        f"{_ass_color(style.stroke_color)},{back},0,0,0,0,100,100,0,0,{border_style},"
+        f"{style.stroke_width},0,{alignment},10,10,10,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for (start, end), text in subtitles:
+        lines.append(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{_ass_text(text)}")
+    return "\n".join(lines) + "\n"
+
+
+def _filter_path(path: str) -> str:
+    # paths inside a filtergraph need ':' and quotes escaped
+    return path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+
+
+def burn_ass(video_path: str, audio_path: str, ass_path: str, output_path: str, threads: int, fonts_dir: str = "/app/fonts",
+             extra_args: List[str] = ()) -> str:
+    """
+    Burns an ASS file into a video with ffmpeg's libass filter and muxes the audio.
+
+    Args:
+        video_path (str): The combined background video.
+        audio_path (str): The voiceover.
+        ass_path (str): The ASS subtitles.
+        output_path (str): Where to write the result.
+        threads (int): Encoder threads.
+        fonts_dir (str): Where libass looks up the style's font.
+        extra_args (List[str]): Further output options, e.g. -movflags.
+
+    Returns:
+        str: The output path.
+    """
+    cmd = [
+        ASS_FFMPEG_BINARY, "-y", "-v", "error",
+        "-i", video_path, "-i", audio_path,
+        "-vf", f"ass={_filter_path(ass_path)}:fontsdir={_filter_path(fonts_dir)}",
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "libx264", "-preset", "medium", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-threads", str(threads or 2),
+        *extra_args, "-shortest", output_path,
+    ]
+    print(colored("[+] Burning subtitles with libass...", "blue"))
+    subprocess.run(cmd, check=True)
+    return output_path
@@ -0,0 +1,262 @@
+import os
+import time
+import argparse
+
+from typing import Dict, List
+from termcolor import colored
+
+
+def _print_table(rows: List[Dict], columns: List[str]) -> None:
+    widths = [max([len(c)] + [len(str(r.get(c, ""))) for r in rows]) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(str(r.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
+
+
+def bench_subtitles(combined_video_path: str, tts_path: str, subtitles_path: str, out_dir: str,
+                    renderers: List[str] = ("moviepy", "numpy", "ass"), threads: int = 2,
+                    text_color: str = "#FFFFFF", bg_color: str = "rgba(0, 0, 0, 180)",
+                    subtitles_position: str = "center,center") -> List[Dict]:
+    """
+    Renders the same short with every subtitle backend and compares wall time.
+
+    Args:
+        combined_video_path (str): A combined background video from combine_videos.
+        tts_path (str): The matching voiceover.
+        subtitles_path (str): The matching SRT file.
+        out_dir (str): Where to write one output per renderer.
+        renderers (List[str]): The generate_video backends to compare.
+        threads (int): Encoder threads.
+
+    Returns:
+        List[Dict]: One row per renderer with wall time, realtime factor and output size.
+    """
+    from video import generate_video
+    from subtitles import Subtitles
+    from probe import probe
+
+    with open(subtitles_path) as f:
+        subtitles = Subtitles.from_srt(f.read())
+
+    duration = probe(tts_path).duration
+
+    os.makedirs(out_dir, exist_ok=True)
+    rows = []
+    for renderer in renderers:
+        output_path = os.path.join(out_dir, f"bench_{renderer}.mp4")
+        start = time.perf_counter()
+        generate_video(combined_video_path, tts_path, subtitles, threads, subtitles_position,
+                       text_color, bg_color, subtitle_renderer=renderer, output_path=output_path)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "renderer": renderer,
+            "seconds": f"{elapsed:.1f}",
+            "x realtime": f"{duration / elapsed:.2f}",
+            "MB": f"{os.path.getsize(output_path) / 1e6:.1f}",
+        })
+        print(colored(f"[+] {renderer}: {elapsed:.1f}s", "green"))
+    _print_table(rows, ["renderer", "seconds", "x realtime", "MB"])
+    return rows
+
+
+def bench_quality(reference_path: str, out_dir: str, kbps_list: List[int] = (800, 1200, 2000, 3000, 5000, 8000),
+                  min_ssim: float = 0.98, threads: int = 2) -> List[Dict]:
+    """
+    Encodes one video at several bitrates and scores each against it, to see how
+    few bytes the footage needs before quality visibly drops.
+
+    Args:
+        reference_path (str): A high-quality render to compare against.
+        out_dir (str): Where to write one encode per bitrate.
+        kbps_list (List[int]): The video bitrates to try.
+        min_ssim (float): SSIM regarded as visually lossless.
+        threads (int): Encoder threads.
+
+    Returns:
+        List[Dict]: One row per bitrate with size, PSNR and SSIM.
+    """
+    import subprocess
+    from moviepy.config import FFMPEG_BINARY
+    from bitrate import analyze_complexity, plan_bitrate, encoder_args, quality, FASTSTART_ARGS
+    from probe import probe
+
+    duration = probe(reference_path).duration
+    complexity = analyze_complexity(reference_path)
+    planned = plan_bitrate(complexity, duration)
+    print(colored(f"[+] Complexity {complexity:.0f} kbps, plan_bitrate picks {planned} kbps", "blue"))
+
+    os.makedirs(out_dir, exist_ok=True)
+    rows = []
+    for kbps in sorted(set(kbps_list) | {planned}):
+        output_path = os.path.join(out_dir, f"bench_{kbps}k.mp4")
+        cmd = [FFMPEG_BINARY, "-y", "-v", "error", "-i", reference_path, "-map", "0:v:0",
+               "-c:v", "libx264", "-preset", "medium", "-threads", str(threads),
+               *encoder_args(kbps), *FASTSTART_ARGS, output_path]
+        subprocess.run(cmd, check=True)
+        scores = quality(reference_path, output_path)
+        rows.append({
+            "kbps": f"{kbps}{' (plan)' if kbps == planned else ''}",
+            "MB": f"{os.path.getsize(output_path) / 1e6:.2f}",
+            "PSNR": scores["psnr"],
+            "SSIM": scores["ssim"],
+        })
+    _print_table(rows, ["kbps", "MB", "PSNR", "SSIM"])
+    good = [r for r in rows if r["SSIM"] is not None and r["SSIM"] >= min_ssim]
+    if good:
+        print(colored(f"[+] Cheapest with SSIM >= {min_ssim}: {good[0]['kbps']} kbps", "green"))
+    return rows
+
+
+def bench_segments(combined_video_path: str, tts_path: str, subtitles_path: str, out_dir: str,
+                   workers: int = 2, segment_seconds: float = 10.0, renderer: str = "numpy",
+                   threads: int = 2, text_color: str = "#FFFFFF", bg_color: str = "rgba(0, 0, 0, 180)",
+                   subtitles_position: str = "center,center") -> Dict:
+    """
+    Renders the same short serially and as parallel segments, compares wall time and
+    checks with verify_against_serial that both are the same frame for frame.
+
+    Args:
+        combined_video_path (str): A combined background video from combine_videos.
+        tts_path (str): The matching voiceover.
+        subtitles_path (str): The matching SRT file.
+        out_dir (str): Where to write both outputs.
+        workers (int): Segment workers for the parallel render.
+        segment_seconds (float): Target segment length.
+        renderer (str): The subtitle backend for both renders.
+        threads (int): Encoder threads of the serial render.
+
+    Returns:
+        Dict: The verify_against_serial report with both wall times.
+    """
+    from video import generate_video
+    from segments import verify_against_serial
+    from subtitles import Subtitles
+
+    with open(subtitles_path) as f:
+        subtitles = Subtitles.from_srt(f.read())
+
+    os.makedirs(out_dir, exist_ok=True)
+    rows = []
+    paths = {}
+    for label, render_workers in (("serial", 1), ("segmented", workers)):
+        paths[label] = os.path.join(out_dir, f"bench_{label}.mp4")
+        start = time.perf_counter()
+        generate_video(combined_video_path, tts_path, subtitles, threads, subtitles_position,
+                       text_color, bg_color, subtitle_renderer=renderer, output_path=paths[label],
+                       render_workers=render_workers, segment_seconds=segment_seconds)
+        rows.append({"render": label, "workers": render_workers, "seconds": f"{time.perf_counter() - start:.1f}"})
+    _print_table(rows, ["render", "workers", "seconds"])
+    report = verify_against_serial(paths["segmented"], paths["serial"])
+    report.update({f"{r['render']}_s": float(r["seconds"]) for r in rows})
+    return report
+
+
+def bench_tts(sentences: List[str], voice: str, out_dir: str, backends: List[str] = ("tiktok", "espeak")) -> List[Dict]:
+    """
+    Synthesizes the same sentences with every TTS backend and compares synthesis time
+    with the length of the audio it produced.
+
+    Args:
+        sentences (List[str]): What to speak, one request per sentence.
+        voice (str): The TikTok voice (espeak-ng speaks its language).
+        out_dir (str): Where to write the audio.
+        backends (List[str]): Names of the voices.py backends to compare.
+
+    Returns:
+        List[Dict]: One row per backend with synthesis time, audio length and the
+            real-time factor (synthesis time / audio length; below 1 is faster than real time).
+    """
+    from voices import TikTokBackend, EspeakBackend
+    from probe import probe
+
+    available = {b.name: b for b in (TikTokBackend(), EspeakBackend())}
+    os.makedirs(out_dir, exist_ok=True)
+    rows = []
+    for name in backends:
+        backend = available.get(name)
+        if backend is None:
+            print(colored(f"[-] {name}: unknown backend (choose from {', '.join(available)})", "red"))
+            continue
+        if not backend.available() or not backend.supports(voice):
+            print(colored(f"[-] {name}: not available for {voice}", "red"))
+            continue
+        synth_seconds, audio_seconds, worst = 0.0, 0.0, 0.0
+        try:
+            for i, sentence in enumerate(sentences):
+                path = os.path.join(out_dir, f"bench_{name}_{i}.mp3")
+                start = time.perf_counter()
+                backend.synthesize(sentence, voice, path)
+                elapsed = time.perf_counter() - start
+                synth_seconds += elapsed
+                audio_seconds += probe(path).duration
+                worst = max(worst, elapsed)
+        except Exception as e:
+            print(colored(f"[-] {name}: failed, skipped: {e}", "red"))
+            continue
+        rows.append({
+            "backend": name,
+            "sentences": len(sentences),
+            "synth s": f"{synth_seconds:.2f}",
+            "audio s": f"{audio_seconds:.2f}",
+            "RTF": f"{synth_seconds / audio_seconds:.3f}" if audio_seconds else "",
+            "worst s": f"{worst:.2f}",
+        })
+    if not rows:
+        print(colored("[-] No TTS backend could be benchmarked", "red"))
+        return rows
+    _print_table(rows, ["backend", "sentences", "synth s", "audio s", "RTF", "worst s"])
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline benchmarks.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("subtitles", help="Compare subtitle renderers side by side.")
+    p.add_argument("video")
+    p.add_argument("audio")
+    p.add_argument("srt")
+    p.add_argument("--out", default="/app/temp/bench")
+    p.add_argument("--threads", type=int, default=2)
+    p.add_argument("--renderers", default="moviepy,numpy,ass")
+
+    p = sub.add_parser("quality", help="PSNR/SSIM of bitrate-targeted encodes against a reference.")
+    p.add_argument("reference")
+    p.add_argument("--out", default="/app/temp/bench")
+    p.add_argument("--threads", type=int, default=2)
+    p.add_argument("--kbps", default="800,1200,2000,3000,5000,8000")
+    p.add_argument("--min-ssim", type=float, default=0.98)
+
+    p = sub.add_parser("segments", help="Serial vs segmented render, checked frame for frame.")
+    p.add_argument("video")
+    p.add_argument("audio")
+    p.add_argument("srt")
+    p.add_argument("--out", default="/app/temp/bench")
+    p.add_argument("--threads", type=int, default=2)
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--segment-seconds", type=float, default=10.0)
+    p.add_argument("--renderer", default="numpy")
+
+    p = sub.add_parser("tts", help="Synthesis time and real-time factor per TTS backend.")
+    p.add_argument("text", help="A text file; one request per sentence.")
+    p.add_argument("--voice", default="en_us_002")
+    p.add_argument("--out", default="/app/temp/bench")
+    p.add_argument("--backends", default="tiktok,espeak")
+
+    args = parser.parse_args()
+    if args.bench == "subtitles":
+        bench_subtitles(args.video, args.audio, args.srt, args.out,
+                        renderers=args.renderers.split(","), threads=args.threads)
+    elif args.bench == "quality":
+        bench_quality(args.reference, args.out, [int(k) for k in args.kbps.split(",")],
+                      min_ssim=args.min_ssim, threads=args.threads)
+    elif args.bench == "segments":
+        report = bench_segments(args.video, args.audio, args.srt, args.out, workers=args.workers,
+                                segment_seconds=args.segment_seconds, renderer=args.renderer,
+                                threads=args.threads)
+        if not report["ok"]:
+            raise SystemExit(1)
+    elif args.bench == "tts":
+        with open(args.text) as f:
+            sentences = [s.strip() for s in f.read().split(". ") if s.strip()]
+        bench_tts(sentences, args.voice, args.out, backends=args.backends.split(","))
@@ -0,0 +1,120 @@
+import os
+import re
+import subprocess
+
+from typing import Dict, List, Optional
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+from probe import probe
+
+# The analysis pass encodes a small, low-fps copy with a fixed CRF; the bitrate it
+# needs is the complexity measure
+ANALYSIS_SIZE = (270, 480)
+ANALYSIS_FPS = 12
+ANALYSIS_CRF = 23
+
+# Full-resolution kbps per analysis kbps for visually clean 1080x1920 output
+# (calibrated with `python bench.py quality`)
+COMPLEXITY_SCALE = 6.0
+MIN_VIDEO_KBPS = 1200
+MAX_VIDEO_KBPS = 8000
+AUDIO_KBPS = 128
+
+# Size targets leave this much for container overhead
+CONTAINER_OVERHEAD = 0.02
+
+
+def analyze_complexity(video_path: str) -> float:
+    """
+    Measures how hard footage is to compress with a fast low-resolution encode.
+
+    Args:
+        video_path (str): The video to analyze (usually the combined background).
+
+    Returns:
+        float: The analysis encode's bitrate in kbps; higher means more complex.
+    """
+    w, h = ANALYSIS_SIZE
+    cmd = [FFMPEG_BINARY, "-v", "error", "-i", video_path, "-an",
+           "-vf", f"fps={ANALYSIS_FPS},scale={w}:{h}",
+           "-c:v", "libx264", "-preset", "ultrafast", "-crf", str(ANALYSIS_CRF),
+           "-f", "h264", "-"]
+    bits = len(subprocess.run(cmd, capture_output=True, check=True).stdout) * 8
+    return bits / 1000 / max(probe(video_path).duration, 0.001)
+
+
+def plan_bitrate(complexity_kbps: float, duration: float, target_mb: Optional[float] = None,
+                 target_kbps: Optional[float] = None) -> int:
+    """
+    Allocates a video bitrate: as many bits as the footage needs, but no more than
+    the size or bitrate target allows.
+
+    Args:
+        complexity_kbps (float): From analyze_complexity.
+        duration (float): The output duration in seconds.
+        target_mb (Optional[float]): The whole file's size budget in MB.
+        target_kbps (Optional[float]): An average video bitrate budget.
+
+    Returns:
+        int: The video bitrate in kbps.
+    """
+    ceiling = MAX_VIDEO_KBPS
+    if target_kbps:
+        ceiling = min(ceiling, target_kbps)
+    if target_mb:
+        total_kbps = target_mb * 8000 * (1 - CONTAINER_OVERHEAD) / duration
+        ceiling = min(ceiling, total_kbps - AUDIO_KBPS)
+    wanted = max(MIN_VIDEO_KBPS, complexity_kbps * COMPLEXITY_SCALE)
+    # a size target is a hard limit, even below MIN_VIDEO_KBPS
+    return int(max(100, min(wanted, ceiling)))
+
+
+def encoder_args(video_kbps: int) -> List[str]:
+    """
+    libx264 options for an average bitrate with a bounded peak.
+    """
+    return ["-b:v", f"{video_kbps}k", "-maxrate", f"{int(video_kbps * 1.5)}k",
+            "-bufsize", f"{video_kbps * 2}k"]
+
+
+# moov atom in front, so playback and YouTube processing can start before the end arrives
+FASTSTART_ARGS = ["-movflags", "+faststart"]
+
+
+def report_size(output_path: str, duration: float, video_kbps: int, target_mb: Optional[float] = None) -> Dict:
+    """
+    Compares the achieved file size with the target.
+    """
+    size_mb = os.path.getsize(output_path) / 1e6
+    planned_mb = (video_kbps + AUDIO_KBPS) * duration / 8000
+    report = {
+        "size_mb": round(size_mb, 2),
+        "planned_mb": round(planned_mb, 2),
+        "target_mb": target_mb,
+        "video_kbps": video_kbps,
+        "achieved_kbps": round(size_mb * 8000 / duration, 1),
+        "within_target": target_mb is None or size_mb <= target_mb,
+    }
+    print(colored(f"[+] Output {report['size_mb']} MB (planned {report['planned_mb']} MB"
+                  f"{f', target {target_mb} MB' if target_mb else ''})",
+                  "green" if report["within_target"] else "yellow"))
+    return report
+
+
+def quality(reference_path: str, encoded_path: str) -> Dict:
+    """
+    PSNR and SSIM of an encode against its reference, frame by frame.
+
+    Returns:
+        Dict: {"psnr": average dB, "ssim": average (0-1)}
+    """
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-i", encoded_path, "-i", reference_path,
+           "-lavfi", "[0:v][1:v]ssim;[0:v][1:v]psnr", "-f", "null", "-"]
+    err = subprocess.run(cmd, capture_output=True, text=True).stderr
+    ssim = re.search(r"SSIM .*All:([\d.]+)", err)
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", err)
+    return {
+        "psnr": float(psnr.group(1)) if psnr else None,
+        "ssim": float(ssim.group(1)) if ssim else None,
+    }
@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import time
+import sqlite3
+
+from typing import Dict, List, Optional
+
+CATALOG_PATH = "/app/cache/pexels_catalog.sqlite3"
+
+# A term is answered locally when at least this many known videos match it
+MIN_LOCAL_RESULTS = 5
+# Older entries are not trusted to still be online
+MAX_AGE_DAYS = 90
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    url TEXT,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    image TEXT,
+    renditions TEXT,
+    seen REAL,
+    used INTEGER DEFAULT 0
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS video_words USING fts5(words, tokenize='porter unicode61');
+"""
+
+
+def words(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower())
+
+
+def slug_words(url: str) -> List[str]:
+    # https://www.pexels.com/video/aerial-view-of-a-beach-1234567/ -> aerial view of a beach
+    slug = (url or "").rstrip("/").rsplit("/", 1)[-1]
+    return [w for w in words(slug.replace("-", " ")) if not w.isdigit()]
+
+
+class Catalog:
+    """
+    Every Pexels video we have seen, searchable offline.
+
+    Each video is indexed by its tags, the words of its URL slug and every query
+    that returned it, so a term we have searched before, or one whose words show
+    up in known titles, is answered without calling the API.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+
+    def add(self, videos: List[Dict], query: str) -> None:
+        """
+        Stores the candidates an API search returned.
+
+        Args:
+            videos (List[Dict]): Candidates from search_for_stock_video_candidates,
+                with their Pexels `tags` if any.
+            query (str): The term that found them.
+        """
+        now = time.time()
+        with self.db:
+            for video in videos:
+                row = self.db.execute("SELECT words FROM video_words WHERE rowid = ?", (video["id"],)).fetchone()
+                known = set(row[0].split()) if row else set()
+                known.update(words(query))
+                known.update(slug_words(video.get("url")))
+                for tag in video.get("tags") or []:
+                    known.update(words(tag if isinstance(tag, str) else tag.get("title", "")))
+
+                self.db.execute(
+                    "INSERT OR REPLACE INTO videos (id, url, duration, width, height, image, renditions, seen, used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE((SELECT used FROM videos WHERE id = ?), 0))",
+                    (video["id"], video.get("url"), video.get("duration"), video.get("width"),
+                     video.get("height"), video.get("image"), json.dumps(video["renditions"]), now, video["id"]))
+                self.db.execute("DELETE FROM video_words WHERE rowid = ?", (video["id"],))
+                self.db.execute("INSERT INTO video_words (rowid, words) VALUES (?, ?)",
+                                (video["id"], " ".join(sorted(known))))
+
+    def search(self, query: str, min_dur: int, limit: int) -> List[Dict]:
+        """
+        Finds known videos matching every word of the query.
+
+        Returns:
+            List[Dict]: Candidates in the same shape as the API search, least used
+                and best matching first.
+        """
+        terms = words(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{t}"' for t in terms)
+        rows = self.db.execute(
+            "SELECT v.id, v.url, v.duration, v.width, v.height, v.image, v.renditions "
+            "FROM video_words JOIN videos v ON v.id = video_words.rowid "
+            "WHERE video_words MATCH ? AND v.duration >= ? AND v.seen >= ? "
+            "ORDER BY v.used, bm25(video_words) LIMIT ?",
+            (match, min_dur, time.time() - MAX_AGE_DAYS * 86400, limit)).fetchall()
+        candidates = []
+        for video_id, url, duration, width, height, image, renditions in rows:
+            renditions = json.loads(renditions)
+            candidates.append({
+                "id": video_id,
+                "url": url,
+                "duration": duration,
+                "width": width,
+                "height": height,
+                "image": image,
+                "renditions": renditions,
+                "link": renditions[0]["link"],
+            })
+        return candidates
+
+    def mark_used(self, video_id: int) -> None:
+        """
+        Counts a pick, so the next local search prefers footage we used less.
+        """
+        with self.db:
+            self.db.execute("UPDATE videos SET used = used + 1 WHERE id = ?", (video_id,))
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+
+_catalog: Optional[Catalog] = None
+
+
+def get_catalog() -> Optional[Catalog]:
+    """
+    Opens the catalog once per process, or returns None if SQLite lacks FTS5.
+    """
+    global _catalog
+    if _catalog is None:
+        try:
+            _catalog = Catalog()
+        except sqlite3.OperationalError:
+            return None
+    return _catalog
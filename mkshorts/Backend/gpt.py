@@ -2,8 +2,7 @@ import re
 import os
 # import g4f
 import json
-import openai
-import google.generativeai as genai
+import functools
 
 # from g4f.client import Client
 from termcolor import colored
@@ -17,9 +16,46 @@ load_dotenv(dotenv_path)
 
 # Set environment variables
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-openai.api_key = OPENAI_API_KEY
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-genai.configure(api_key=GOOGLE_API_KEY)
+
+
+# Provider SDKs are heavy (openai pulls in pydantic/httpx, google-generativeai
+# pulls in grpc/protobuf), so each one is imported and configured on first use.
+@functools.lru_cache(maxsize=None)
+def _load_openai():
+    import openai
+    openai.api_key = OPENAI_API_KEY
+    return openai
+
+
+@functools.lru_cache(maxsize=None)
+def _load_genai():
+    import google.generativeai as genai
+    genai.configure(api_key=GOOGLE_API_KEY)
+    return genai
+
+
+def _generate_openai(prompt: str, ai_model: str) -> str:
+    model_name = "gpt-3.5-turbo" if ai_model == "gpt3.5-turbo" else "gpt-4-1106-preview"
+    openai = _load_openai()
+    return openai.chat.completions.create(
+        model=model_name,
+        messages=[{"role": "user", "content": prompt}],
+    ).choices[0].message.content
+
+
+def _generate_gemini(prompt: str, ai_model: str) -> str:
+    genai = _load_genai()
+    model = genai.GenerativeModel('gemini-pro')
+    return model.generate_content(prompt).text
+
+
+# aiModel -> generator. Only the selected provider's SDK is ever imported.
+PROVIDERS = {
+    "gpt3.5-turbo": _generate_openai,
+    "gpt4": _generate_openai,
+    "gemmini": _generate_gemini,
+}
 
 
 def generate_response(prompt: str, ai_model: str) -> str:
@@ -46,26 +82,12 @@ def generate_response(prompt: str, ai_model: str) -> str:
     #         messages=[{"role": "user", "content": prompt}],
     #     ).choices[0].message.content
 
-    if ai_model in ["gpt3.5-turbo", "gpt4"]:
-
-        model_name = "gpt-3.5-turbo" if ai_model == "gpt3.5-turbo" else "gpt-4-1106-preview"
-
-        response = openai.chat.completions.create(
-
-            model=model_name,
-
-            messages=[{"role": "user", "content": prompt}],
-
-        ).choices[0].message.content
-    elif ai_model == 'gemmini':
-        model = genai.GenerativeModel('gemini-pro')
-        response_model = model.generate_content(prompt)
-        response = response_model.text
-
-    else:
-
+    provider = PROVIDERS.get(ai_model)
+    if provider is None:
         raise ValueError("Invalid AI model selected.")
 
+    response = provider(prompt, ai_model)
+
     return response
 
 def generate_script(video_subject: str, paragraph_number: int, ai_model: str, voice: str, customPrompt: str) -> str:
@@ -233,7 +255,30 @@ def get_search_terms(video_subject: str, amount: int, script: str, ai_model: str
     return search_terms
 
 
-def generate_metadata(video_subject: str, script: str, ai_model: str) -> Tuple[str, str, List[str]]:  
+def translate_script(script: str, language: str, ai_model: str) -> str:
+    """
+    Translate a script for a voice in another language, keeping its sentences.
+
+    Args:
+        script (str): The script to translate.
+        language (str): The ISO 639-1 code of the target language, e.g. "ja".
+        ai_model (str): The AI model to use for generation.
+
+    Returns:
+        str: The translated script, one sentence per line.
+    """
+    prompt = f"""
+    Translate the following YouTube shorts script into the language with ISO 639-1 code "{language}".
+    Keep the tone and one translated sentence per original sentence, each on its own line
+    and ending with the sentence punctuation of the target language.
+    Return only the translated script, without quotes or any other text.
+
+    {script}
+    """
+    return generate_response(prompt, ai_model).strip()
+
+
+def generate_metadata(video_subject: str, script: str, ai_model: str, language: str = None) -> Tuple[str, str, List[str]]:  
     """  
     Generate metadata for a YouTube video, including the title, description, and keywords.  
   
@@ -241,6 +286,7 @@ def generate_metadata(video_subject: str, script: str, ai_model: str) -> Tuple[s
         video_subject (str): The subject of the video.  
         script (str): The script of the video.  
         ai_model (str): The AI model to use for generation.  
+        language (str): ISO 639-1 code to write the title and description in; None for English.  
   
     Returns:  
         Tuple[str, str, List[str]]: The title, description, and keywords for the video.  
@@ -250,6 +296,9 @@ def generate_metadata(video_subject: str, script: str, ai_model: str) -> Tuple[s
     title_prompt = f"""  
     Generate a catchy and SEO-friendly title for a YouTube shorts video about {video_subject}.  
     """  
+    # Other-language variants get their title and description in that language
+    language_rule = f"Write it in the language with ISO 639-1 code \"{language}\"." if language else ""
+    title_prompt += language_rule
   
     # Generate title  
     title = generate_response(title_prompt, ai_model).strip()  
@@ -260,6 +309,7 @@ def generate_metadata(video_subject: str, script: str, ai_model: str) -> Tuple[s
     The video is based on the following script:  
     {script}  
     """  
+    description_prompt += language_rule
   
     # Generate description  
     description = generate_response(description_prompt, ai_model).strip()  
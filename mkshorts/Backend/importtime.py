@@ -0,0 +1,120 @@
+import os
+import sys
+import argparse
+import subprocess
+
+from typing import List, Dict
+from termcolor import colored
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cold start budget for `import main` on the Pi 4, in seconds.
+# Can be overridden per host with IMPORT_BUDGET_SECONDS.
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "4.0"))
+
+
+def measure_imports(module: str = "main", python: str = sys.executable) -> List[Dict]:
+    """
+    Imports a module in a fresh interpreter with `-X importtime` and parses the report.
+
+    Args:
+        module (str): The module to import.
+        python (str): The interpreter to use.
+
+    Returns:
+        List[Dict]: One entry per imported module with `name`, `depth`,
+            `self_us` and `cumulative_us`, in the order Python reported them.
+
+    Raises:
+        RuntimeError: If the import itself fails.
+    """
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"import {module} failed:\n{tail}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        entries.append({
+            "name": stripped,
+            # nested imports are indented by two spaces per level
+            "depth": (len(name) - len(stripped) - 1) // 2,
+            "self_us": int(fields[0]),
+            "cumulative_us": int(fields[1]),
+        })
+    return entries
+
+
+def total_seconds(entries: List[Dict]) -> float:
+    """
+    Returns the total import time of all top-level imports in seconds.
+    """
+    return sum(e["cumulative_us"] for e in entries if e["depth"] == 0) / 1e6
+
+
+def report(entries: List[Dict], top: int = 15) -> str:
+    """
+    Formats the slowest top-level imports as a table.
+
+    Args:
+        entries (List[Dict]): Output of `measure_imports`.
+        top (int): Number of rows to show.
+
+    Returns:
+        str: The report.
+    """
+    roots = sorted((e for e in entries if e["depth"] == 0),
+                   key=lambda e: e["cumulative_us"], reverse=True)
+    lines = [f"{'cumulative ms':>14}  {'self ms':>8}  module"]
+    for e in roots[:top]:
+        lines.append(f"{e['cumulative_us'] / 1000:>14.1f}  {e['self_us'] / 1000:>8.1f}  {e['name']}")
+    lines.append(f"total: {total_seconds(entries):.2f}s over {len(entries)} modules")
+    return "\n".join(lines)
+
+
+def check_budget(module: str = "main", budget: float = IMPORT_BUDGET_SECONDS, top: int = 15) -> bool:
+    """
+    Measures the cold start of a module and compares it against the budget.
+
+    Args:
+        module (str): The module to import.
+        budget (float): The allowed import time in seconds.
+        top (int): Number of slowest imports to print.
+
+    Returns:
+        bool: True if the import finished within the budget.
+    """
+    entries = measure_imports(module)
+    print(report(entries, top))
+    total = total_seconds(entries)
+    if total > budget:
+        print(colored(f"[-] Cold start {total:.2f}s exceeds budget of {budget:.2f}s", "red"))
+        return False
+    print(colored(f"[+] Cold start {total:.2f}s within budget of {budget:.2f}s", "green"))
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the pipeline.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    try:
+        ok = check_budget(args.module, args.budget, args.top)
+    except RuntimeError as e:
+        print(colored(f"[-] {e}", "red"))
+        sys.exit(2)
+    sys.exit(0 if ok else 1)
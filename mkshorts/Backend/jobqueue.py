@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+
+import psutil
+
+from typing import Callable, Dict, List, Optional
+from termcolor import colored
+
+from thermal import Scheduler
+
+# Shared between the Pis (NFS/SMB mount). Claims rely on rename() being atomic
+# within one directory tree, leases on the nodes' clocks being NTP-synced.
+QUEUE_DIR = os.getenv("MKSHORTS_QUEUE_DIR", "/app/queue")
+
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 60
+MAX_ATTEMPTS = 3
+
+# A full 1080x1920 render peaks around this much RSS on a Pi 4
+DEFAULT_RENDER_RAM_MB = 1500
+
+_STATES = ("pending", "claimed", "done", "failed", "leases", "nodes")
+
+
+def _write_json(path: str, data: Dict) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def node_capacity() -> Dict:
+    """
+    Returns what this node can offer right now.
+    """
+    return {
+        "cores": psutil.cpu_count(logical=False) or os.cpu_count() or 1,
+        "ram_total_mb": psutil.virtual_memory().total // 2**20,
+        "ram_available_mb": psutil.virtual_memory().available // 2**20,
+        "load1": os.getloadavg()[0],
+    }
+
+
+class JobQueue:
+    """
+    A job queue on a shared directory.
+
+    A job is a JSON file that moves pending/ -> claimed/ -> done/ or failed/ by rename,
+    so exactly one node wins a claim. The claiming node keeps leases/<id>.json fresh;
+    any node may return a job with an expired lease to pending/.
+    """
+
+    def __init__(self, root: str = QUEUE_DIR, node: Optional[str] = None):
+        self.root = root
+        self.node = node or socket.gethostname()
+        for state in _STATES:
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def _path(self, state: str, job_id: str) -> str:
+        return os.path.join(self.root, state, f"{job_id}.json")
+
+    def submit(self, config: Dict, min_ram_mb: int = DEFAULT_RENDER_RAM_MB, cores: int = 1) -> str:
+        """
+        Adds a job.
+
+        Args:
+            config (Dict): CONFIG overrides for this job (videoSubject, voice, youtube, ...).
+            min_ram_mb (int): Available RAM a node needs to take the job.
+            cores (int): Physical cores a node needs to take the job.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        _write_json(self._path("pending", job_id), {
+            "id": job_id,
+            "config": config,
+            "min_ram_mb": min_ram_mb,
+            "cores": cores,
+            "attempts": 0,
+            "created": time.time(),
+        })
+        return job_id
+
+    def jobs(self, state: str = "pending") -> List[Dict]:
+        """
+        Lists jobs in a state, oldest first.
+        """
+        names = sorted(n for n in os.listdir(os.path.join(self.root, state)) if n.endswith(".json"))
+        return [job for job in (_read_json(os.path.join(self.root, state, n)) for n in names) if job]
+
+    def _fits(self, job: Dict, capacity: Dict) -> bool:
+        return (job.get("min_ram_mb", 0) <= capacity["ram_available_mb"]
+                and job.get("cores", 1) <= capacity["cores"])
+
+    def claim(self) -> Optional[Dict]:
+        """
+        Claims the oldest pending job this node has the capacity for.
+
+        Returns:
+            Optional[Dict]: The job, or None if nothing fits.
+        """
+        self.release_stale()
+        capacity = node_capacity()
+        for job in self.jobs("pending"):
+            if not self._fits(job, capacity):
+                continue
+            try:
+                # rename keeps the mtime; a fresh one tells release_stale the claim is
+                # live until its lease is written
+                os.utime(self._path("pending", job["id"]))
+                os.rename(self._path("pending", job["id"]), self._path("claimed", job["id"]))
+            except FileNotFoundError:
+                continue  # another node won
+            job["node"] = self.node
+            job["claimed"] = time.time()
+            _write_json(self._path("claimed", job["id"]), job)
+            self.heartbeat(job["id"])
+            return job
+        return None
+
+    def _owns(self, job: Dict) -> bool:
+        # Still ours: the claimed copy is the one we wrote, and the lease is ours
+        claimed = _read_json(self._path("claimed", job["id"]))
+        lease = _read_json(self._path("leases", job["id"]))
+        return (claimed is not None and claimed.get("node") == self.node
+                and claimed.get("claimed") == job.get("claimed")
+                and lease is not None and lease.get("node") == self.node)
+
+    def heartbeat(self, job_id: str) -> None:
+        claimed = _read_json(self._path("claimed", job_id))
+        if claimed is None or claimed.get("node") != self.node:
+            return  # released meanwhile; never overwrite another node's lease
+        _write_json(self._path("leases", job_id), {
+            "node": self.node,
+            "expires": time.time() + LEASE_SECONDS,
+        })
+
+    def release_stale(self) -> int:
+        """
+        Returns claimed jobs whose lease expired to pending.
+
+        Returns:
+            int: The number of released jobs.
+        """
+        released = 0
+        now = time.time()
+        for job in self.jobs("claimed"):
+            lease = _read_json(self._path("leases", job["id"]))
+            if lease and lease["expires"] > now:
+                continue
+            if lease is None:
+                # just claimed, lease not written yet
+                try:
+                    if os.path.getmtime(self._path("claimed", job["id"])) > now - LEASE_SECONDS:
+                        continue
+                except FileNotFoundError:
+                    continue
+            try:
+                os.rename(self._path("claimed", job["id"]), self._path("pending", job["id"]))
+            except FileNotFoundError:
+                continue
+            self._remove_lease(job["id"])
+            released += 1
+            print(colored(f"[*] Released stale job {job['id']} from {job.get('node')}", "yellow"))
+        return released
+
+    def _remove_lease(self, job_id: str) -> None:
+        try:
+            os.remove(self._path("leases", job_id))
+        except FileNotFoundError:
+            pass
+
+    def _finish(self, job: Dict, state: str) -> None:
+        job["finished"] = time.time()
+        if not self._owns(job):
+            # The lease expired while the job ran and it went back to pending,
+            # possibly to another node. A finished result still counts if the
+            # released copy has not been taken yet; a failure is left to the retry.
+            print(colored(f"[-] Lost the lease on job {job['id']}", "yellow"))
+            if state == "done":
+                try:
+                    os.rename(self._path("pending", job["id"]), self._path("done", job["id"]))
+                except FileNotFoundError:
+                    return  # another node runs it now
+                _write_json(self._path("done", job["id"]), job)
+            return
+        _write_json(self._path("claimed", job["id"]), job)
+        os.rename(self._path("claimed", job["id"]), self._path(state, job["id"]))
+        self._remove_lease(job["id"])
+
+    def complete(self, job: Dict, result: Optional[str] = None) -> None:
+        job["result"] = result
+        self._finish(job, "done")
+
+    def fail(self, job: Dict, error: str) -> None:
+        job["attempts"] = job.get("attempts", 0) + 1
+        job["error"] = error
+        self._finish(job, "failed" if job["attempts"] >= MAX_ATTEMPTS else "pending")
+
+    def advertise(self, metrics: Dict) -> None:
+        _write_json(os.path.join(self.root, "nodes", f"{self.node}.json"),
+                    dict(node_capacity(), node=self.node, updated=time.time(), **metrics))
+
+    def nodes(self) -> List[Dict]:
+        return self.jobs("nodes")
+
+
+class NodeMetrics:
+    """
+    Per-node throughput, published in nodes/<node>.json.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.done = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.current = None
+
+    def as_dict(self) -> Dict:
+        uptime = time.time() - self.started
+        return {
+            "jobs_done": self.done,
+            "jobs_failed": self.failed,
+            "current_job": self.current,
+            "avg_job_seconds": round(self.busy_seconds / self.done, 1) if self.done else None,
+            "jobs_per_hour": round(self.done * 3600 / uptime, 2) if uptime else 0.0,
+            "utilization": round(self.busy_seconds / uptime, 3) if uptime else 0.0,
+        }
+
+
+def run_worker(queue: JobQueue, handler: Callable[[Dict], Optional[str]], poll: int = 30,
+               once: bool = False, thermal: bool = True) -> None:
+    """
+    Pulls jobs and runs them until interrupted.
+
+    Args:
+        queue (JobQueue): The shared queue.
+        handler (Callable[[Dict], Optional[str]]): Runs a job's config, returns a result
+            (e.g. the output path) or None on failure.
+        poll (int): Seconds to wait when no job fits.
+        once (bool): Stop after the first job.
+        thermal (bool): Leave jobs to cooler nodes while this one is hot
+            (CONFIG["thermalScheduling"]).
+    """
+    metrics = NodeMetrics()
+    scheduler = Scheduler()
+    while True:
+        queue.advertise(metrics.as_dict())
+        if thermal and not scheduler.ready():
+            if not once:
+                # a hot node leaves the job to a cooler one instead of rendering throttled
+                time.sleep(poll)
+                continue
+            # a one-shot worker has nowhere to come back to: cool down, then take a job
+            scheduler.wait_until_ready()
+        job = queue.claim()
+        if job is None:
+            if once:
+                return
+            time.sleep(poll)
+            continue
+
+        print(colored(f"[+] {queue.node} took job {job['id']}", "green"))
+        metrics.current = job["id"]
+        queue.advertise(metrics.as_dict())
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT_SECONDS):
+                queue.heartbeat(job["id"])
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        start = time.time()
+        try:
+            # the id keys the job's prefetch manifest, so identical queued jobs stay apart
+            result = handler(dict(job["config"], jobId=job["id"]))
+        except Exception as e:
+            result, error = None, str(e)
+        else:
+            error = "job returned no result"
+        finally:
+            stop.set()
+            beater.join()
+
+        metrics.busy_seconds += time.time() - start
+        metrics.current = None
+        if result is not None:
+            metrics.done += 1
+            queue.complete(job, result)
+        else:
+            metrics.failed += 1
+            queue.fail(job, error)
+            print(colored(f"[-] Job {job['id']} failed: {error}", "red"))
+        if once:
+            queue.advertise(metrics.as_dict())
+            return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared render queue.")
+    parser.add_argument("--queue", default=QUEUE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("submit", help="Queue a short.")
+    p.add_argument("subject")
+    p.add_argument("--voice")
+    p.add_argument("--channel")
+    p.add_argument("--min-ram-mb", type=int, default=DEFAULT_RENDER_RAM_MB)
+
+    p = sub.add_parser("worker", help="Render queued shorts on this node.")
+    p.add_argument("--once", action="store_true")
+    p.add_argument("--poll", type=int, default=30)
+
+    sub.add_parser("status", help="Show jobs and nodes.")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.queue)
+
+    if args.command == "submit":
+        config = {"videoSubject": args.subject}
+        if args.voice:
+            config["voice"] = args.voice
+        if args.channel:
+            config["youtube"] = {"channel_id": args.channel}
+        print(queue.submit(config, min_ram_mb=args.min_ram_mb))
+    elif args.command == "worker":
+        from main import main, CONFIG
+        run_worker(queue, main, poll=args.poll, once=args.once, thermal=CONFIG["thermalScheduling"])
+    else:
+        for state in ("pending", "claimed", "done", "failed"):
+            print(f"{state}: {len(queue.jobs(state))}")
+        for node in queue.nodes():
+            print(json.dumps(node))
@@ -1,10 +1,12 @@
 import os
+import copy
+import functools
 import uuid
 import random
-import datetime
 import gc
-import logging
 import moviepy.config as mpy_config
+import alog
+import ratelimit
 
 from datetime import timedelta
 from termcolor import colored
@@ -12,30 +14,21 @@ from dotenv import load_dotenv
 from moviepy import *
 # from moviepy.audio.fx.all import audio_loop
 from gpt import generate_script, get_search_terms, generate_metadata
-from video import save_video, combine_videos, generate_video, generate_subtitles
-from search import search_for_stock_videos
-from tiktokvoice import tts
-from youtube import upload_video_brand
-import matplotlib
-matplotlib.use('Agg')
+from video import save_video, combine_videos, generate_video, generate_subtitles, render_preview
+from probe import probe
+# 선택 기능(검색/카탈로그/phash, TTS, 음악, 비트레이트, 열 관리, 프로세스 격리, 프로파일링,
+# 업로드)은 실제로 쓰는 곳에서 import — 콜드 스타트 예산은 tests/test_importtime.py가 검사
+
+# matplotlib is only needed by optional plotting code; selecting the backend via
+# the environment avoids importing it on every cold start.
+os.environ.setdefault("MPLBACKEND", "Agg")
 
 def log_to_alog(msg: str):
-    log_dir = "/app/log"
-    os.makedirs(log_dir, exist_ok=True)
-    log_path = os.path.join(log_dir, "alog.log")
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_path, "a") as f:
-        f.write(f"[{timestamp}] {msg}\n")
-
-# logging 설정 (moviepy 내부 로그도 alog.log에 기록)
-logging.basicConfig(
-    filename='/app/log/alog.log',
-    filemode='a',
-    encoding='utf-8',
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
-logger = logging.getLogger(__name__)
+    # 큐에 넣기만 하고 파일 쓰기/로테이션은 alog의 전용 스레드가 처리
+    alog.log(msg)
+
+# moviepy 내부 로그도 같은 큐를 거쳐 alog.log에 기록
+logger = alog.setup()
 mpy_config.logger = logger
 
 log_to_alog("[BOOT] main.py starting (pre-import)")
@@ -69,9 +62,23 @@ CONFIG = {
     "zipUrl": "/app/Songs/songs.zip",
     "paragraphNumber": 1,
     "threads": 1,  # OOM 방지를 위해 동시 작업 수를 1로 고정
+    "renderWorkers": 1,  # 2 이상이면 구간별 병렬 렌더링 (segments.py), 워커당 메모리 예산 내에서만
+    "segmentSeconds": 10,
+    "previewBeforeRender": True,  # 저해상도 미리보기 검사를 통과해야 본 렌더링/업로드 진행
+    "profileRender": False,  # 프레임별 decode/composite/encode 시간을 alog에 기록 (renderprof.py)
+    "flamegraphDir": None,  # 지정하면 렌더링 중 파이썬 스택을 샘플링해 flame graph(.folded)로 저장
+    "targetSizeMB": None,  # 최종 파일 크기 목표(MB), 업로드 시간 절약용. None이면 libx264 기본 CRF
+    "targetKbps": None,  # 또는 평균 영상 비트레이트 상한(kbps)
+    "thermalScheduling": True,  # 과열 시 렌더링 시작을 미루고 스레드 수를 줄임, 스로틀링은 fps와 함께 기록 (thermal.py)
+    "isolateStages": True,  # 합치기/렌더링을 단발성 자식 프로세스에서 실행해 끝나면 메모리를 OS에 반환 (stages.py)
+    "uploadWhileEncoding": False,  # fragmented MP4로 인코딩하면서 동시에 YouTube에 업로드 (streamupload.py)
+    "variants": [],  # variants.py: 같은 배경으로 여러 목소리/언어 버전 생성, 예: [{"voice": "jp_001", "youtube": {...}}]
+    "variantWorkers": 2,  # 동시에 렌더링할 버전 수
+    "jobId": None,  # 공유 큐(jobqueue.py)의 작업 ID, 큐가 채움; prefetch 매니페스트를 작업별로 구분
     "subtitlesPosition": "center,center",
     "color": "#FFFFFF",
     "subtitle_background": "rgba(0, 0, 0, 180)",
+    "subtitleRenderer": "numpy",  # "numpy" (overlay.py), "ass" (ffmpeg libass), "moviepy" (SubtitlesClip)
     "youtube": {
         "channel_id": os.getenv("YOUTUBE_CHANNEL_ID"),
         "privacyStatus": "public",
@@ -92,111 +99,185 @@ def clean_dir(directory):
             except Exception as e:
                 log_to_alog(colored(f"[-] Failed to remove {file}: {e}"))
 
-def extract_songs(zip_path):
-    from zipfile import ZipFile
-    try:
-        with ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(f"{TEMP_DIR}/music")
-        log_to_alog(colored(f"[+] Extracted music: {zip_path}"))
-    except Exception as e:
-        log_to_alog(colored(f"[-] Music extraction failed: {e}"))
-
-def get_music_files():
-    music_dir = f"{TEMP_DIR}/music"
-    return [os.path.join(music_dir, f) for f in os.listdir(music_dir)
-            if f.lower().endswith(('.mp3', '.wav', '.ogg'))]
-
-def search_with_fallback(term, api_key, min_dur=10, max_retry=3):
-    """비디오가 없으면 키워드에 숫자, '4k', 'nature', 'background' 등 추가로 재검색"""
-    fallback_terms = [
-        term + " nature",
-        term + " background",
-        term + " stock",
-        term + " video",
-    ]
-    tried = set()
-    for t in [term] + fallback_terms:
-        if t in tried:
+def job_config(overrides: dict = None) -> dict:
+    """CONFIG에 작업별 설정(videoSubject, voice, youtube 등)을 덮어씌운 복사본"""
+    data = copy.deepcopy(CONFIG)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            data[key].update(value)
+        else:
+            data[key] = value
+    return data
+
+def gather_footage(search_terms: list) -> list:
+    """검색어로 배경 영상을 골라 내려받고, 실제 키프레임 기준으로 거의 같은 영상은 제외한 경로 목록"""
+    from search import select_candidates
+    from catalog import get_catalog
+    from phash import PhashIndex, clip_hashes, is_near_duplicate
+
+    phash_index = PhashIndex()
+    # 검색어는 로컬 카탈로그(/app/cache)에서 먼저 찾고, 부족할 때만 Pexels API 호출
+    candidates = select_candidates(search_terms, os.getenv("PEXELS_API_KEY"), phash_index, get_catalog())
+
+    video_paths = []
+    selected_clips = []
+    for candidate in candidates:
+        url, duration = candidate["link"], candidate["duration"]
+        path = save_video(url)
+        key = f"clip:{url}"
+        # second pass on real keyframes, thumbnails can hide near-identical shots
+        hashes = clip_hashes(path, duration, key, phash_index)
+        if video_paths and is_near_duplicate(hashes, selected_clips, phash_index):
+            log_to_alog(colored(f"[-] Dropped near-duplicate clip: {url}"))
             continue
-        tried.add(t)
-        found = search_for_stock_videos(t, api_key, it=15, min_dur=min_dur)
-        if found:
-            return found
-    return []
+        video_paths.append(path)
+        selected_clips.append(key)
+    phash_index.save()
+    return video_paths
+
+def main(overrides: dict = None):
+    """영상 1개를 생성(및 업로드)하고 최종 파일 경로를 반환, 실패 시 None"""
+    from prefetch import hold_render_lock, load_manifest, discard
+    from thermal import Scheduler, watch
 
-def main():
     audio_clips = []
+    final_video_path = None
+    # 렌더링 중임을 표시 (prefetch 데몬은 이 잠금이 잡혀 있는 동안 쉼)
+    render_lock = hold_render_lock()
     try:
         clean_dir(TEMP_DIR)
         clean_dir(SUBTITLE_DIR)
-        data = CONFIG
+        data = job_config(overrides)
+        if data["profileRender"] or data["flamegraphDir"]:
+            import renderprof
+            renderprof.configure(True, data["flamegraphDir"])
 
-        if data["useMusic"] and data["zipUrl"]:
-            extract_songs(data["zipUrl"])
-            music_files = get_music_files()
-            if not music_files:
+        music_index = {}
+        if data["useMusic"]:
+            from music import build_music_library
+            # decodes only new tracks; afterwards this is a stat per song
+            music_index = build_music_library(data["zipUrl"])
+            if not music_index:
                 log_to_alog(colored("[-] No valid music files"))
                 data["useMusic"] = False
 
+        # 무거운 단계 전에 공유 쿼터 확인 (업로드 1회 = channels.list 1 + videos.insert 1600 units)
+        quota = ratelimit.remaining()
+        alog.event("quota", **quota)
+        if data["automateYoutubeUpload"] and quota["youtube"]["uploads"] < 1:
+            raise ratelimit.QuotaExceeded(f"YouTube quota left today: {quota['youtube']['units']} units")
+        if quota["pexels"]["exhausted"]:
+            # 로컬 카탈로그/prefetch로 충분하면 Pexels 없이도 진행 가능, 부족하면 검색 단계에서 실패
+            log_to_alog(colored(f"[-] Pexels quota exhausted until {quota['pexels']['reset']}, using local footage only", "yellow"))
+
         voice = data["voice"] or "en_us_002"
-        script = generate_script(data["videoSubject"], data["paragraphNumber"], data["aiModel"], voice, data["customPrompt"])
-        search_terms = get_search_terms(data["videoSubject"], 5, script, data["aiModel"])
-
-        video_urls = []
-        for term in search_terms:
-            found = search_with_fallback(term, os.getenv("PEXELS_API_KEY"), min_dur=10)
-            if found:
-                for url in found:
-                    if url not in video_urls:
-                        video_urls.append(url)
-                        break
-            else:
-                log_to_alog(colored(f"[-] No Videos found for '{term}' and fallback terms."))
-
-        video_paths = [save_video(url) for url in video_urls]
-
-        sentences = [s.strip() for s in script.split(". ") if s.strip()]
-        audio_clips = []
-        for sentence in sentences:
-            tts_path = f"{TEMP_DIR}/{uuid.uuid4()}.mp3"
-            tts(sentence, voice, filename=tts_path)
-
-            if not os.path.isfile(tts_path):
-                log_to_alog(colored(f"[-] Failed to create TTS file: {tts_path}"))
-                continue  # skip this sentence
-
-            clip = AudioFileClip(tts_path)
-            audio_clips.append(clip)
+        # 유휴 시간에 prefetch.py가 준비해 둔 대본/영상/TTS가 있으면 네트워크 작업 없이 사용
+        prefetched = load_manifest(data)
+        if prefetched:
+            log_to_alog(colored("[+] Using prefetched script, footage and voiceover", "green"))
+            script, search_terms = prefetched["script"], prefetched["search_terms"]
+            video_paths = [clip["path"] for clip in prefetched["footage"]]
+            audio_paths = prefetched["tts"]["audio_paths"]
+            sentences = prefetched["tts"]["sentences"]
+            durations = prefetched["tts"]["durations"]
+        else:
+            script = generate_script(data["videoSubject"], data["paragraphNumber"], data["aiModel"], voice, data["customPrompt"])
+            search_terms = get_search_terms(data["videoSubject"], 5, script, data["aiModel"])
+
+            video_paths = gather_footage(search_terms)
+
+            from ttsplan import synthesize
+            from tiktokvoice import endpoint_stats
+            from voices import backend_stats
+            sentences = [s.strip() for s in script.split(". ") if s.strip()]
+            # 문장들을 300자 이하 요청으로 묶어 TTS 호출 횟수를 줄임 (문장 경계는 무음 구간으로 복원)
+            audio_paths, sentences, durations = synthesize(sentences, voice, TEMP_DIR)
+            alog.event("tts_endpoints", **endpoint_stats())
+            # TikTok이 막히거나 느리면 espeak-ng로 대체됨 (voices.py)
+            alog.event("tts_backends", **backend_stats())
+        audio_clips = [AudioFileClip(path) for path in audio_paths]
 
         final_audio = concatenate_audioclips(audio_clips)
         tts_path = f"{TEMP_DIR}/{uuid.uuid4()}.mp3"
-        final_audio.write_audiofile(tts_path)
+        final_audio.write_audiofile(tts_path, logger=alog.ProgressLogger("voiceover"))
+
+        subtitles = generate_subtitles(tts_path, sentences, durations, "en")
 
-        subtitles_path = generate_subtitles(tts_path, sentences, audio_clips, "en")
+        voiceover_duration = probe(tts_path).duration
 
-        temp_audio = AudioFileClip(tts_path)
-        combined_path = combine_videos(video_paths, temp_audio.duration, 10, threads=data["threads"])
+        # 여기서부터 인코딩이 이어지므로, 뜨거우면 식을 때까지 기다리고 스레드를 줄임
+        scheduler = Scheduler()
+        if data["thermalScheduling"]:
+            scheduler.wait_until_ready()
+            data["threads"] = scheduler.threads(data["threads"])
+            data["renderWorkers"] = scheduler.threads(data["renderWorkers"])
 
-        final_video_path = generate_video(
+        if data["isolateStages"]:
+            from stages import run_stage
+            # moviepy/numpy 버퍼는 자식 프로세스와 함께 사라지고, 경로와 숫자만 주고받음
+            combine_stage = functools.partial(run_stage, "video", "combine_videos")
+            render_stage = functools.partial(run_stage, "video", "generate_video")
+        else:
+            combine_stage, render_stage = combine_videos, generate_video
+        with watch("combine", scheduler) as w:
+            combined_path = combine_stage(video_paths=video_paths, max_duration=voiceover_duration,
+                                          max_clip_duration=10, threads=data["threads"])
+            w.frames = int(voiceover_duration * 24)
+
+        if data["useMusic"]:
+            from music import mix_music
+            tts_path = mix_music(tts_path, f"{TEMP_DIR}/{uuid.uuid4()}.wav", music_index)
+
+        if data["previewBeforeRender"]:
+            preview = render_preview(
+                combined_video_path=combined_path,
+                tts_path=tts_path,
+                subtitles=subtitles,
+                subtitles_position=data["subtitlesPosition"],
+                text_color=data["color"],
+                bg_color=data["subtitle_background"]
+            )
+            log_to_alog(colored(f"[+] Preview: {preview['preview']}, contact sheet: {preview['sheet']}"))
+            if preview["problems"]:
+                raise Exception(f"Preview checks failed: {'; '.join(preview['problems'])}")
+
+        video_kbps = None
+        if data["targetSizeMB"] or data["targetKbps"]:
+            from bitrate import analyze_complexity, plan_bitrate
+            # 저해상도 분석 인코딩으로 복잡도를 재고, 목표 크기/비트레이트 안에서 필요한 만큼만 할당
+            complexity = analyze_complexity(combined_path)
+            video_kbps = plan_bitrate(complexity, voiceover_duration, data["targetSizeMB"], data["targetKbps"])
+            alog.event("bitrate_plan", complexity_kbps=round(complexity, 1), video_kbps=video_kbps)
+
+        def render(**kwargs):
+            with watch("render", scheduler) as w:
+                path = encode(**kwargs)
+                info = probe(path)
+                w.frames = int(info.duration * (info.fps or 0))
+            return path
+
+        encode = functools.partial(
+            render_stage,
             combined_video_path=combined_path,
             tts_path=tts_path,
-            subtitles_path=subtitles_path,
+            subtitles=subtitles,
             threads=data["threads"],
             subtitles_position=data["subtitlesPosition"],
             text_color=data["color"],
-            bg_color=data["subtitle_background"]
+            bg_color=data["subtitle_background"],
+            subtitle_renderer=data["subtitleRenderer"],
+            render_workers=data["renderWorkers"],
+            segment_seconds=data["segmentSeconds"],
+            video_kbps=video_kbps
         )
 
-        import shutil
-        from pathlib import Path
-        # generate_video에서 반환된 경로(final_video_path)는 이미 절대경로임
-        # 필요시 복사/이동/업로드에 그대로 사용
-        log_to_alog(colored(f"[+] Final file: {final_video_path}"))
-
-        # 업로드 시 uptemp 경로 사용
-        if data["automateYoutubeUpload"]:
+        if data["automateYoutubeUpload"] and data["uploadWhileEncoding"]:
+            # 인코딩 중에 완성된 fragment부터 바로 업로드 (인코딩 + 업로드 시간이 겹침)
+            from youtube import upload_video_brand_streaming
             title, desc, keywords = generate_metadata(data["videoSubject"], script, data["aiModel"])
-            upload_video_brand(
+            final_video_path = "/app/uptemp/output.mp4"
+            upload_video_brand_streaming(
+                render=lambda: render(output_path=final_video_path, fragmented=True),
                 video_path=final_video_path,
                 title=title,
                 description=desc,
@@ -204,11 +285,43 @@ def main():
                 keywords=",".join(keywords),
                 config=data["youtube"]
             )
+        else:
+            final_video_path = render()
+
+            import shutil
+            from pathlib import Path
+            # generate_video에서 반환된 경로(final_video_path)는 이미 절대경로임
+            # 필요시 복사/이동/업로드에 그대로 사용
+            log_to_alog(colored(f"[+] Final file: {final_video_path}"))
+
+            # 업로드 시 uptemp 경로 사용
+            if data["automateYoutubeUpload"]:
+                # oauth2client/apiclient are imported only when an upload actually happens
+                from youtube import upload_video_brand
+                title, desc, keywords = generate_metadata(data["videoSubject"], script, data["aiModel"])
+                upload_video_brand(
+                    video_path=final_video_path,
+                    title=title,
+                    description=desc,
+                    category="28",
+                    keywords=",".join(keywords),
+                    config=data["youtube"]
+                )
+
+        if video_kbps:
+            from bitrate import report_size
+            alog.event("encode_size", **report_size(final_video_path, voiceover_duration, video_kbps,
+                                                     data["targetSizeMB"]))
+
+        if prefetched:
+            discard(data)
 
     except Exception as e:
         log_to_alog(colored(f"[ERROR] {e}"))
+        final_video_path = None
 
     finally:
+        render_lock.close()
         log_to_alog(colored("[Cleanup] Releasing resources...", "magenta"))
         try:
             for clip in audio_clips:
@@ -230,5 +343,7 @@ def main():
         except Exception as e:
             log_to_alog(colored(f"[-] Cleanup failed: {e}"))
 
+    return final_video_path
+
 if __name__ == "__main__":
     main()
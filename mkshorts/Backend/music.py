@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import wave
+import hashlib
+import random
+import zipfile
+import zlib
+import subprocess
+
+import numpy as np
+
+from typing import Dict, Optional
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+SONGS_DIR = "/app/Songs"
+# Decoded PCM lives on the HDD, not in the 2G tmpfs
+MUSIC_CACHE_DIR = "/app/cache/music"
+MUSIC_INDEX_PATH = f"{MUSIC_CACHE_DIR}/index.json"
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+# Every track is normalized to this integrated loudness when it is decoded
+TARGET_LUFS = -16.0
+
+# Music level under the voiceover, and how much further it drops while someone speaks
+MUSIC_GAIN_DB = -14.0
+DUCK_GAIN_DB = -10.0
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg")
+# Looped music is gathered from the memory map this many frames at a time
+LOOP_BLOCK_FRAMES = 10 * SAMPLE_RATE
+
+
+def _analyze(path: str) -> Dict:
+    # One ffmpeg pass gives duration, source sample rate and EBU R128 loudness
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-nostats", "-i", path,
+           "-af", "ebur128", "-f", "null", "-"]
+    err = subprocess.run(cmd, capture_output=True, text=True, check=True).stderr
+    duration = re.search(r"Duration: (\d+):(\d+):([\d.]+)", err)
+    rate = re.search(r"Audio: .*?(\d+) Hz", err)
+    loudness = re.findall(r"I:\s+(-?[\d.]+) LUFS", err)
+    h, m, s = duration.groups() if duration else (0, 0, 0)
+    return {
+        "duration": int(h) * 3600 + int(m) * 60 + float(s),
+        "sample_rate": int(rate.group(1)) if rate else SAMPLE_RATE,
+        # the last I: value is the summary
+        "loudness": float(loudness[-1]) if loudness else TARGET_LUFS,
+    }
+
+
+def _decode(path: str, pcm_path: str, gain_db: float) -> None:
+    cmd = [FFMPEG_BINARY, "-y", "-v", "error", "-i", path, "-af", f"volume={gain_db:.2f}dB",
+           "-f", "s16le", "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE), pcm_path]
+    subprocess.run(cmd, check=True)
+
+
+def load_music_index(index_path: str = MUSIC_INDEX_PATH) -> Dict:
+    if not os.path.isfile(index_path):
+        return {}
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def _file_content(path: str) -> str:
+    # The same "crc:size" a zip member carries, so a song in both places is one track
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            crc = zlib.crc32(chunk, crc)
+    return f"{crc:08x}:{os.path.getsize(path)}"
+
+
+def _add_track(index: Dict, key: str, source: str, stamp: str, content: str) -> None:
+    if index.get(key, {}).get("stamp") == stamp and os.path.isfile(index[key]["pcm"]):
+        index[key]["content"] = content
+        return
+    info = _analyze(source)
+    gain_db = TARGET_LUFS - info["loudness"]
+    pcm_path = os.path.join(MUSIC_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest()[:16] + ".pcm")
+    _decode(source, pcm_path, gain_db)
+    frames = os.path.getsize(pcm_path) // (2 * CHANNELS)
+    if not frames:
+        os.remove(pcm_path)
+        raise ValueError("no audio decoded")
+    index[key] = dict(info, stamp=stamp, pcm=pcm_path, gain_db=gain_db, frames=frames, content=content)
+    print(colored(f"[+] Indexed {key}: {info['duration']:.1f}s, {info['loudness']:.1f} LUFS", "green"))
+
+
+def build_music_library(zip_path: Optional[str] = None, songs_dir: str = SONGS_DIR,
+                        index_path: str = MUSIC_INDEX_PATH) -> Dict:
+    """
+    Indexes every track in the songs directory and zip, decoding new or changed ones
+    once into loudness-normalized PCM. Unchanged tracks cost a stat call. A song that
+    is both in the directory and in the zip (same CRC and size) is indexed once.
+
+    Args:
+        zip_path (Optional[str]): A zip of songs, read member by member.
+        songs_dir (str): A directory of songs.
+        index_path (str): The index file.
+
+    Returns:
+        Dict: Track key -> duration, sample_rate, loudness, gain_db, pcm, frames.
+    """
+    os.makedirs(MUSIC_CACHE_DIR, exist_ok=True)
+    index = load_music_index(index_path)
+    seen = set()
+    # content key -> the track key that holds it
+    contents = {}
+
+    if os.path.isdir(songs_dir):
+        for name in sorted(os.listdir(songs_dir)):
+            path = os.path.join(songs_dir, name)
+            if not name.lower().endswith(AUDIO_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            key = f"file:{name}"
+            stamp = f"{st.st_mtime_ns}:{st.st_size}"
+            try:
+                entry = index.get(key, {})
+                content = (entry.get("stamp") == stamp and entry.get("content")) or _file_content(path)
+                if content in contents:
+                    continue
+                contents[content] = key
+                seen.add(key)
+                _add_track(index, key, path, stamp, content)
+            except Exception as e:
+                print(colored(f"[-] Could not index {path}: {e}", "red"))
+
+    if zip_path and os.path.isfile(zip_path):
+        with zipfile.ZipFile(zip_path) as zf:
+            for member in zf.infolist():
+                if not member.filename.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+                key = f"zip:{member.filename}"
+                stamp = f"{member.CRC}:{member.file_size}"
+                content = f"{member.CRC:08x}:{member.file_size}"
+                if content in contents:
+                    print(colored(f"[*] {member.filename} is already indexed as {contents[content]}", "yellow"))
+                    continue
+                contents[content] = key
+                seen.add(key)
+                if index.get(key, {}).get("stamp") == stamp and os.path.isfile(index[key]["pcm"]):
+                    index[key]["content"] = content
+                    continue
+                # extracted once for decoding, never at render time
+                tmp_path = os.path.join(MUSIC_CACHE_DIR, "extract" + os.path.splitext(member.filename)[1])
+                try:
+                    with zf.open(member) as src, open(tmp_path, "wb") as dst:
+                        dst.write(src.read())
+                    _add_track(index, key, tmp_path, stamp, content)
+                except Exception as e:
+                    print(colored(f"[-] Could not index {member.filename}: {e}", "red"))
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+    # removed from disk, or now a duplicate of another track
+    for key in set(index) - seen:
+        if os.path.isfile(index[key]["pcm"]):
+            os.remove(index[key]["pcm"])
+        del index[key]
+
+    tmp_index = f"{index_path}.tmp"
+    with open(tmp_index, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_index, index_path)
+    return index
+
+
+def _read_voice(path: str) -> np.ndarray:
+    cmd = [FFMPEG_BINARY, "-v", "error", "-i", path,
+           "-f", "s16le", "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE), "-"]
+    raw = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(raw, dtype=np.int16).reshape(-1, CHANNELS)
+
+
+def duck_gain(voice: np.ndarray, block: int = SAMPLE_RATE // 100, smooth_blocks: int = 20) -> np.ndarray:
+    """
+    Per-sample music gain that drops by DUCK_GAIN_DB wherever the voice is active.
+
+    Args:
+        voice (np.ndarray): (n, channels) int16 voiceover.
+        block (int): Envelope block size in samples (10ms).
+        smooth_blocks (int): Gain ramp length in blocks.
+
+    Returns:
+        np.ndarray: (n, 1) float32 linear gain.
+    """
+    n = len(voice)
+    blocks = -(-n // block)
+    padded = np.zeros((blocks * block, voice.shape[1]), dtype=np.float32)
+    padded[:n] = voice
+    rms = np.sqrt((padded.reshape(blocks, -1) ** 2).mean(axis=1))
+    active = rms > max(rms.max() * 0.05, 1.0)
+
+    db = np.where(active, MUSIC_GAIN_DB + DUCK_GAIN_DB, MUSIC_GAIN_DB).astype(np.float32)
+    kernel = np.ones(smooth_blocks, dtype=np.float32) / smooth_blocks
+    db = np.convolve(np.pad(db, (smooth_blocks // 2, smooth_blocks - 1 - smooth_blocks // 2), mode="edge"),
+                     kernel, mode="valid")
+    gain = np.power(10.0, db / 20.0, dtype=np.float32)
+    return np.repeat(gain, block)[:n, None]
+
+
+def mix_music(voice_path: str, output_path: str, index: Dict, track: Optional[str] = None) -> str:
+    """
+    Mixes a library track under a voiceover and writes a WAV file.
+
+    The track is read through a memory map of its cached PCM, looped if it is
+    shorter than the voiceover, and ducked while the voice is active. Only the
+    frames the mix needs are read. Without a playable track the voiceover is
+    returned unchanged.
+
+    Args:
+        voice_path (str): The voiceover.
+        output_path (str): The WAV file to write.
+        index (Dict): The music index from build_music_library.
+        track (Optional[str]): A track key, random if omitted.
+
+    Returns:
+        str: The output path, or voice_path if there was nothing to mix.
+    """
+    # an empty PCM file cannot be memory-mapped (or looped)
+    playable = [k for k, e in index.items() if e.get("frames") and os.path.isfile(e["pcm"])]
+    key = track if track in playable else (random.choice(playable) if playable and not track else None)
+    if key is None:
+        print(colored(f"[-] No playable music track{f' {track}' if track else ''}, voiceover left as is", "yellow"))
+        return voice_path
+    voice = _read_voice(voice_path)
+    n = len(voice)
+    music = np.memmap(index[key]["pcm"], dtype=np.int16, mode="r").reshape(-1, CHANNELS)
+
+    m = len(music)
+    start = random.randint(0, m - n) if m >= n else 0
+    mixed = np.empty((n, CHANNELS), dtype=np.float32)
+    for i in range(0, n, LOOP_BLOCK_FRAMES):
+        frames = np.arange(start + i, start + min(n, i + LOOP_BLOCK_FRAMES)) % m
+        mixed[i:i + len(frames)] = music[frames]
+    mixed *= duck_gain(voice)
+    mixed += voice
+    np.clip(mixed, -32768, 32767, out=mixed)
+
+    with wave.open(output_path, "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(mixed.astype(np.int16).tobytes())
+    print(colored(f"[+] Mixed music '{key}' under voiceover", "green"))
+    return output_path
+
+
+if __name__ == "__main__":
+    # Index ahead of time so the first render does not pay for decoding
+    library = build_music_library("/app/Songs/songs.zip")
+    print(colored(f"[+] {len(library)} tracks indexed", "green"))
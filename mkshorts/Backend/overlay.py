@@ -0,0 +1,135 @@
+import math
+import functools
+
+import numpy as np
+
+from typing import Tuple, NamedTuple
+from PIL import Image, ImageDraw, ImageFont, ImageColor
+
+from subtitles import Subtitles
+
+# Padding around the text inside its background box, in pixels.
+BOX_PADDING = 12
+
+
+class SubtitleStyle(NamedTuple):
+    font: str = "/app/fonts/bold_font.ttf"
+    font_size: int = 100
+    color: str = "#FFFFFF"
+    bg_color: str = "rgba(0, 0, 0, 180)"
+    stroke_color: str = "black"
+    stroke_width: int = 5
+    interline: int = 3
+    position: str = "center,center"
+
+
+class Patch(NamedTuple):
+    """
+    A rasterized subtitle, ready to blend: `premul` holds color * alpha and `inv_alpha`
+    holds 255 - alpha, both as uint32 so blending needs no conversion per frame.
+    """
+    premul: np.ndarray
+    inv_alpha: np.ndarray
+    w: int
+    h: int
+
+
+@functools.lru_cache(maxsize=8)
+def _font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(path, size)
+
+
+@functools.lru_cache(maxsize=256)
+def rasterize(text: str, style: SubtitleStyle) -> Patch:
+    """
+    Draws a subtitle once into a tight RGBA patch. Results are cached by text and style.
+
+    Args:
+        text (str): The subtitle text, may contain line breaks.
+        style (SubtitleStyle): How to draw it.
+
+    Returns:
+        Patch: The premultiplied patch.
+    """
+    font = _font(style.font, style.font_size)
+    probe = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    left, top, right, bottom = probe.multiline_textbbox(
+        (0, 0), text, font=font, spacing=style.interline,
+        stroke_width=style.stroke_width, align="center")
+    w = math.ceil(right - left) + 2 * BOX_PADDING
+    h = math.ceil(bottom - top) + 2 * BOX_PADDING
+
+    image = Image.new("RGBA", (w, h), ImageColor.getrgb(style.bg_color) if style.bg_color else (0, 0, 0, 0))
+    layer = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    ImageDraw.Draw(layer).multiline_text(
+        (BOX_PADDING - left, BOX_PADDING - top), text, font=font,
+        fill=style.color, spacing=style.interline, align="center",
+        stroke_width=style.stroke_width, stroke_fill=style.stroke_color)
+    rgba = np.asarray(Image.alpha_composite(image, layer), dtype=np.uint32)
+
+    alpha = rgba[:, :, 3:4]
+    premul = rgba[:, :, :3] * alpha
+    return Patch(premul=premul, inv_alpha=np.broadcast_to(255 - alpha, premul.shape).copy(), w=w, h=h)
+
+
+def place(patch: Patch, frame_w: int, frame_h: int, position: str) -> Tuple[int, int]:
+    """
+    Returns the top-left corner of a patch for a "horizontal,vertical" position string.
+    """
+    horizontal, _, vertical = position.partition(",")
+    x = {"left": 0, "right": frame_w - patch.w}.get(horizontal.strip(), (frame_w - patch.w) // 2)
+    y = {"top": 0, "bottom": frame_h - patch.h}.get(vertical.strip(), (frame_h - patch.h) // 2)
+    return x, y
+
+
+def blend(frame: np.ndarray, patch: Patch, x: int, y: int) -> None:
+    """
+    Alpha-blends a patch into a uint8 RGB frame in place, touching only its bounding box.
+    """
+    fh, fw = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + patch.w, fw), min(y + patch.h, fh)
+    if x0 >= x1 or y0 >= y1:
+        return
+    px, py = x0 - x, y0 - y
+    roi = frame[y0:y1, x0:x1]
+    acc = roi.astype(np.uint32)
+    acc *= patch.inv_alpha[py:py + y1 - y0, px:px + x1 - x0]
+    acc += patch.premul[py:py + y1 - y0, px:px + x1 - x0]
+    # exact division by 255 with rounding for values up to 255 * 255
+    acc += 128
+    acc += acc >> 8
+    acc >>= 8
+    roi[...] = acc
+
+
+def burn_subtitles(clip, subtitles: Subtitles, style: SubtitleStyle):
+    """
+    Returns the clip with subtitles blended into its frames.
+
+    Frames without an active subtitle are passed through untouched, the others are
+    copied once and the patch is blended into the copy.
+
+    Args:
+        clip (VideoClip): The background clip.
+        subtitles (Subtitles): The subtitles, sorted by start time.
+        style (SubtitleStyle): How to draw them.
+
+    Returns:
+        VideoClip: The subtitled clip.
+    """
+    texts = subtitles.texts
+
+    def overlay(get_frame, t):
+        frame = get_frame(t)
+        i = subtitles.active(t)
+        if i < 0 or not texts[i].strip():
+            return frame
+        patch = rasterize(texts[i], style)
+        # readers and ColorClip hand out their cached array, never write into it
+        frame = frame.copy()
+        x, y = place(patch, frame.shape[1], frame.shape[0], style.position)
+        blend(frame, patch, x, y)
+        return frame
+
+    return clip.transform(overlay, apply_to=[])
@@ -0,0 +1,185 @@
+import io
+import os
+import subprocess
+
+import numpy as np
+import requests
+
+from typing import List, Dict, Iterable, Optional, Tuple
+from PIL import Image
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+# Persistent on the HDD so hashes survive the tmpfs /app/temp being wiped.
+PHASH_INDEX_PATH = "/app/cache/phash_index.npz"
+
+# Two clips whose closest pair of 64-bit dHashes differs in at most this many
+# bits are treated as the same footage.
+DUPLICATE_DISTANCE = 10
+
+# Relative positions of the keyframes sampled from a downloaded clip.
+KEYFRAME_POSITIONS = (0.2, 0.5, 0.8)
+
+_HASH_W, _HASH_H = 9, 8
+
+
+def dhash(gray: np.ndarray) -> np.uint64:
+    """
+    Computes the 64-bit difference hash of a 8x9 grayscale image.
+
+    Args:
+        gray (np.ndarray): A (8, 9) array of luma values.
+
+    Returns:
+        np.uint64: The hash.
+    """
+    bits = (gray[:, 1:] > gray[:, :-1]).ravel()
+    return np.packbits(bits).view(">u8")[0].astype(np.uint64)
+
+
+def image_hash(image: Image.Image) -> np.uint64:
+    small = image.convert("L").resize((_HASH_W, _HASH_H), Image.BILINEAR)
+    return dhash(np.asarray(small, dtype=np.int16))
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise Hamming distances between two sets of 64-bit hashes.
+
+    Args:
+        a (np.ndarray): (n,) uint64 hashes.
+        b (np.ndarray): (m,) uint64 hashes.
+
+    Returns:
+        np.ndarray: (n, m) distances.
+    """
+    x = np.bitwise_xor(a.astype(np.uint64)[:, None], b.astype(np.uint64)[None, :])
+    return np.unpackbits(x.view(np.uint8).reshape(x.shape + (8,)), axis=-1).sum(axis=-1)
+
+
+class PhashIndex:
+    """
+    Perceptual hashes of stock footage, keyed by thumbnail (`thumb:<pexels id>`)
+    or downloaded clip (`clip:<link>`). A key can own several hashes.
+    """
+
+    def __init__(self, path: str = PHASH_INDEX_PATH):
+        self.path = path
+        self.keys = np.empty(0, dtype=object)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        if os.path.isfile(path):
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    self.keys = data["keys"].astype(object)
+                    self.hashes = data["hashes"].astype(np.uint64)
+            except Exception as e:
+                print(colored(f"[-] Could not read phash index, starting empty: {e}", "yellow"))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        found = self.hashes[self.keys == key]
+        return found if len(found) else None
+
+    def add(self, key: str, hashes: Iterable) -> None:
+        hashes = np.asarray(list(hashes), dtype=np.uint64)
+        keep = self.keys != key
+        self.keys = np.concatenate([self.keys[keep], np.full(len(hashes), key, dtype=object)])
+        self.hashes = np.concatenate([self.hashes[keep], hashes])
+
+    def nearest(self, hashes: np.ndarray, among: Iterable[str]) -> Tuple[Optional[str], int]:
+        """
+        Finds the closest entry among the given keys.
+
+        Args:
+            hashes (np.ndarray): The query hashes.
+            among (Iterable[str]): Keys to compare against.
+
+        Returns:
+            Tuple[Optional[str], int]: The closest key and its distance, or (None, 65).
+        """
+        mask = np.isin(self.keys, list(among))
+        if not mask.any() or len(hashes) == 0:
+            return None, 65
+        dist = hamming(np.asarray(hashes, dtype=np.uint64), self.hashes[mask]).min(axis=0)
+        i = int(dist.argmin())
+        return self.keys[mask][i], int(dist[i])
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=self.keys.astype(str), hashes=self.hashes)
+        os.replace(tmp_path, self.path)
+
+
+def thumbnail_hashes(candidate: Dict, index: PhashIndex) -> Optional[np.ndarray]:
+    """
+    Returns the hash of a search candidate's Pexels thumbnail, downloading it once.
+
+    Args:
+        candidate (Dict): A candidate from `search_for_stock_video_candidates`.
+        index (PhashIndex): The index to read from and add to.
+
+    Returns:
+        Optional[np.ndarray]: The hashes, or None if there is no usable thumbnail.
+    """
+    key = f"thumb:{candidate['id']}"
+    cached = index.get(key)
+    if cached is not None:
+        return cached
+    if not candidate.get("image"):
+        return None
+    try:
+        r = requests.get(candidate["image"], params={"w": 64}, timeout=10)
+        r.raise_for_status()
+        hashes = [image_hash(Image.open(io.BytesIO(r.content)))]
+    except Exception as e:
+        print(colored(f"[-] Thumbnail hash failed for {candidate['id']}: {e}", "yellow"))
+        return None
+    index.add(key, hashes)
+    return index.get(key)
+
+
+def _keyframe(video_path: str, t: float) -> np.ndarray:
+    # Let ffmpeg seek and shrink the frame so Python never sees a full frame.
+    cmd = [FFMPEG_BINARY, "-v", "error", "-ss", f"{t:.3f}", "-i", video_path,
+           "-frames:v", "1", "-vf", f"scale={_HASH_W}:{_HASH_H}",
+           "-f", "rawvideo", "-pix_fmt", "gray", "-"]
+    raw = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(raw[:_HASH_W * _HASH_H], dtype=np.uint8).reshape(_HASH_H, _HASH_W).astype(np.int16)
+
+
+def clip_hashes(video_path: str, duration: float, key: str, index: PhashIndex) -> np.ndarray:
+    """
+    Returns the hashes of a few keyframes of a downloaded clip, computing them once.
+
+    Args:
+        video_path (str): The clip on disk.
+        duration (float): The clip duration in seconds.
+        key (str): The index key of the clip, usually `clip:<link>`.
+        index (PhashIndex): The index to read from and add to.
+
+    Returns:
+        np.ndarray: The keyframe hashes.
+    """
+    cached = index.get(key)
+    if cached is not None:
+        return cached
+    hashes = []
+    for pos in KEYFRAME_POSITIONS:
+        try:
+            hashes.append(dhash(_keyframe(video_path, duration * pos)))
+        except Exception as e:
+            print(colored(f"[-] Keyframe hash failed at {pos:.0%} of {video_path}: {e}", "yellow"))
+    index.add(key, hashes)
+    return index.get(key) if hashes else np.empty(0, dtype=np.uint64)
+
+
+def is_near_duplicate(hashes: Optional[np.ndarray], among: List[str], index: PhashIndex,
+                      max_distance: int = DUPLICATE_DISTANCE) -> bool:
+    if hashes is None or not among:
+        return False
+    key, distance = index.nearest(hashes, among)
+    if distance <= max_distance:
+        print(colored(f"[*] Near-duplicate of {key} (distance {distance})", "yellow"))
+        return True
+    return False
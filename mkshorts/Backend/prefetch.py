@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import argparse
+import subprocess
+
+import requests
+
+from typing import Dict, List, Optional
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+# Everything lives on the HDD so it survives the tmpfs /app/temp being wiped
+PREFETCH_DIR = "/app/cache/prefetch"
+FOOTAGE_DIR = "/app/cache/footage"
+# Held (shared) by every running main(); the prefetcher backs off while it is
+RENDER_LOCK_PATH = "/app/cache/render.lock"
+
+# Download cap for prefetching, bytes per second
+BANDWIDTH_BPS = int(os.getenv("MKSHORTS_PREFETCH_BPS", 2 * 2**20))
+# Only work while the 1-minute load average per core is below this
+MAX_LOAD_PER_CORE = 0.5
+# Oldest normalized footage is removed above this size
+FOOTAGE_CACHE_MB = 4000
+# Normalized clips are cut to this length; combine_videos uses at most 10 s per clip
+NORMALIZE_SECONDS = 20
+# How many pending jobs ahead to prepare
+HORIZON_JOBS = 5
+
+CHUNK_BYTES = 256 * 2**10
+
+
+def prefetch_key(config: Dict) -> str:
+    """
+    Identifies a job: by its queue id, so two identical queued jobs get their own
+    manifests, or otherwise by what determines its script, footage and voiceover.
+    """
+    if config.get("jobId"):
+        return config["jobId"]
+    fields = {k: config.get(k) for k in ("videoSubject", "paragraphNumber", "aiModel", "voice", "customPrompt")}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def hold_render_lock():
+    """
+    Marks a render as running until the returned file is closed.
+    """
+    os.makedirs(os.path.dirname(RENDER_LOCK_PATH), exist_ok=True)
+    f = open(RENDER_LOCK_PATH, "a")
+    fcntl.flock(f, fcntl.LOCK_SH)
+    return f
+
+
+def render_active() -> bool:
+    if not os.path.exists(RENDER_LOCK_PATH):
+        return False
+    with open(RENDER_LOCK_PATH, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+    return False
+
+
+def is_idle() -> bool:
+    return not render_active() and os.getloadavg()[0] / (os.cpu_count() or 1) < MAX_LOAD_PER_CORE
+
+
+def wait_until_idle(poll: float = 15) -> None:
+    while not is_idle():
+        time.sleep(poll)
+
+
+def _manifest_path(key: str) -> str:
+    return os.path.join(PREFETCH_DIR, key, "manifest.json")
+
+
+def _save_manifest(key: str, manifest: Dict) -> None:
+    path = _manifest_path(key)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_manifest(config: Dict) -> Optional[Dict]:
+    """
+    Returns what was prefetched for a job, or None if nothing complete is on disk.
+    """
+    try:
+        with open(_manifest_path(prefetch_key(config))) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not manifest.get("complete"):
+        return None
+    files = [c["path"] for c in manifest["footage"]] + manifest["tts"]["audio_paths"]
+    if not all(os.path.isfile(path) for path in files):
+        return None
+    return manifest
+
+
+def discard(config: Dict) -> None:
+    """
+    Removes a job's manifest and voiceover once it has been rendered; footage stays cached.
+    """
+    shutil.rmtree(os.path.join(PREFETCH_DIR, prefetch_key(config)), ignore_errors=True)
+
+
+def footage_path(url: str) -> str:
+    return os.path.join(FOOTAGE_DIR, f"{hashlib.sha1(url.encode()).hexdigest()}.mp4")
+
+
+def download(url: str, path: str, bps: int = BANDWIDTH_BPS) -> None:
+    """
+    Downloads at no more than bps, pausing while a render runs.
+    """
+    start, received = time.monotonic(), 0
+    with requests.get(url, stream=True, timeout=30) as r, open(f"{path}.part", "wb") as f:
+        r.raise_for_status()
+        for chunk in r.iter_content(CHUNK_BYTES):
+            f.write(chunk)
+            received += len(chunk)
+            ahead = received / bps - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+            if render_active():
+                paused = time.monotonic()
+                wait_until_idle()
+                start += time.monotonic() - paused
+    os.replace(f"{path}.part", path)
+
+
+def normalize(src: str, dst: str, seconds: float = NORMALIZE_SECONDS) -> None:
+    """
+    Crops to 9:16, scales to 1080x1920 at 24 fps and drops audio, like combine_videos,
+    at the lowest CPU priority with one thread. combine_videos then has nothing to
+    crop or resize.
+    """
+    vf = ("crop='if(lt(iw/ih,9/16),iw,ih*9/16)':'if(lt(iw/ih,9/16),iw*16/9,ih)',"
+          "scale=1080:1920,fps=24,setsar=1")
+    cmd = ["nice", "-n", "19", FFMPEG_BINARY, "-y", "-v", "error", "-i", src, "-t", str(seconds),
+           "-vf", vf, "-an", "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+           "-threads", "1", f"{dst}.tmp.mp4"]
+    subprocess.run(cmd, check=True)
+    os.replace(f"{dst}.tmp.mp4", dst)
+
+
+def _manifest_footage() -> set:
+    # clips a prefetched job that has not been rendered (discarded) yet still needs
+    paths = set()
+    if not os.path.isdir(PREFETCH_DIR):
+        return paths
+    for key in os.listdir(PREFETCH_DIR):
+        try:
+            with open(_manifest_path(key)) as f:
+                paths.update(c["path"] for c in json.load(f).get("footage", []))
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            continue
+    return paths
+
+
+def trim_footage_cache(limit_mb: int = FOOTAGE_CACHE_MB) -> None:
+    """
+    Removes the oldest normalized footage above limit_mb, with its probe sidecars.
+    Nothing is removed while a render runs, nor any clip a saved manifest lists.
+    """
+    from probe import SIDECAR_SUFFIX
+
+    if not os.path.isdir(FOOTAGE_DIR) or render_active():
+        return
+    names = os.listdir(FOOTAGE_DIR)
+    for name in names:
+        if name.endswith(SIDECAR_SUFFIX) and name[:-len(SIDECAR_SUFFIX)] not in names:
+            os.remove(os.path.join(FOOTAGE_DIR, name))
+
+    files = [os.path.join(FOOTAGE_DIR, n) for n in names if n.endswith(".mp4")]
+    files.sort(key=os.path.getmtime)
+    total = sum(os.path.getsize(f) for f in files)
+    keep = _manifest_footage()
+    for path in files:
+        if total <= limit_mb * 2**20 or render_active():
+            break
+        if path in keep:
+            continue
+        total -= os.path.getsize(path)
+        os.remove(path)
+        if os.path.exists(path + SIDECAR_SUFFIX):
+            os.remove(path + SIDECAR_SUFFIX)
+
+
+def prefetch_job(config: Dict) -> Dict:
+    """
+    Prepares a job stage by stage: script and search terms, normalized footage,
+    voiceover. Each finished stage is saved, so an interrupted prefetch resumes.
+
+    Args:
+        config (Dict): The job's full config (CONFIG merged with its overrides).
+
+    Returns:
+        Dict: The manifest main() picks up.
+    """
+    from gpt import generate_script, get_search_terms
+    from search import select_candidates
+    from catalog import get_catalog
+    from phash import PhashIndex, clip_hashes, is_near_duplicate
+    from ttsplan import synthesize
+
+    key = prefetch_key(config)
+    job_dir = os.path.join(PREFETCH_DIR, key)
+    os.makedirs(job_dir, exist_ok=True)
+    os.makedirs(FOOTAGE_DIR, exist_ok=True)
+    manifest = {}
+    try:
+        with open(_manifest_path(key)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    if manifest.get("complete"):
+        return manifest
+
+    voice = config["voice"] or "en_us_002"
+    if "script" not in manifest:
+        manifest["script"] = generate_script(config["videoSubject"], config["paragraphNumber"],
+                                             config["aiModel"], voice, config["customPrompt"])
+        manifest["search_terms"] = get_search_terms(config["videoSubject"], 5, manifest["script"], config["aiModel"])
+        _save_manifest(key, manifest)
+
+    if "footage" not in manifest:
+        wait_until_idle()
+        phash_index = PhashIndex()
+        candidates = select_candidates(manifest["search_terms"], os.getenv("PEXELS_API_KEY"),
+                                       phash_index, get_catalog())
+        footage, selected = [], []
+        for candidate in candidates:
+            url = candidate["link"]
+            path = footage_path(url)
+            if not os.path.isfile(path):
+                wait_until_idle()
+                raw = f"{path}.src"
+                download(url, raw)
+                wait_until_idle()
+                normalize(raw, path)
+                os.remove(raw)
+            hashes = clip_hashes(path, min(candidate["duration"], NORMALIZE_SECONDS), f"clip:{url}", phash_index)
+            if footage and is_near_duplicate(hashes, selected, phash_index):
+                continue
+            footage.append({"url": url, "id": candidate["id"], "duration": candidate["duration"], "path": path})
+            selected.append(f"clip:{url}")
+        phash_index.save()
+        manifest["footage"] = footage
+        _save_manifest(key, manifest)
+
+    if "tts" not in manifest:
+        sentences = [s.strip() for s in manifest["script"].split(". ") if s.strip()]
+        audio_paths, sentences, durations = synthesize(sentences, voice, job_dir)
+        manifest["tts"] = {"audio_paths": audio_paths, "sentences": sentences, "durations": durations}
+
+    manifest["complete"] = True
+    _save_manifest(key, manifest)
+    print(colored(f"[+] Prefetched '{config['videoSubject']}' ({len(manifest['footage'])} clips)", "green"))
+    return manifest
+
+
+def run(poll: int = 300, once: bool = False) -> None:
+    """
+    Prefetches the next pending jobs of the shared queue whenever this node is idle.
+
+    Args:
+        poll (int): Seconds between passes over the queue.
+        once (bool): Make a single pass.
+    """
+    from jobqueue import JobQueue
+    from main import job_config
+
+    os.nice(10)
+    queue = JobQueue()
+    while True:
+        for job in queue.jobs("pending")[:HORIZON_JOBS]:
+            wait_until_idle()
+            config = job_config(dict(job["config"], jobId=job["id"]))
+            try:
+                prefetch_job(config)
+            except Exception as e:
+                print(colored(f"[-] Prefetch of job {job['id']} failed: {e}", "red"))
+        trim_footage_cache()
+        if once:
+            return
+        time.sleep(poll)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch upcoming jobs while the node is idle.")
+    parser.add_argument("--once", action="store_true")
+    parser.add_argument("--poll", type=int, default=300)
+    args = parser.parse_args()
+    run(poll=args.poll, once=args.once)
@@ -0,0 +1,115 @@
+import os
+import re
+import json
+import subprocess
+import threading
+
+from typing import Dict, NamedTuple, Optional, Tuple
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+# Probes are stored next to the media as <file>.probe.json, so they live and die with it
+# (footage in /app/cache keeps them across runs, /app/temp loses them with its files)
+SIDECAR_SUFFIX = ".probe.json"
+
+_SHOWINFO_PTS = re.compile(r"pts_time:\s*([\d.]+)")
+
+
+class MediaInfo(NamedTuple):
+    duration: float
+    fps: Optional[float]
+    size: Optional[Tuple[int, int]]
+    video_codec: Optional[str]
+    audio_fps: Optional[int]
+    keyframes: Optional[Tuple[float, ...]] = None
+
+    @property
+    def has_video(self) -> bool:
+        return self.size is not None
+
+
+_memory: Dict[str, Tuple[Tuple[int, int], MediaInfo]] = {}
+_lock = threading.Lock()
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_sidecar(path: str, key: Tuple[int, int]) -> Optional[MediaInfo]:
+    try:
+        with open(path + SIDECAR_SUFFIX) as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if tuple(data.pop("key")) != key:
+        return None
+    for field in ("size", "keyframes"):
+        if data.get(field) is not None:
+            data[field] = tuple(data[field])
+    return MediaInfo(**data)
+
+
+def _save_sidecar(path: str, key: Tuple[int, int], info: MediaInfo) -> None:
+    try:
+        with open(path + SIDECAR_SUFFIX, "w") as f:
+            json.dump(dict(info._asdict(), key=key), f)
+    except OSError:
+        pass  # read-only media directory; the in-process cache still works
+
+
+def keyframe_times(path: str) -> Tuple[float, ...]:
+    """
+    Lists the video's keyframe timestamps; only keyframes are decoded.
+    """
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-skip_frame", "nokey", "-i", path,
+           "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"]
+    err = subprocess.run(cmd, capture_output=True, text=True).stderr
+    return tuple(float(t) for t in _SHOWINFO_PTS.findall(err))
+
+
+def probe(path: str, keyframes: bool = False) -> MediaInfo:
+    """
+    Returns a file's duration, fps, size, codec and (optionally) keyframe times,
+    probing it with ffmpeg only the first time it is seen in a given version
+    (path plus mtime and size).
+
+    Args:
+        path (str): The media file.
+        keyframes (bool): Also index the keyframes, which reads the whole file once.
+
+    Returns:
+        MediaInfo: The metadata.
+    """
+    path = os.path.abspath(path)
+    key = _stat_key(path)
+    with _lock:
+        cached = _memory.get(path)
+    info = cached[1] if cached and cached[0] == key else _load_sidecar(path, key)
+
+    changed = False
+    if info is None:
+        infos = ffmpeg_parse_infos(path)
+        size = infos.get("video_size") if infos.get("video_found") else None
+        info = MediaInfo(
+            duration=infos.get("duration") or 0.0,
+            fps=infos.get("video_fps") if size else None,
+            size=tuple(size) if size else None,
+            video_codec=infos.get("video_codec_name"),
+            audio_fps=infos.get("audio_fps") if infos.get("audio_found") else None,
+        )
+        changed = True
+    if keyframes and info.keyframes is None and info.has_video:
+        info = info._replace(keyframes=keyframe_times(path))
+        changed = True
+
+    if changed:
+        _save_sidecar(path, key, info)
+    with _lock:
+        _memory[path] = (key, info)
+    return info
+
+
+def duration(path: str) -> float:
+    return probe(path).duration
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import fcntl
+import argparse
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Mapping, Optional
+
+# One ledger for every process and node, next to the shared job queue.
+# flock is honoured across NFSv4 clients.
+LEDGER_PATH = os.getenv("MKSHORTS_QUOTA_LEDGER", "/app/queue/quota.json")
+
+# Pexels: 200 requests per hour, 20,000 per month (the monthly count comes back
+# in the X-Ratelimit-* headers of every response)
+PEXELS_PER_HOUR = 200
+PEXELS_BURST = 50
+
+# YouTube Data API: 10,000 units per day, reset at midnight Pacific time
+YOUTUBE_DAILY_UNITS = 10000
+YOUTUBE_COSTS = {
+    "videos.insert": 1600,
+    "channels.list": 1,
+}
+# One upload: the channel check plus the insert
+UPLOAD_UNITS = YOUTUBE_COSTS["videos.insert"] + YOUTUBE_COSTS["channels.list"]
+
+# Don't wait longer than this for a token; fail instead
+MAX_WAIT_SECONDS = 120
+# A 429 without a usable reset time blocks the service this long (Pexels' limit is hourly)
+THROTTLE_SECONDS = 3600
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a request would exceed a quota that won't refill soon enough.
+    """
+
+
+@contextmanager
+def _ledger(path: str = LEDGER_PATH):
+    # Read-modify-write under an exclusive lock; the dict is written back on exit
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                data = {}
+            yield data
+            f.seek(0)
+            f.truncate()
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _pacific_day() -> str:
+    try:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo("America/Los_Angeles")
+    except Exception:
+        tz = timezone(timedelta(hours=-8))  # no tzdata in the image
+    return datetime.now(tz).date().isoformat()
+
+
+class TokenBucket:
+    """
+    A token bucket whose state lives in the shared ledger, so every process on
+    every node draws from the same bucket.
+
+    The bucket refills at `rate` tokens per second up to `burst`. When the
+    service's own headers say the quota is used up, nothing is handed out until
+    the reset time they gave.
+    """
+
+    def __init__(self, service: str, rate: float, burst: float, path: str = LEDGER_PATH):
+        self.service = service
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+
+    def _take(self, cost: float) -> float:
+        # Returns 0 if the tokens were taken, otherwise how long to wait
+        with _ledger(self.path) as ledger:
+            state = ledger.setdefault(self.service, {})
+            now = time.time()
+            reset = state.get("reset") or 0
+            if state.get("remaining") == 0 and reset > now:
+                return reset - now
+            tokens = min(self.burst, state.get("tokens", self.burst)
+                         + (now - state.get("updated", now)) * self.rate)
+            state["updated"] = now
+            if tokens >= cost:
+                state["tokens"] = tokens - cost
+                state["requests"] = state.get("requests", 0) + 1
+                return 0.0
+            state["tokens"] = tokens
+            return (cost - tokens) / self.rate
+
+    def acquire(self, cost: float = 1, max_wait: float = MAX_WAIT_SECONDS) -> None:
+        """
+        Blocks until `cost` tokens are available.
+
+        Raises:
+            QuotaExceeded: If that would take longer than max_wait.
+        """
+        deadline = time.time() + max_wait
+        while True:
+            wait = self._take(cost)
+            if wait == 0:
+                return
+            if time.time() + wait > deadline:
+                raise QuotaExceeded(f"{self.service}: rate limit, next request possible in {wait:.0f}s")
+            time.sleep(wait)
+
+    def record_headers(self, headers: Mapping[str, str], status: int = 200) -> None:
+        """
+        Stores the X-Ratelimit-Limit/-Remaining/-Reset headers of a response.
+        A 429 also marks the service as exhausted until the reset it gave, or
+        Retry-After / THROTTLE_SECONDS from now.
+        """
+        limit = headers.get("X-Ratelimit-Limit")
+        remaining = headers.get("X-Ratelimit-Remaining")
+        reset = headers.get("X-Ratelimit-Reset")
+        with _ledger(self.path) as ledger:
+            state = ledger.setdefault(self.service, {})
+            if limit is not None:
+                state["limit"] = int(limit)
+            if remaining is not None:
+                state["remaining"] = int(remaining)
+            if reset is not None:
+                state["reset"] = int(reset)
+            if status == 429:
+                now = time.time()
+                state["tokens"] = 0
+                state["updated"] = now
+                state["throttled"] = state.get("throttled", 0) + 1
+                # what TokenBucket._take and remaining() read as "exhausted"
+                state["remaining"] = 0
+                if (state.get("reset") or 0) <= now:
+                    retry_after = headers.get("Retry-After")
+                    wait = int(retry_after) if retry_after and retry_after.isdigit() else THROTTLE_SECONDS
+                    state["reset"] = int(now + wait)
+
+
+class UnitQuota:
+    """
+    A daily unit budget (YouTube Data API style) kept in the shared ledger.
+    """
+
+    def __init__(self, service: str, daily_units: int, costs: Dict[str, int], path: str = LEDGER_PATH):
+        self.service = service
+        self.daily_units = daily_units
+        self.costs = costs
+        self.path = path
+
+    def _state(self, ledger: Dict) -> Dict:
+        state = ledger.setdefault(self.service, {})
+        day = _pacific_day()
+        if state.get("day") != day:
+            state.update(day=day, used=0, calls={})
+        return state
+
+    def charge(self, method: str) -> int:
+        """
+        Books the units for one API call before it is made.
+
+        Returns:
+            int: Units left today after the charge.
+
+        Raises:
+            QuotaExceeded: If the call does not fit in today's budget.
+        """
+        cost = self.costs[method]
+        with _ledger(self.path) as ledger:
+            state = self._state(ledger)
+            left = self.daily_units - state["used"]
+            if cost > left:
+                raise QuotaExceeded(f"{self.service}: {method} needs {cost} units, {left} left today")
+            state["used"] += cost
+            state["calls"][method] = state["calls"].get(method, 0) + 1
+            return left - cost
+
+    def exhaust(self) -> None:
+        """
+        Marks today's budget as spent, e.g. after the API answered quotaExceeded.
+        """
+        with _ledger(self.path) as ledger:
+            self._state(ledger)["used"] = self.daily_units
+
+
+pexels = TokenBucket("pexels", PEXELS_PER_HOUR / 3600, PEXELS_BURST)
+youtube = UnitQuota("youtube", YOUTUBE_DAILY_UNITS, YOUTUBE_COSTS)
+
+
+def remaining(path: str = LEDGER_PATH) -> Dict:
+    """
+    Reports what is left of every budget, so schedulers can check before starting
+    heavy stages.
+
+    Returns:
+        Dict: {"pexels": {"tokens", "remaining", "reset", "exhausted"}, "youtube": {"units", "uploads"}}
+    """
+    with _ledger(path) as ledger:
+        p = ledger.get("pexels", {})
+        now = time.time()
+        tokens = min(PEXELS_BURST, p.get("tokens", PEXELS_BURST) + (now - p.get("updated", now)) * pexels.rate)
+        y = youtube._state(ledger)
+        units = YOUTUBE_DAILY_UNITS - y["used"]
+        return {
+            "pexels": {
+                "tokens": int(tokens),
+                # monthly requests left as last reported by Pexels, None until the first response
+                "remaining": p.get("remaining"),
+                "reset": p.get("reset"),
+                # the same test TokenBucket applies; a past reset means the month rolled over
+                "exhausted": p.get("remaining") == 0 and (p.get("reset") or 0) > now,
+            },
+            "youtube": {
+                "units": units,
+                "uploads": units // UPLOAD_UNITS,
+            },
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the shared API quota ledger.")
+    parser.add_argument("--ledger", default=LEDGER_PATH)
+    args = parser.parse_args()
+    print(json.dumps(remaining(args.ledger), indent=2))
@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import threading
+
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+import alog
+
+# Off by default: wrapping every frame costs a few microseconds and the sampler a little CPU
+ENABLED = os.getenv("MKSHORTS_PROFILE_RENDER", "") not in ("", "0")
+# Directory for collapsed-stack flame graph dumps (flamegraph.pl / speedscope), or None
+FLAMEGRAPH_DIR = os.getenv("MKSHORTS_FLAMEGRAPH_DIR") or None
+
+# Every write blocks until ffmpeg has read the frame, so a write is a stall (libx264
+# is behind and the pipe is full) when it takes this many times the median write
+STALL_FACTOR = 2.0
+SAMPLE_INTERVAL = 0.01
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+PHASES = ("decode", "composite", "encode")
+
+
+def configure(enabled: bool, flamegraph_dir: Optional[str] = None) -> None:
+    global ENABLED, FLAMEGRAPH_DIR
+    ENABLED = enabled
+    FLAMEGRAPH_DIR = flamegraph_dir
+
+
+def histogram(samples: List[float]) -> Dict:
+    """
+    Summarizes per-frame timings (seconds) as counts per millisecond bucket plus
+    percentiles.
+    """
+    if not samples:
+        return {"count": 0}
+    ms = sorted(s * 1000 for s in samples)
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for value in ms:
+        counts[bisect_left(BUCKETS_MS, value)] += 1
+    labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+    return {
+        "count": len(ms),
+        "total_s": round(sum(ms) / 1000, 3),
+        "mean_ms": round(sum(ms) / len(ms), 2),
+        "p50_ms": round(ms[len(ms) // 2], 2),
+        "p95_ms": round(ms[min(len(ms) - 1, int(0.95 * len(ms)))], 2),
+        "max_ms": round(ms[-1], 2),
+        "hist": {label: n for label, n in zip(labels, counts) if n},
+    }
+
+
+class _StackSampler(threading.Thread):
+    """
+    Samples one thread's Python stack and counts collapsed stacks.
+    """
+
+    def __init__(self, thread_id: int):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RenderProfile:
+    """
+    Per-frame timings of one write_videofile call.
+
+    The reader's get_frame is decode, the writer's write_frame is encode, and
+    whatever the frame loop spends between the two (crop, resize, subtitle
+    blending) is composite.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.samples = {phase: [] for phase in PHASES}
+        self.encoder_bytes = 0
+        self._frame_start = None
+        self._decode = 0.0
+
+    def on_decode(self, start: float, end: float) -> None:
+        if self._frame_start is None:
+            self._frame_start = start
+        self._decode += end - start
+
+    def on_encode(self, start: float, end: float, nbytes: int) -> None:
+        if self._frame_start is not None:
+            self.samples["decode"].append(self._decode)
+            self.samples["composite"].append(max(0.0, start - self._frame_start - self._decode))
+        self.samples["encode"].append(end - start)
+        self.encoder_bytes += nbytes
+        # the next frame starts now, even if it needs no decoding
+        self._frame_start = end
+        self._decode = 0.0
+
+    def summary(self) -> Dict:
+        writes = self.samples["encode"]
+        median = sorted(writes)[len(writes) // 2] if writes else 0.0
+        stalls = [w for w in writes if w > STALL_FACTOR * median]
+        return {
+            "label": self.label,
+            "frames": len(writes),
+            "encoder_mb": round(self.encoder_bytes / 2**20, 1),
+            "pipe_stalls": len(stalls),
+            "pipe_stall_s": round(sum(stalls) - median * len(stalls), 3),
+            **{phase: histogram(samples) for phase, samples in self.samples.items()},
+        }
+
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def _profiling(label: str):
+    from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+    profile = RenderProfile(label)
+    render_thread = threading.get_ident()
+    get_frame = FFMPEG_VideoReader.get_frame
+    write_frame = FFMPEG_VideoWriter.write_frame
+
+    def timed_get_frame(self, t):
+        start = time.perf_counter()
+        frame = get_frame(self, t)
+        if threading.get_ident() == render_thread:
+            profile.on_decode(start, time.perf_counter())
+        return frame
+
+    def timed_write_frame(self, img_array):
+        start = time.perf_counter()
+        write_frame(self, img_array)
+        profile.on_encode(start, time.perf_counter(), img_array.nbytes)
+
+    sampler = _StackSampler(render_thread) if FLAMEGRAPH_DIR else None
+    with _lock:
+        FFMPEG_VideoReader.get_frame = timed_get_frame
+        FFMPEG_VideoWriter.write_frame = timed_write_frame
+        if sampler:
+            sampler.start()
+        try:
+            yield profile
+        finally:
+            FFMPEG_VideoReader.get_frame = get_frame
+            FFMPEG_VideoWriter.write_frame = write_frame
+            if sampler:
+                sampler.stop.set()
+                sampler.join()
+
+    summary = profile.summary()
+    if sampler:
+        os.makedirs(FLAMEGRAPH_DIR, exist_ok=True)
+        summary["flamegraph"] = os.path.join(FLAMEGRAPH_DIR, f"{label}-{int(time.time())}.folded")
+        sampler.dump(summary["flamegraph"])
+    alog.event("render_profile", **summary)
+
+
+def profile(label: str):
+    """
+    Wraps a render (e.g. a write_videofile call) and logs where its frame loop spent
+    time, as a render_profile event. Does nothing unless profiling is enabled.
+
+    Args:
+        label (str): Names the render in the log ("combine", "render", ...).
+    """
+    return _profiling(label) if ENABLED else nullcontext()
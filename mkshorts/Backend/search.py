@@ -1,33 +1,194 @@
 import requests
 
-from typing import List
+from typing import List, Dict, Optional, Tuple
 from termcolor import colored
 
-def search_for_stock_videos(query: str, api_key: str, it: int, min_dur: int) -> List[str]:
+import ratelimit
+from catalog import Catalog, get_catalog, MIN_LOCAL_RESULTS
+from phash import PhashIndex, thumbnail_hashes, is_near_duplicate
+
+# Every clip ends up cropped to 9:16 and resized to this resolution in combine_videos.
+TARGET_SIZE = (1080, 1920)
+
+
+def rendition_cost(file: Dict, target: Tuple[int, int] = TARGET_SIZE) -> Tuple:
+    """
+    Scores a Pexels `video_file` by the work needed to turn it into a target frame.
+    Lower is better.
+
+    Renditions whose 9:16 crop already covers the target height come first, the
+    cheapest of them to download and decode winning. Renditions that would have to be
+    upscaled come last, the largest of them winning.
+
+    Args:
+        file (Dict): One entry of a Pexels video's `video_files`.
+        target (Tuple[int, int]): The output (width, height).
+
+    Returns:
+        Tuple: A sort key.
+    """
+    w = file.get("width") or 0
+    h = file.get("height") or 0
+    fps = file.get("fps") or 30
+    ratio = target[0] / target[1]
+
+    # Same crop as combine_videos
+    crop_h = round(w / ratio) if h and w / h < ratio else h
+
+    if crop_h < target[1]:
+        return (1, -crop_h, 0, 0)
+
+    decoded_pixels = w * h * fps
+    transfer = file.get("size") or file.get("bitrate") or decoded_pixels
+    return (0, decoded_pixels, w > h, transfer)
+
+
+def rank_renditions(video: Dict, target: Tuple[int, int] = TARGET_SIZE) -> List[Dict]:
+    """
+    Returns the mp4 renditions of a Pexels video, cheapest usable one first.
+
+    Args:
+        video (Dict): A video object from the Pexels API.
+        target (Tuple[int, int]): The output (width, height).
+
+    Returns:
+        List[Dict]: The renditions with their metadata.
+    """
+    files = [f for f in video.get("video_files", [])
+             if f.get("file_type") == "video/mp4" and f.get("link")]
+    return sorted(files, key=lambda f: rendition_cost(f, target))
+
+
+def search_for_stock_video_candidates(query: str, api_key: str, it: int, min_dur: int, use_catalog: bool = True) -> List[Dict]:
+    """
+    Searches for stock videos and returns every match with its rendition metadata.
+
+    The local catalog of videos seen before answers first; the Pexels API is only
+    asked when it knows fewer than MIN_LOCAL_RESULTS matches, and whatever the API
+    returns is added to the catalog.
+
+    Args:
+        query (str): The search term.
+        api_key (str): The Pexels API key.
+        it (int): Number of results to request.
+        min_dur (int): Minimum clip duration in seconds.
+        use_catalog (bool): Whether to consult and update the local catalog.
+
+    Returns:
+        List[Dict]: One candidate per video with `id`, `url`, `duration`, `width`,
+            `height`, `image`, the ranked `renditions` and the chosen `link`.
+    """
+    catalog = get_catalog() if use_catalog else None
+    local = []
+    if catalog is not None:
+        local = catalog.search(query, min_dur, it)
+        if len(local) >= MIN_LOCAL_RESULTS:
+            print(colored(f"\t=> \"{query}\" found {len(local)} Videos (local catalog)", "cyan"))
+            return local
+
     headers = {"Authorization": api_key}
     url = f"https://api.pexels.com/videos/search?query={query}&per_page={it}"
+    # Out of Pexels quota the run goes on with what the catalog knows, however few:
+    # other terms may still be answered locally
+    try:
+        ratelimit.pexels.acquire()
+    except ratelimit.QuotaExceeded as e:
+        print(colored(f"[-] {e}, \"{query}\": {len(local)} Videos (local catalog)", "yellow"))
+        return local
     r = requests.get(url, headers=headers)
+    # a 429 marks Pexels as exhausted in the ledger, so later terms skip the API
+    ratelimit.pexels.record_headers(r.headers, r.status_code)
+    if r.status_code == 429:
+        print(colored(f"[-] Pexels API rate limit reached, \"{query}\": {len(local)} Videos (local catalog)", "yellow"))
+        return local
     if r.status_code != 200:
         print(colored(f"[-] Pexels API error: {r.status_code}", "red"))
         return []
     response = r.json()
-    video_urls = []
+    candidates = []
     try:
         for video in response.get("videos", []):
             if video.get("duration", 0) < min_dur:
                 continue
-            best_url = ""
-            best_res = 0
-            for file in video.get("video_files", []):
-                if file.get("file_type") == "video/mp4":
-                    res = file.get("width", 0) * file.get("height", 0)
-                    if res > best_res:
-                        best_res = res
-                        best_url = file.get("link")
-            if best_url:
-                video_urls.append(best_url)
+            renditions = rank_renditions(video)
+            if not renditions:
+                continue
+            candidates.append({
+                "id": video.get("id"),
+                "url": video.get("url"),
+                "duration": video.get("duration", 0),
+                "width": video.get("width", 0),
+                "height": video.get("height", 0),
+                "image": video.get("image"),
+                "tags": video.get("tags", []),
+                "renditions": renditions,
+                "link": renditions[0]["link"],
+            })
     except Exception as e:
         print(colored("[-] No Videos found.", "red"))
         print(colored(e, "red"))
-    print(colored(f"\t=> \"{query}\" found {len(video_urls)} Videos", "cyan"))
-    return video_urls
\ No newline at end of file
+    if catalog is not None and candidates:
+        catalog.add(candidates, query)
+    print(colored(f"\t=> \"{query}\" found {len(candidates)} Videos", "cyan"))
+    return candidates
+
+
+def search_for_stock_videos(query: str, api_key: str, it: int, min_dur: int) -> List[str]:
+    return [c["link"] for c in search_for_stock_video_candidates(query, api_key, it, min_dur)]
+
+
+def search_with_fallback(term, api_key, min_dur=10, max_retry=3):
+    """비디오가 없으면 키워드에 숫자, '4k', 'nature', 'background' 등 추가로 재검색"""
+    fallback_terms = [
+        term + " nature",
+        term + " background",
+        term + " stock",
+        term + " video",
+    ]
+    tried = set()
+    for t in [term] + fallback_terms:
+        if t in tried:
+            continue
+        tried.add(t)
+        found = search_for_stock_video_candidates(t, api_key, it=15, min_dur=min_dur)
+        if found:
+            return found
+    return []
+
+
+def select_candidates(search_terms: List[str], api_key: str, phash_index: PhashIndex,
+                      catalog: Optional[Catalog] = None, min_dur: int = 10) -> List[Dict]:
+    """
+    Picks one video per search term, skipping footage whose thumbnail looks like a
+    video already picked.
+
+    Args:
+        search_terms (List[str]): The terms from get_search_terms.
+        api_key (str): The Pexels API key.
+        phash_index (PhashIndex): The perceptual hash index.
+        catalog (Optional[Catalog]): Records the picks, so the catalog rotates footage.
+        min_dur (int): Minimum clip duration in seconds.
+
+    Returns:
+        List[Dict]: The chosen candidates, at most one per term.
+    """
+    chosen = []
+    selected_thumbs = []
+    for term in search_terms:
+        found = search_with_fallback(term, api_key, min_dur=min_dur)
+        if not found:
+            print(colored(f"[-] No Videos found for '{term}' and fallback terms.", "red"))
+            continue
+        # candidates carry the cheapest usable rendition in "link"
+        for candidate in found:
+            if any(c["link"] == candidate["link"] for c in chosen):
+                continue
+            # reject footage that looks like a clip we already picked before downloading it
+            if is_near_duplicate(thumbnail_hashes(candidate, phash_index), selected_thumbs, phash_index):
+                continue
+            chosen.append(candidate)
+            selected_thumbs.append(f"thumb:{candidate['id']}")
+            if catalog is not None:
+                catalog.mark_used(candidate["id"])
+            break
+    return chosen
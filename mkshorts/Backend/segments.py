@@ -0,0 +1,200 @@
+import os
+import uuid
+import shutil
+import subprocess
+import multiprocessing
+
+import numpy as np
+import psutil
+
+from typing import Dict, List, Optional, Tuple
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+from subtitles import Subtitles
+from probe import probe
+
+# Every segment is a whole number of GOPs, so each one starts on an IDR frame
+# and the encoded segments can be joined by stream copy.
+GOP_SECONDS = 2.0
+
+# Resident memory budget per segment worker, its ffmpeg reader/writer children
+# included; also caps how many workers fit in RAM.
+WORKER_MEMORY_MB = 1500
+# How often the parent checks the workers against that budget
+MEMORY_POLL_SECONDS = 1.0
+
+SEGMENT_DIR = "/app/temp/segments"
+
+
+def plan_segments(duration: float, fps: float, segment_seconds: float) -> List[Tuple[int, int]]:
+    """
+    Splits a timeline into GOP-aligned frame ranges.
+
+    Args:
+        duration (float): Timeline duration in seconds.
+        fps (float): Frame rate.
+        segment_seconds (float): Target segment length, rounded to whole GOPs.
+
+    Returns:
+        List[Tuple[int, int]]: [first_frame, end_frame) per segment.
+    """
+    total = int(duration * fps)
+    gop = max(1, round(GOP_SECONDS * fps))
+    step = max(1, round(segment_seconds * fps / gop)) * gop
+    return [(f0, min(f0 + step, total)) for f0 in range(0, total, step)]
+
+
+def _register_worker(pids) -> None:
+    # Every worker, including the replacements maxtasksperchild starts, reports its pid
+    pids.put(os.getpid())
+
+
+def _check_memory(workers: set, memory_mb: int) -> None:
+    # Resident memory, not address space: numpy, codecs and thread stacks reserve far
+    # more virtual memory than they touch, so an RLIMIT_AS cap fails healthy workers.
+    # Only this pool's workers count, not other children of the process.
+    for pid in list(workers):
+        try:
+            worker = psutil.Process(pid)
+            rss = worker.memory_info().rss + sum(c.memory_info().rss for c in worker.children(recursive=True))
+        except psutil.NoSuchProcess:
+            workers.discard(pid)  # finished its segment in the meantime
+            continue
+        if rss > memory_mb * 2**20:
+            raise MemoryError(f"Segment worker {pid} uses {rss // 2**20} MB, budget {memory_mb} MB")
+
+
+def _render_segment(task: Dict) -> str:
+    # Runs in a worker process; imports happen here so the parent stays small.
+    from moviepy import VideoFileClip
+    from video import overlay_subtitles
+
+    fps = task["fps"]
+    f0, f1 = task["frames"]
+    source = VideoFileClip(task["video"], audio=False)
+    # half a frame of slack so MoviePy's int(duration * fps) yields exactly f1 - f0 frames
+    end = min((f1 + 0.5) / fps, source.duration)
+    clip = source.subclipped(f0 / fps, end)
+    clip = overlay_subtitles(clip, task["subtitles"], task["renderer"], task["position"],
+                             task["text_color"], task["bg_color"])
+    gop = str(max(1, round(GOP_SECONDS * fps)))
+    clip.write_videofile(task["output"], fps=fps, codec="libx264", audio=False, threads=1,
+                         ffmpeg_params=["-g", gop, "-keyint_min", gop, "-sc_threshold", "0", *task["encoder_args"]],
+                         logger=None)
+    source.close()
+    return task["output"]
+
+
+def _worker_count(requested: int, memory_mb: int) -> int:
+    fits = psutil.virtual_memory().available // (memory_mb * 2**20)
+    return max(1, min(requested, os.cpu_count() or 1, fits))
+
+
+def render_segmented(combined_video_path: str, tts_path: str, subtitles: Subtitles, output_path: str,
+                     workers: int = 2, segment_seconds: float = 10.0, memory_mb: int = WORKER_MEMORY_MB,
+                     subtitle_renderer: str = "numpy", subtitles_position: str = "center,center",
+                     text_color: str = "#FFFFFF", bg_color: str = "rgba(0, 0, 0, 180)",
+                     encoder_args: List[str] = (), extra_args: List[str] = (),
+                     duration: Optional[float] = None) -> str:
+    """
+    Renders the final video as parallel GOP-aligned segments, joins them by stream copy
+    and muxes the voiceover once.
+
+    Args:
+        combined_video_path (str): The combined background video.
+        tts_path (str): The voiceover.
+        subtitles (Subtitles): The subtitles for the whole timeline.
+        output_path (str): Where to write the final video.
+        workers (int): Maximum worker processes; fewer are used if RAM does not allow.
+        segment_seconds (float): Target segment length.
+        memory_mb (int): Resident memory budget per worker with its ffmpeg processes; a
+            worker over it stops the render with MemoryError.
+        encoder_args (List[str]): Further libx264 options for every segment, e.g. a bitrate.
+        extra_args (List[str]): Further options for the final mux, e.g. -movflags.
+        duration (Optional[float]): Render only the first this many seconds of the background.
+
+    Returns:
+        str: The output path.
+    """
+    info = probe(combined_video_path)
+    fps, duration = info.fps, min(info.duration, duration or info.duration)
+
+    work_dir = os.path.join(SEGMENT_DIR, uuid.uuid4().hex)
+    os.makedirs(work_dir, exist_ok=True)
+    tasks = []
+    for i, (f0, f1) in enumerate(plan_segments(duration, fps, segment_seconds)):
+        tasks.append({
+            "video": combined_video_path,
+            "frames": (f0, f1),
+            "fps": fps,
+            "subtitles": subtitles.slice(f0 / fps, f1 / fps),
+            "renderer": subtitle_renderer,
+            "position": subtitles_position,
+            "text_color": text_color,
+            "bg_color": bg_color,
+            "output": os.path.join(work_dir, f"{i:04d}.mp4"),
+            "encoder_args": list(encoder_args),
+        })
+
+    processes = _worker_count(workers, memory_mb)
+    print(colored(f"[+] Rendering {len(tasks)} segments with {processes} workers...", "blue"))
+    pids = multiprocessing.SimpleQueue()
+    running = set()
+    try:
+        with multiprocessing.Pool(processes, initializer=_register_worker, initargs=(pids,),
+                                  maxtasksperchild=1) as pool:
+            result = pool.map_async(_render_segment, tasks, chunksize=1)
+            while not result.ready():
+                while not pids.empty():
+                    running.add(pids.get())
+                # leaving the with block on MemoryError terminates every worker
+                _check_memory(running, memory_mb)
+                result.wait(MEMORY_POLL_SECONDS)
+            segment_paths = result.get()
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in segment_paths)
+        cmd = [FFMPEG_BINARY, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+               "-i", tts_path, "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-c:a", "aac",
+               *extra_args, "-shortest", output_path]
+        subprocess.run(cmd, check=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return output_path
+
+
+def _gray_frames(video_path: str, size: Tuple[int, int] = (108, 192)) -> np.ndarray:
+    cmd = [FFMPEG_BINARY, "-v", "error", "-i", video_path, "-map", "0:v:0",
+           "-vf", f"scale={size[0]}:{size[1]}", "-f", "rawvideo", "-pix_fmt", "gray", "-"]
+    raw = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, size[1], size[0])
+
+
+def verify_against_serial(segmented_path: str, serial_path: str, tolerance: float = 3.0) -> Dict:
+    """
+    Checks that a segmented render matches a serial one frame for frame.
+
+    Frame counts must be equal, and every frame pair (compared as downscaled luma)
+    must differ by less than `tolerance` on average, which allows for encoder noise
+    but catches dropped, duplicated or shifted frames and misplaced subtitles.
+
+    Args:
+        segmented_path (str): Output of render_segmented.
+        serial_path (str): Output of the serial generate_video.
+        tolerance (float): Maximum mean absolute luma difference per frame.
+
+    Returns:
+        Dict: frames, worst frame, its difference and whether the check passed.
+    """
+    a, b = _gray_frames(segmented_path), _gray_frames(serial_path)
+    report = {"frames_segmented": len(a), "frames_serial": len(b)}
+    n = min(len(a), len(b))
+    diff = np.abs(a[:n].astype(np.int16) - b[:n]).mean(axis=(1, 2)) if n else np.zeros(1)
+    report["worst_frame"] = int(diff.argmax())
+    report["worst_diff"] = float(diff.max())
+    report["ok"] = len(a) == len(b) and report["worst_diff"] < tolerance
+    print(colored(f"[{'+' if report['ok'] else '-'}] Segmented vs serial: {report}",
+                  "green" if report["ok"] else "red"))
+    return report
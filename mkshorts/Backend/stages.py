@@ -0,0 +1,53 @@
+import time
+import resource
+import importlib
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Tuple
+
+import alog
+import renderprof
+
+
+def _init_worker(log_queue, verbose: bool, profile: bool, flamegraph_dir: str) -> None:
+    # Spawned workers start from scratch, so carry over the parent's runtime switches
+    alog.setup_worker(log_queue, verbose=verbose)
+    renderprof.configure(profile, flamegraph_dir)
+
+
+def _run(module: str, name: str, manifest: Dict) -> Tuple[Any, Dict]:
+    start = time.perf_counter()
+    result = getattr(importlib.import_module(module), name)(**manifest)
+    return result, {
+        "seconds": round(time.perf_counter() - start, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+    }
+
+
+def run_stage(module: str, name: str, **manifest) -> Any:
+    """
+    Runs one heavy stage, e.g. video.combine_videos, in a fresh worker process and
+    returns its result. When the stage ends the worker exits, so everything moviepy
+    and numpy allocated (and fragmented) goes back to the OS with it, and the parent's
+    footprint stays that of an orchestrator.
+
+    The worker is spawned, not forked: it inherits no threads or heap from the parent.
+    Only the manifest (paths, numbers, Subtitles) crosses the process boundary.
+
+    Args:
+        module (str): Module that defines the stage.
+        name (str): The stage function.
+        **manifest: Its keyword arguments; must be picklable.
+
+    Returns:
+        Any: What the stage returned (a file path for the video stages).
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                             max_tasks_per_child=1, initializer=_init_worker,
+                             initargs=(alog.worker_queue(), alog.is_verbose(), renderprof.ENABLED,
+                                       renderprof.FLAMEGRAPH_DIR)) as pool:
+        result, stats = pool.submit(_run, module, name, manifest).result()
+    alog.event("stage", stage=name, **stats)
+    return result
@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+import requests
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from termcolor import colored
+
+# Fragmented MP4: an empty moov up front and self-contained fragments after it, so
+# every byte ffmpeg has written is final and can be uploaded right away.
+FRAGMENTED_MOVFLAGS = "frag_keyframe+empty_moov+default_base_moof"
+# Also cut a fragment every 2 s, not only at keyframes (x264 puts those up to 10 s apart)
+FRAGMENT_ARGS = ["-movflags", FRAGMENTED_MOVFLAGS, "-frag_duration", "2000000"]
+
+# Resumable uploads take any chunk size that is a multiple of 256 KiB (except the last)
+CHUNK_GRANULARITY = 256 * 2**10
+CHUNK_BYTES = 16 * CHUNK_GRANULARITY
+POLL_SECONDS = 0.5
+MAX_RETRIES = 10
+
+UPLOAD_URL = "https://www.googleapis.com/upload/youtube/v3/videos"
+
+
+class RequestsTransport:
+    """
+    Sends the upload's HTTP requests. Subclass to add authentication or to talk to
+    a stand-in server.
+    """
+
+    def __init__(self, session: Optional[requests.Session] = None):
+        self.session = session or requests.Session()
+
+    def headers(self) -> Dict[str, str]:
+        return {}
+
+    def request(self, method: str, url: str, headers: Optional[Dict] = None, data: bytes = None,
+                params: Optional[Dict] = None) -> requests.Response:
+        return self.session.request(method, url, headers={**self.headers(), **(headers or {})},
+                                    data=data, params=params, timeout=60)
+
+
+def start_session(transport: RequestsTransport, body: Dict, url: str = UPLOAD_URL) -> str:
+    """
+    Opens a resumable upload session of unknown length.
+
+    Args:
+        transport (RequestsTransport): The HTTP transport.
+        body (Dict): The video resource (snippet, status).
+        url (str): The upload endpoint.
+
+    Returns:
+        str: The session URI.
+    """
+    r = transport.request("POST", url, params={"uploadType": "resumable", "part": ",".join(body.keys())},
+                          headers={"Content-Type": "application/json; charset=UTF-8",
+                                   "X-Upload-Content-Type": "video/mp4"},
+                          data=json.dumps(body).encode())
+    r.raise_for_status()
+    return r.headers["Location"]
+
+
+def _committed(r: requests.Response) -> int:
+    # 308 Range: bytes=0-N means N + 1 bytes are stored; no Range means none
+    value = r.headers.get("Range")
+    return int(value.rsplit("-", 1)[1]) + 1 if value else 0
+
+
+def _put(transport: RequestsTransport, session_url: str, data: bytes, start: int,
+         total: Optional[int]) -> requests.Response:
+    end = start + len(data) - 1
+    total_text = str(total) if total is not None else "*"
+    content_range = f"bytes {start}-{end}/{total_text}" if data else f"bytes */{total_text}"
+    retry = 0
+    while True:
+        try:
+            r = transport.request("PUT", session_url, headers={"Content-Range": content_range}, data=data)
+            if r.status_code < 500:
+                return r
+            error = f"HTTP {r.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+        retry += 1
+        if retry > MAX_RETRIES:
+            raise Exception(f"Upload chunk failed: {error}")
+        print(colored(f"[-] Upload chunk failed ({error}), retrying...", "red"))
+        time.sleep(min(2 ** retry, 60))
+        # ask how much arrived before resending
+        status = transport.request("PUT", session_url, headers={"Content-Range": f"bytes */{total_text}"})
+        if status.status_code in (200, 201):
+            return status
+        if _committed(status) != start:
+            return status
+
+
+def stream_upload(render: Callable[[], str], path: str, session_url: str,
+                  transport: RequestsTransport, chunk_bytes: int = CHUNK_BYTES) -> Dict:
+    """
+    Runs a render that writes a fragmented MP4 to `path` and uploads the file as it
+    grows, finishing the session once the render has returned.
+
+    Args:
+        render (Callable[[], str]): Writes the video to `path` (e.g. a generate_video call
+            with fragmented=True).
+        path (str): The file the render writes.
+        session_url (str): From start_session.
+        transport (RequestsTransport): The HTTP transport.
+        chunk_bytes (int): Upload chunk size, a multiple of 256 KiB.
+
+    Returns:
+        Dict: The server's final response (the video resource for YouTube).
+    """
+    assert chunk_bytes % CHUNK_GRANULARITY == 0
+    if os.path.exists(path):
+        os.remove(path)
+
+    done = threading.Event()
+    failure = []
+
+    def run():
+        try:
+            render()
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            done.set()
+
+    encoder = threading.Thread(target=run, daemon=True)
+    encoder.start()
+
+    sent = 0
+    overlapped = 0
+    while not os.path.exists(path) and not done.is_set():
+        time.sleep(POLL_SECONDS)
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        f = None
+    try:
+        while True:
+            finished = done.is_set()
+            if failure:
+                transport.request("DELETE", session_url)
+                raise failure[0]
+            if finished and f is None:
+                raise Exception(f"The render did not write {path}")
+            size = os.path.getsize(path) if f else 0
+            if not finished and size - sent < chunk_bytes:
+                time.sleep(POLL_SECONDS)
+                continue
+
+            length = chunk_bytes if size - sent >= chunk_bytes else size - sent
+            last = finished and sent + length == size
+            f.seek(sent)
+            data = f.read(length)
+            r = _put(transport, session_url, data, sent, size if last else None)
+            if r.status_code in (200, 201):
+                print(colored(f"[+] Streamed upload done, {overlapped / 2**20:.1f} of "
+                              f"{size / 2**20:.1f} MB sent while encoding", "green"))
+                return r.json()
+            if r.status_code != 308:
+                raise Exception(f"Upload failed: HTTP {r.status_code} {r.text}")
+            sent = _committed(r)
+            if not finished:
+                overlapped = sent
+    finally:
+        if f:
+            f.close()
+        encoder.join()
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # Enforces what YouTube enforces: contiguous ranges, 256 KiB multiples until the last
+    sessions: Dict[str, Dict] = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, headers: Optional[Dict] = None, body: Optional[Dict] = None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        session_id = hashlib.sha1(os.urandom(8)).hexdigest()[:12]
+        self.sessions[session_id] = {"data": bytearray(), "chunks": 0, "done": False}
+        host, port = self.server.server_address
+        self._reply(200, {"Location": f"http://{host}:{port}/session/{session_id}"})
+
+    def do_DELETE(self):
+        self.sessions.pop(self.path.rsplit("/", 1)[-1], None)
+        self._reply(204)
+
+    def do_PUT(self):
+        session = self.sessions.get(self.path.rsplit("/", 1)[-1])
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if session is None:
+            return self._reply(404)
+        stored = len(session["data"])
+        range_header = {"Range": f"bytes=0-{stored - 1}"} if stored else {}
+        spec, total = self.headers["Content-Range"].split(" ", 1)[1].split("/")
+        if spec != "*":
+            start, end = (int(x) for x in spec.split("-"))
+            if start != stored or end - start + 1 != len(body):
+                return self._reply(400, body={"error": f"expected offset {stored}, got {spec}"})
+            if total == "*" and len(body) % CHUNK_GRANULARITY:
+                return self._reply(400, body={"error": "chunk is not a multiple of 256 KiB"})
+            session["data"] += body
+            session["chunks"] += 1
+            stored = len(session["data"])
+            range_header = {"Range": f"bytes=0-{stored - 1}"}
+        if total != "*" and stored == int(total):
+            session["done"] = True
+            return self._reply(200, body={"id": "standin", "bytes": stored, "chunks": session["chunks"],
+                                          "sha1": hashlib.sha1(session["data"]).hexdigest()})
+        self._reply(308, range_header)
+
+
+def standin_server(port: int = 0) -> ThreadingHTTPServer:
+    """
+    Starts a local resumable-upload server on 127.0.0.1 in a background thread.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def verify(video_path: str, tts_path: str, output_path: str = "/app/temp/streamed.mp4") -> bool:
+    """
+    Renders with generate_video while streaming to the stand-in server and checks that
+    the uploaded bytes equal the finished file.
+    """
+    from video import generate_video
+    from subtitles import Subtitles
+
+    server = standin_server()
+    transport = RequestsTransport()
+    host, port = server.server_address
+    session_url = start_session(transport, {"snippet": {}, "status": {}}, f"http://{host}:{port}/upload")
+    start = time.perf_counter()
+    result = stream_upload(
+        lambda: generate_video(video_path, tts_path, Subtitles(), 2, "center,center", "#FFFFFF",
+                               "rgba(0, 0, 0, 180)", output_path=output_path, fragmented=True),
+        output_path, session_url, transport)
+    with open(output_path, "rb") as f:
+        ok = result["sha1"] == hashlib.sha1(f.read()).hexdigest()
+    print(colored(f"[{'+' if ok else '-'}] {result['bytes']} bytes in {result['chunks']} chunks, "
+                  f"{time.perf_counter() - start:.1f}s, identical: {ok}", "green" if ok else "red"))
+    server.shutdown()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check upload-while-encoding against a local stand-in server.")
+    parser.add_argument("video")
+    parser.add_argument("audio")
+    parser.add_argument("--out", default="/app/temp/streamed.mp4")
+    args = parser.parse_args()
+    raise SystemExit(0 if verify(args.video, args.audio, args.out) else 1)
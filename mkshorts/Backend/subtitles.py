@@ -0,0 +1,136 @@
+import re
+import bisect
+
+from array import array
+from typing import Iterable, Iterator, List, Tuple
+
+_SRT_TIME = re.compile(r"(\d+):(\d+):(\d+)(?:[,.](\d+))?")
+
+
+def _parse_time(value: str) -> float:
+    h, m, s, frac = _SRT_TIME.match(value.strip()).groups()
+    return int(h) * 3600 + int(m) * 60 + int(s) + (float(f"0.{frac}") if frac else 0.0)
+
+
+def _format_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def split_greedy(text: str, max_chars: int) -> List[str]:
+    """
+    Splits text into chunks of at most max_chars, breaking only between words.
+    A single word longer than max_chars becomes its own chunk.
+    """
+    chunks = []
+    current = ""
+    for word in text.split():
+        if current and len(current) + len(word) + 1 > max_chars:
+            chunks.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class Subtitles:
+    """
+    Timed subtitle lines kept in parallel arrays: start and end seconds as doubles,
+    and the texts. Iterating yields ((start, end), text) like MoviePy's
+    file_to_subtitles, so renderers can consume it directly.
+    """
+
+    __slots__ = ("starts", "ends", "texts")
+
+    def __init__(self, starts: Iterable[float] = (), ends: Iterable[float] = (), texts: Iterable[str] = ()):
+        self.starts = array("d", starts)
+        self.ends = array("d", ends)
+        self.texts = list(texts)
+
+    @classmethod
+    def from_durations(cls, sentences: List[str], durations: List[float]) -> "Subtitles":
+        """
+        Lays sentences back to back, each lasting as long as its audio.
+        """
+        subs = cls()
+        t = 0.0
+        for sentence, duration in zip(sentences, durations):
+            subs.append(t, t + duration, sentence)
+            t += duration
+        return subs
+
+    @classmethod
+    def from_srt(cls, text: str) -> "Subtitles":
+        subs = cls()
+        for block in re.split(r"\n\s*\n", text.replace("\r\n", "\n").strip()):
+            lines = block.split("\n")
+            for i, line in enumerate(lines):
+                if "-->" in line:
+                    start, end = line.split("-->")
+                    subs.append(_parse_time(start), _parse_time(end), "\n".join(lines[i + 1:]).strip())
+                    break
+        return subs
+
+    def append(self, start: float, end: float, text: str) -> None:
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[Tuple[Tuple[float, float], str]]:
+        return (((s, e), t) for s, e, t in zip(self.starts, self.ends, self.texts))
+
+    def __getitem__(self, i: int) -> Tuple[Tuple[float, float], str]:
+        return (self.starts[i], self.ends[i]), self.texts[i]
+
+    @property
+    def end(self) -> float:
+        return max(self.ends) if self.ends else 0.0
+
+    def active(self, t: float) -> int:
+        """
+        Returns the index of the line shown at time t, or -1.
+        """
+        i = bisect.bisect_right(self.starts, t) - 1
+        return i if i >= 0 and t < self.ends[i] else -1
+
+    def equalize(self, max_chars: int = 10) -> "Subtitles":
+        """
+        Splits long lines into chunks of at most max_chars, sharing each line's
+        time span in proportion to the chunk lengths (same as srt_equalizer's greedy mode).
+        """
+        out = Subtitles()
+        for start, end, text in zip(self.starts, self.ends, self.texts):
+            chunks = split_greedy(text, max_chars) if len(text) > max_chars else [text]
+            total = sum(len(c) for c in chunks) or 1
+            t = start
+            for i, chunk in enumerate(chunks):
+                t_next = end if i == len(chunks) - 1 else t + (end - start) * len(chunk) / total
+                out.append(t, t_next, chunk)
+                t = t_next
+        return out
+
+    def slice(self, t0: float, t1: float) -> "Subtitles":
+        """
+        Returns the lines visible in [t0, t1), clipped and shifted to start at t0.
+        """
+        out = Subtitles()
+        for start, end, text in zip(self.starts, self.ends, self.texts):
+            if end > t0 and start < t1:
+                out.append(max(start, t0) - t0, min(end, t1) - t0, text)
+        return out
+
+    def to_srt(self) -> str:
+        """
+        Serializes to SRT, for export only; the pipeline never reads it back.
+        """
+        return "\n".join(
+            f"{i}\n{_format_time(s)} --> {_format_time(e)}\n{t}\n"
+            for i, (s, e, t) in enumerate(zip(self.starts, self.ends, self.texts), start=1))
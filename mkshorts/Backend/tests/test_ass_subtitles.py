@@ -0,0 +1,52 @@
+import os
+
+from ass_subtitles import _ass_color, _ass_time, to_ass
+from overlay import SubtitleStyle
+from subtitles import Subtitles
+
+FONT = os.path.join(os.path.dirname(__file__), "..", "..", "fonts", "bold_font.ttf")
+
+
+def _events(script):
+    return [line for line in script.splitlines() if line.startswith("Dialogue:")]
+
+
+def _style_fields(script):
+    header = next(l for l in script.splitlines() if l.startswith("Format: Name"))
+    style = next(l for l in script.splitlines() if l.startswith("Style: "))
+    names = [n.strip() for n in header[len("Format:"):].split(",")]
+    return dict(zip(names, style[len("Style:"):].strip().split(",")))
+
+
+def test_colors_are_abgr_with_inverted_alpha():
+    assert _ass_color("#FF8000") == "&H000080FF"
+    assert _ass_color("rgba(0, 0, 0, 180)") == "&H4B000000"
+    assert _ass_color("white") == "&H00FFFFFF"
+
+
+def test_times_are_centiseconds():
+    assert _ass_time(0) == "0:00:00.00"
+    assert _ass_time(61.234) == "0:01:01.23"
+    assert _ass_time(3600 + 59.999) == "1:01:00.00"
+
+
+def test_events_follow_the_subtitles_and_escape_text():
+    subtitles = Subtitles([0.0, 1.5], [1.5, 3.25], ["Hello\nthere", "a {b} c\\d"])
+    script = to_ass(subtitles, SubtitleStyle(font=FONT))
+    assert _events(script) == [
+        "Dialogue: 0,0:00:00.00,0:00:01.50,Default,,0,0,0,,Hello\\Nthere",
+        "Dialogue: 0,0:00:01.50,0:00:03.25,Default,,0,0,0,,a \\{b\\} c\\\\d",
+    ]
+    assert "PlayResX: 1080" in script and "PlayResY: 1920" in script
+
+
+def test_style_matches_config():
+    fields = _style_fields(to_ass(Subtitles(), SubtitleStyle(font=FONT, position="center,bottom",
+                                                             color="#FFFF00", font_size=80)))
+    assert fields["Alignment"] == "2"
+    assert fields["PrimaryColour"] == "&H0000FFFF"
+    assert fields["Fontsize"] == "80"
+    # a translucent background draws a box (BorderStyle 4), none keeps the outline only
+    assert fields["BorderStyle"] == "4" and fields["BackColour"] == "&H4B000000"
+    fields = _style_fields(to_ass(Subtitles(), SubtitleStyle(font=FONT, bg_color=None)))
+    assert fields["BorderStyle"] == "1" and fields["Alignment"] == "5"
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+import catalog
+
+from catalog import MAX_AGE_DAYS, Catalog, slug_words
+
+
+def _video(video_id, slug, duration=20, tags=()):
+    return {
+        "id": video_id,
+        "url": f"https://www.pexels.com/video/{slug}-{video_id}/",
+        "duration": duration,
+        "width": 1080,
+        "height": 1920,
+        "image": f"{video_id}.jpg",
+        "tags": list(tags),
+        "renditions": [{"link": f"https://cdn/{video_id}.mp4", "width": 1080, "height": 1920}],
+    }
+
+
+@pytest.fixture
+def cat(tmp_path):
+    return Catalog(str(tmp_path / "missing" / "dir" / "catalog.sqlite3"))
+
+
+def test_slug_words_drops_the_id():
+    assert slug_words("https://www.pexels.com/video/aerial-view-of-a-beach-1234567/") == \
+        ["aerial", "view", "of", "a", "beach"]
+
+
+def test_search_matches_query_slug_and_tags(cat):
+    cat.add([_video(1, "sunset-over-the-sea"), _video(2, "city-traffic", tags=[{"title": "Night Lights"}])], "ocean")
+    assert len(cat) == 2
+    assert [v["id"] for v in cat.search("ocean", 0, 10)] == [1, 2]
+    assert [v["id"] for v in cat.search("sunset sea", 0, 10)] == [1]
+    assert [v["id"] for v in cat.search("night", 0, 10)] == [2]
+    assert cat.search("desert", 0, 10) == []
+    assert cat.search("!!!", 0, 10) == []
+
+    found = cat.search("traffic", 0, 10)[0]
+    assert found["link"] == "https://cdn/2.mp4" and found["renditions"][0]["width"] == 1080
+
+
+def test_search_respects_min_duration_and_limit(cat):
+    cat.add([_video(i, "forest-walk", duration=5 * i) for i in range(1, 6)], "forest")
+    assert sorted(v["id"] for v in cat.search("forest", 15, 10)) == [3, 4, 5]
+    assert len(cat.search("forest", 0, 2)) == 2
+
+
+def test_mark_used_rotates_picks_and_survives_re_adding(cat):
+    cat.add([_video(1, "forest-walk"), _video(2, "forest-walk")], "forest")
+    first = cat.search("forest", 0, 1)[0]["id"]
+    cat.mark_used(first)
+    second = cat.search("forest", 0, 1)[0]["id"]
+    assert second != first
+    cat.mark_used(second)
+    cat.mark_used(second)
+    cat.add([_video(1, "forest-walk"), _video(2, "forest-walk")], "trees")
+    assert cat.search("forest", 0, 1)[0]["id"] == first
+    # queries accumulate instead of replacing earlier words
+    assert len(cat.search("trees", 0, 10)) == 2 and len(cat.search("forest", 0, 10)) == 2
+
+
+def test_old_entries_expire(cat, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(catalog.time, "time", lambda: now - (MAX_AGE_DAYS + 1) * 86400)
+    cat.add([_video(1, "old-harbour")], "harbour")
+    monkeypatch.setattr(catalog.time, "time", lambda: now)
+    cat.add([_video(2, "new-harbour")], "harbour")
+    assert [v["id"] for v in cat.search("harbour", 0, 10)] == [2]
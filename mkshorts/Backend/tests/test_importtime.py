@@ -0,0 +1,16 @@
+from importtime import IMPORT_BUDGET_SECONDS, measure_imports, total_seconds
+
+# Subsystems main() only needs when a job or the config asks for them
+OPTIONAL = {"search", "catalog", "phash", "ttsplan", "voices", "tiktokvoice", "music", "bitrate",
+            "thermal", "prefetch", "stages", "segments", "streamupload", "ass_subtitles", "youtube",
+            "googleapiclient", "oauth2client", "openai", "g4f"}
+
+
+def test_cold_start_within_budget():
+    # IMPORT_BUDGET_SECONDS is the Pi 4 budget; set it lower on faster CI hosts
+    assert total_seconds(measure_imports("main")) <= IMPORT_BUDGET_SECONDS
+
+
+def test_optional_modules_load_on_first_use():
+    imported = {e["name"].split(".")[0] for e in measure_imports("main")}
+    assert not imported & OPTIONAL
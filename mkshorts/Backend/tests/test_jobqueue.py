@@ -0,0 +1,86 @@
+import os
+import json
+import threading
+
+import jobqueue
+
+from jobqueue import MAX_ATTEMPTS, JobQueue, run_worker
+
+
+def _submit(queue, n):
+    return [queue.submit({"videoSubject": f"job {i}"}, min_ram_mb=0) for i in range(n)]
+
+
+def test_competing_claims_take_every_job_exactly_once(tmp_path):
+    ids = _submit(JobQueue(str(tmp_path), node="submitter"), 40)
+    nodes = [JobQueue(str(tmp_path), node=f"pi{i}") for i in range(4)]
+    claimed = {q.node: [] for q in nodes}
+    start = threading.Barrier(len(nodes))
+
+    def drain(queue):
+        start.wait()
+        while True:
+            job = queue.claim()
+            if job is None:
+                return
+            claimed[queue.node].append(job["id"])
+
+    threads = [threading.Thread(target=drain, args=(q,)) for q in nodes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    taken = [job_id for jobs in claimed.values() for job_id in jobs]
+    assert sorted(taken) == sorted(ids)
+    for queue in nodes:
+        for job_id in claimed[queue.node]:
+            with open(os.path.join(str(tmp_path), "claimed", f"{job_id}.json")) as f:
+                assert json.load(f)["node"] == queue.node
+
+
+def test_expired_lease_goes_to_another_node_and_the_late_result_is_dropped(tmp_path, monkeypatch):
+    a, b = JobQueue(str(tmp_path), node="a"), JobQueue(str(tmp_path), node="b")
+    job_id, = _submit(a, 1)
+    job = a.claim()
+    # a stops heartbeating: its lease and claim look old
+    monkeypatch.setattr(jobqueue, "LEASE_SECONDS", -1)
+    a.heartbeat(job_id)
+    assert b.release_stale() == 1
+    monkeypatch.setattr(jobqueue, "LEASE_SECONDS", 300)
+    taken = b.claim()
+    assert taken["id"] == job_id and taken["node"] == "b"
+
+    a.complete(job, "a.mp4")  # lost the lease: must not finish b's copy
+    assert b.jobs("done") == []
+    b.complete(taken, "b.mp4")
+    assert [j["result"] for j in b.jobs("done")] == ["b.mp4"]
+    assert os.listdir(os.path.join(str(tmp_path), "leases")) == []
+
+
+def test_fresh_claim_without_lease_is_not_released(tmp_path, monkeypatch):
+    a = JobQueue(str(tmp_path), node="a")
+    job_id, = _submit(a, 1)
+    monkeypatch.setattr(a, "heartbeat", lambda job_id: None)  # crashed between rename and lease
+    a.claim()
+    assert JobQueue(str(tmp_path), node="b").release_stale() == 0
+
+
+def test_failures_retry_until_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path), node="a")
+    job_id, = _submit(queue, 1)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        job = queue.claim()
+        assert job["id"] == job_id and job["attempts"] == attempt - 1
+        queue.fail(job, "boom")
+    assert queue.claim() is None
+    assert [j["attempts"] for j in queue.jobs("failed")] == [MAX_ATTEMPTS]
+
+
+def test_run_worker_once_passes_the_job_id(tmp_path):
+    queue = JobQueue(str(tmp_path), node="a")
+    job_id, = _submit(queue, 1)
+    seen = []
+    run_worker(queue, lambda config: seen.append(config) or "out.mp4", once=True, thermal=False)
+    assert seen[0]["jobId"] == job_id and seen[0]["videoSubject"] == "job 0"
+    assert [j["result"] for j in queue.jobs("done")] == ["out.mp4"]
@@ -0,0 +1,37 @@
+import numpy as np
+
+from overlay import Patch, blend, place
+
+
+def _patch(color: np.ndarray, alpha: np.ndarray) -> Patch:
+    alpha = alpha.astype(np.uint32)[..., None]
+    premul = color.astype(np.uint32) * alpha
+    return Patch(premul=premul, inv_alpha=np.broadcast_to(255 - alpha, premul.shape).copy(),
+                 w=color.shape[1], h=color.shape[0])
+
+
+def test_blend_is_exact_over_every_value_and_alpha():
+    # one row per background value, one column per alpha
+    background = np.repeat(np.arange(256, dtype=np.uint8)[:, None, None], 256 * 3, axis=1).reshape(256, 256, 3)
+    alpha = np.tile(np.arange(256), (256, 1))
+    for color in (0, 1, 127, 128, 254, 255):
+        frame = background.copy()
+        blend(frame, _patch(np.full((256, 256, 3), color), alpha), 0, 0)
+        exact = background.astype(np.int64) * (255 - alpha[..., None]) + color * alpha[..., None]
+        # round half up of exact / 255
+        assert np.array_equal(frame, (2 * exact + 255) // 510)
+
+
+def test_blend_clips_to_the_frame():
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    patch = _patch(np.full((3, 3, 3), 255), np.full((3, 3), 255))
+    blend(frame, patch, 2, -1)
+    assert frame[:, :, 0].tolist() == [[0, 0, 255, 255], [0, 0, 255, 255], [0, 0, 0, 0], [0, 0, 0, 0]]
+    blend(frame, patch, 10, 10)  # entirely outside: nothing to do
+
+
+def test_place():
+    patch = _patch(np.zeros((10, 20, 3)), np.zeros((10, 20)))
+    assert place(patch, 100, 200, "center,center") == (40, 95)
+    assert place(patch, 100, 200, "left,top") == (0, 0)
+    assert place(patch, 100, 200, "right,bottom") == (80, 190)
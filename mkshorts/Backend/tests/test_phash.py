@@ -0,0 +1,53 @@
+import numpy as np
+
+from PIL import Image
+
+from phash import DUPLICATE_DISTANCE, PhashIndex, dhash, hamming, image_hash, is_near_duplicate
+
+RISING = np.tile(np.arange(9, dtype=np.int16), (8, 1))
+
+
+def test_dhash_of_gradients():
+    # every pixel brighter than its left neighbour sets every bit, and none when falling
+    assert dhash(RISING) == np.uint64(2**64 - 1)
+    assert dhash(RISING[:, ::-1]) == np.uint64(0)
+
+
+def test_dhash_bit_order():
+    gray = np.zeros((8, 9), dtype=np.int16)
+    gray[0, 1] = 1  # first row, first comparison: the most significant bit
+    assert dhash(gray) == np.uint64(1 << 63)
+    gray = np.zeros((8, 9), dtype=np.int16)
+    gray[7, 8] = 1  # last row, last comparison: the least significant bit
+    assert dhash(gray) == np.uint64(1)
+
+
+def test_hamming_distances():
+    a = np.array([0, 0xFF, 2**64 - 1], dtype=np.uint64)
+    b = np.array([0, 0xF0F0], dtype=np.uint64)
+    assert hamming(a, b).tolist() == [[0, 8], [8, 8], [64, 56]]
+
+
+def test_image_hash_ignores_brightness_and_scale():
+    pixels = np.random.default_rng(0).integers(0, 200, (90, 160), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    brighter = Image.fromarray(np.clip(pixels.astype(np.int16) + 40, 0, 255).astype(np.uint8))
+    bigger = image.resize((640, 360), Image.BILINEAR)
+    h = np.array([image_hash(image)], dtype=np.uint64)
+    assert hamming(h, np.array([image_hash(brighter)], dtype=np.uint64))[0, 0] <= 2
+    assert hamming(h, np.array([image_hash(bigger)], dtype=np.uint64))[0, 0] <= DUPLICATE_DISTANCE
+
+
+def test_index_round_trip_and_duplicates(tmp_path):
+    path = str(tmp_path / "index.npz")
+    index = PhashIndex(path)
+    index.add("clip:a", [0, 1])
+    index.add("clip:b", [2**64 - 1])
+    index.save()
+
+    loaded = PhashIndex(path)
+    assert loaded.get("clip:a").tolist() == [0, 1]
+    assert loaded.nearest(np.array([3], dtype=np.uint64), ["clip:a", "clip:b"]) == ("clip:a", 1)
+    assert is_near_duplicate(np.array([0xFF], dtype=np.uint64), ["clip:a"], loaded)
+    assert not is_near_duplicate(np.array([0xFFFFFF], dtype=np.uint64), ["clip:a"], loaded)
+    assert not is_near_duplicate(np.array([0], dtype=np.uint64), [], loaded)
@@ -0,0 +1,98 @@
+import os
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from moviepy.config import FFMPEG_BINARY
+
+import probe
+
+from probe import SIDECAR_SUFFIX
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / "clip.mp4")
+    # 1 s GOPs: keyframes at 0, 1 and 2 s
+    subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-f", "lavfi", "-i",
+                    "testsrc=size=160x90:rate=10:duration=3", "-g", "10", "-pix_fmt", "yuv420p", path], check=True)
+    return path
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    counts = {"probe": 0, "keyframes": 0}
+    parse, keyframes = probe.ffmpeg_parse_infos, probe.keyframe_times
+
+    def counted_parse(path):
+        counts["probe"] += 1
+        return parse(path)
+
+    def counted_keyframes(path):
+        counts["keyframes"] += 1
+        return keyframes(path)
+
+    monkeypatch.setattr(probe, "ffmpeg_parse_infos", counted_parse)
+    monkeypatch.setattr(probe, "keyframe_times", counted_keyframes)
+    monkeypatch.setattr(probe, "_memory", {})
+    return counts
+
+
+def test_probe_reads_the_file_once(clip, calls):
+    info = probe.probe(clip)
+    assert info.size == (160, 90) and info.fps == 10 and info.duration == pytest.approx(3, abs=0.1)
+    assert info.has_video and info.audio_fps is None and info.keyframes is None
+    assert os.path.exists(clip + SIDECAR_SUFFIX)
+
+    assert probe.probe(clip) == info
+    probe._memory.clear()  # a new process only has the sidecar
+    assert probe.probe(clip) == info
+    assert probe.duration(clip) == info.duration
+    assert calls["probe"] == 1
+
+
+def test_changed_file_is_probed_again(clip, calls, tmp_path):
+    probe.probe(clip)
+    st = os.stat(clip)
+    os.utime(clip, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    probe.probe(clip)
+    assert calls["probe"] == 2
+
+    # a new file of another size under the same name, with the old mtime
+    subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-f", "lavfi", "-i",
+                    "testsrc=size=320x180:rate=10:duration=1", "-pix_fmt", "yuv420p",
+                    str(tmp_path / "other.mp4")], check=True)
+    shutil.copyfile(str(tmp_path / "other.mp4"), clip)
+    st = os.stat(clip)
+    os.utime(clip, ns=(st.st_atime_ns, st.st_mtime_ns - 2_000_000_000))
+    probe._memory.clear()
+    assert probe.probe(clip).size == (320, 180)
+    assert calls["probe"] == 3
+
+
+def test_stale_or_broken_sidecar_is_ignored(clip, calls):
+    probe.probe(clip)
+    with open(clip + SIDECAR_SUFFIX) as f:
+        data = json.load(f)
+    data["key"][1] += 1
+    with open(clip + SIDECAR_SUFFIX, "w") as f:
+        json.dump(data, f)
+    probe._memory.clear()
+    probe.probe(clip)
+    with open(clip + SIDECAR_SUFFIX, "w") as f:
+        f.write("{")
+    probe._memory.clear()
+    probe.probe(clip)
+    assert calls["probe"] == 3
+
+
+def test_keyframes_are_indexed_once(clip, calls):
+    probe.probe(clip)
+    info = probe.probe(clip, keyframes=True)
+    assert info.keyframes == pytest.approx((0.0, 1.0, 2.0), abs=0.05)
+    probe._memory.clear()
+    assert probe.probe(clip, keyframes=True).keyframes == info.keyframes
+    assert probe.probe(clip).keyframes == info.keyframes
+    assert calls == {"probe": 1, "keyframes": 1}
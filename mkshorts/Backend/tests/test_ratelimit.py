@@ -0,0 +1,66 @@
+import pytest
+
+import ratelimit
+import search
+
+from ratelimit import QuotaExceeded, TokenBucket, UnitQuota
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return str(tmp_path / "quota.json")
+
+
+def test_bucket_refuses_past_the_burst(ledger):
+    bucket = TokenBucket("pexels", rate=1 / 3600, burst=2, path=ledger)
+    bucket.acquire(max_wait=0)
+    bucket.acquire(max_wait=0)
+    with pytest.raises(QuotaExceeded):
+        bucket.acquire(max_wait=0)
+
+
+def test_unit_quota_refuses_at_the_limit(ledger):
+    quota = UnitQuota("youtube", 2 * 1600, {"videos.insert": 1600}, path=ledger)
+    assert quota.charge("videos.insert") == 1600
+    assert quota.charge("videos.insert") == 0
+    with pytest.raises(QuotaExceeded):
+        quota.charge("videos.insert")
+
+
+def test_exhausted_unit_quota_refuses(ledger):
+    quota = UnitQuota("youtube", 10000, ratelimit.YOUTUBE_COSTS, path=ledger)
+    quota.exhaust()
+    with pytest.raises(QuotaExceeded):
+        quota.charge("channels.list")
+
+
+def test_remaining_counts_whole_uploads(ledger):
+    quota = UnitQuota("youtube", ratelimit.YOUTUBE_DAILY_UNITS, ratelimit.YOUTUBE_COSTS, path=ledger)
+    quota.charge("videos.insert")
+    left = ratelimit.remaining(ledger)["youtube"]
+    assert left["units"] == ratelimit.YOUTUBE_DAILY_UNITS - 1600
+    assert left["uploads"] == left["units"] // (1600 + 1)
+
+
+def test_reported_zero_with_past_reset_is_not_exhausted(ledger):
+    bucket = TokenBucket("pexels", rate=1, burst=5, path=ledger)
+    bucket.record_headers({"X-Ratelimit-Remaining": "0", "X-Ratelimit-Reset": "1"})
+    assert not ratelimit.remaining(ledger)["pexels"]["exhausted"]
+    bucket.acquire(max_wait=0)
+
+
+class _Response:
+    status_code = 429
+    headers = {}
+
+
+def test_429_exhausts_pexels_and_search_falls_back(ledger, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ratelimit, "pexels", TokenBucket("pexels", rate=1, burst=5, path=ledger))
+    monkeypatch.setattr(search.requests, "get", lambda *a, **kw: calls.append(a) or _Response())
+
+    assert search.search_for_stock_video_candidates("city", "key", 15, 10, use_catalog=False) == []
+    assert ratelimit.remaining(ledger)["pexels"]["exhausted"]
+    # the next term does not reach the API at all
+    assert search.search_for_stock_video_candidates("sea", "key", 15, 10, use_catalog=False) == []
+    assert len(calls) == 1
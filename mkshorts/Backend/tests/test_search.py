@@ -0,0 +1,37 @@
+from search import rank_renditions, rendition_cost
+
+
+def _file(w, h, fps=30, size=None, file_type="video/mp4", link=None):
+    return {"width": w, "height": h, "fps": fps, "size": size, "file_type": file_type,
+            "link": link or f"https://videos.pexels.com/{w}x{h}-{fps}.mp4"}
+
+
+def test_smallest_rendition_that_covers_the_target_wins():
+    video = {"video_files": [_file(3840, 2160), _file(2560, 1440), _file(1920, 1080), _file(1280, 720)]}
+    # a 9:16 crop of 2560x1440 is 810x1440, too short for 1920; 3840x2160 gives 1215x2160
+    assert rank_renditions(video)[0]["width"] == 3840
+
+
+def test_portrait_source_needs_the_least_decoding():
+    video = {"video_files": [_file(3840, 2160), _file(1080, 1920), _file(2160, 3840)]}
+    assert [f["width"] for f in rank_renditions(video)] == [1080, 2160, 3840]
+
+
+def test_lower_frame_rate_is_cheaper_to_decode():
+    assert rendition_cost(_file(1080, 1920, fps=25)) < rendition_cost(_file(1080, 1920, fps=60))
+
+
+def test_upscaling_comes_last_largest_first():
+    video = {"video_files": [_file(640, 360), _file(1280, 720), _file(1080, 1920)]}
+    assert [f["width"] for f in rank_renditions(video)] == [1080, 1280, 640]
+
+
+def test_only_mp4_with_a_link():
+    video = {"video_files": [_file(1080, 1920, file_type="video/quicktime"),
+                             dict(_file(1080, 1920), link=None), _file(720, 1280)]}
+    assert [f["width"] for f in rank_renditions(video)] == [720]
+
+
+def test_equal_decode_cost_prefers_fewer_bytes():
+    small, large = _file(1080, 1920, size=5_000_000), _file(1080, 1920, size=9_000_000)
+    assert rank_renditions({"video_files": [large, small]})[0] is small
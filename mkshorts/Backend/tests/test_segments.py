@@ -0,0 +1,47 @@
+import subprocess
+
+import pytest
+
+from moviepy.config import FFMPEG_BINARY
+
+from probe import keyframe_times
+from segments import plan_segments, render_segmented, verify_against_serial
+from subtitles import Subtitles
+
+FPS = 24
+SECONDS = 5
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    d = tmp_path_factory.mktemp("segments")
+    video, audio = str(d / "bg.mp4"), str(d / "tts.mp3")
+    subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-f", "lavfi", "-i",
+                    f"testsrc=size=180x320:rate={FPS}:duration={SECONDS}", "-pix_fmt", "yuv420p", video], check=True)
+    subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-f", "lavfi", "-i",
+                    f"sine=frequency=440:duration={SECONDS}", audio], check=True)
+    return d, video, audio
+
+
+def test_plan_segments_is_gop_aligned():
+    # 2 s GOPs at 24 fps; the remainder is the last, shorter segment
+    assert plan_segments(5, FPS, 2) == [(0, 48), (48, 96), (96, 120)]
+    assert plan_segments(5, FPS, 4) == [(0, 96), (96, 120)]
+    # lengths are rounded to whole GOPs
+    assert plan_segments(5, FPS, 1) == plan_segments(5, FPS, 2)
+
+
+def test_segmented_render_matches_serial(clip):
+    from video import generate_video
+
+    d, video, audio = clip
+    subtitles = Subtitles.from_srt("1\n00:00:00,500 --> 00:00:03,000\nHello there\n")
+    segmented = render_segmented(video, audio, subtitles, str(d / "segmented.mp4"), workers=2, segment_seconds=2)
+    serial = generate_video(video, audio, subtitles, 1, "center,center", "#FFFFFF", "rgba(0, 0, 0, 180)",
+                            subtitle_renderer="numpy", output_path=str(d / "serial.mp4"))
+
+    report = verify_against_serial(segmented, serial)
+    assert report["frames_segmented"] == report["frames_serial"] == FPS * SECONDS
+    assert report["ok"]
+    # every segment starts on its own IDR frame, so the cuts sit on the GOP grid
+    assert keyframe_times(segmented) == pytest.approx((0.0, 2.0, 4.0), abs=0.5 / FPS)
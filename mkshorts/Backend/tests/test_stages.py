@@ -0,0 +1,23 @@
+import os
+import json
+
+import alog
+
+from stages import run_stage
+
+
+def test_worker_records_reach_the_parents_log(tmp_path):
+    path = str(tmp_path / "alog.log")
+    # start over with a log of our own; importing video has set up /app/log
+    alog._stop()
+    alog.setup(path)
+    try:
+        assert run_stage("os", "getpid") != os.getpid()
+        run_stage("alog", "log", msg="from the worker")
+    finally:
+        alog._stop()
+    with open(path) as f:
+        entries = [json.loads(line) for line in f]
+    assert any(e["msg"] == "from the worker" for e in entries)
+    # the parent logged both stages after their workers had exited
+    assert [e["stage"] for e in entries if e.get("event") == "stage"] == ["getpid", "log"]
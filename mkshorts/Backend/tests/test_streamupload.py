@@ -0,0 +1,59 @@
+import os
+import time
+import hashlib
+
+import streamupload
+
+from streamupload import CHUNK_GRANULARITY, RequestsTransport, standin_server, start_session, stream_upload
+
+
+class RecordingTransport(RequestsTransport):
+    def __init__(self, rendering):
+        super().__init__()
+        self.rendering = rendering
+        self.puts = []
+
+    def request(self, method, url, headers=None, data=None, params=None):
+        if method == "PUT" and data:
+            self.puts.append({"range": headers["Content-Range"], "length": len(data),
+                              "rendering": self.rendering()})
+        return super().request(method, url, headers=headers, data=data, params=params)
+
+
+def test_streams_a_growing_file_to_the_standin(tmp_path, monkeypatch):
+    monkeypatch.setattr(streamupload, "POLL_SECONDS", 0.01)
+    path = str(tmp_path / "out.mp4")
+    # fragments of uneven sizes, so chunk boundaries fall inside them
+    fragments = [os.urandom(n) for n in (100_000, 300_000, 50_000, 700_000, 123_457)]
+    state = {"rendering": True}
+
+    def render():
+        with open(path, "wb") as f:
+            for fragment in fragments:
+                f.write(fragment)
+                f.flush()
+                time.sleep(0.05)
+        state["rendering"] = False
+        return path
+
+    server = standin_server()
+    try:
+        transport = RecordingTransport(lambda: state["rendering"])
+        host, port = server.server_address
+        session_url = start_session(transport, {"snippet": {}, "status": {}}, f"http://{host}:{port}/upload")
+        result = stream_upload(render, path, session_url, transport, chunk_bytes=CHUNK_GRANULARITY)
+    finally:
+        server.shutdown()
+
+    expected = b"".join(fragments)
+    assert result["bytes"] == len(expected)
+    assert result["sha1"] == hashlib.sha1(expected).hexdigest()
+
+    *partial, final = transport.puts
+    assert partial, "nothing was uploaded while the file was still growing"
+    assert all(p["length"] % CHUNK_GRANULARITY == 0 for p in partial)
+    assert all(p["range"].endswith("/*") for p in partial)
+    # only the last request carries the total, and only after the last fragment was written
+    assert final["range"].endswith(f"/{len(expected)}")
+    assert not final["rendering"]
+    assert any(p["rendering"] for p in partial)
@@ -0,0 +1,55 @@
+import pytest
+
+from subtitles import Subtitles, split_greedy
+
+
+def test_split_greedy_breaks_between_words():
+    assert split_greedy("one two three four", 9) == ["one two", "three", "four"]
+    assert split_greedy("supercalifragilistic is", 5) == ["supercalifragilistic", "is"]
+    assert split_greedy("", 5) == []
+
+
+def test_from_durations_lays_lines_back_to_back():
+    subs = Subtitles.from_durations(["a", "b", "c"], [1.5, 2.0, 0.5])
+    assert len(subs) == 3
+    assert list(subs) == [((0.0, 1.5), "a"), ((1.5, 3.5), "b"), ((3.5, 4.0), "c")]
+    assert subs[1] == ((1.5, 3.5), "b")
+    assert subs.end == 4.0
+    assert Subtitles().end == 0.0
+
+
+def test_srt_round_trip():
+    subs = Subtitles([0.0, 1.25, 3661.5], [1.25, 2.0, 3662.007], ["hello", "two\nlines", "late"])
+    text = subs.to_srt()
+    assert "01:01:01,500 --> 01:01:02,007" in text
+    back = Subtitles.from_srt(text)
+    assert back.texts == subs.texts
+    assert list(back.starts) == pytest.approx(list(subs.starts))
+    assert list(back.ends) == pytest.approx(list(subs.ends))
+
+
+def test_from_srt_accepts_crlf_and_dot_millis():
+    subs = Subtitles.from_srt("1\r\n00:00:01.5 --> 00:00:02.250\r\nhi\r\n\r\n2\r\n00:00:03,000 --> 00:00:04,000\r\nthere\r\n")
+    assert list(subs) == [((1.5, 2.25), "hi"), ((3.0, 4.0), "there")]
+
+
+def test_active_finds_the_line_shown_at_t():
+    subs = Subtitles([0.0, 2.0, 5.0], [1.0, 4.0, 6.0], ["a", "b", "c"])
+    assert [subs.active(t) for t in (0.0, 0.99, 1.0, 1.5, 2.0, 3.99, 4.0, 5.5, 6.0, -1.0)] == \
+        [0, 0, -1, -1, 1, 1, -1, 2, -1, -1]
+
+
+def test_equalize_shares_time_by_chunk_length():
+    subs = Subtitles([10.0], [16.0], ["aaaa bb cccccc"]).equalize(max_chars=6)
+    assert subs.texts == ["aaaa", "bb", "cccccc"]
+    assert list(subs.starts) == pytest.approx([10.0, 12.0, 13.0])
+    assert list(subs.ends) == pytest.approx([12.0, 13.0, 16.0])
+    short = Subtitles([0.0], [1.0], ["short"]).equalize(max_chars=10)
+    assert list(short) == [((0.0, 1.0), "short")]
+
+
+def test_slice_clips_and_shifts():
+    subs = Subtitles([0.0, 2.0, 5.0], [1.0, 4.0, 6.0], ["a", "b", "c"])
+    part = subs.slice(3.0, 5.5)
+    assert list(part) == [((0.0, 1.0), "b"), ((2.0, 2.5), "c")]
+    assert len(subs.slice(1.0, 2.0)) == 0
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import thermal
+
+from thermal import COOLDOWN_PER_C, START_MAX_C, Scheduler, ThermalSensor
+
+
+class FakeSysfs:
+    """
+    The sysfs files ThermalSensor reads, in a temp dir.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.zone, self.freq = root / "temp", root / "scaling_cur_freq"
+        self.max_freq, self.throttled = root / "cpuinfo_max_freq", root / "get_throttled"
+        self.max_freq.write_text("1800000\n")
+
+    def set(self, temp_c=None, freq_mhz=None, flags=None):
+        for path, value in ((self.zone, temp_c and int(temp_c * 1000)),
+                            (self.freq, freq_mhz and int(freq_mhz * 1000)),
+                            (self.throttled, flags)):
+            if value is None:
+                path.unlink(missing_ok=True)
+            else:
+                path.write_text(f"{value}\n")
+
+    def sensor(self):
+        return ThermalSensor(str(self.zone), str(self.freq), str(self.max_freq), str(self.throttled))
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    return FakeSysfs(tmp_path)
+
+
+@pytest.fixture
+def scheduler(sysfs, tmp_path):
+    return Scheduler(sysfs.sensor(), state_path=str(tmp_path / "state" / "thermal.json"))
+
+
+def test_readings(sysfs):
+    sysfs.set(temp_c=61.5, freq_mhz=1500)
+    sensor = sysfs.sensor()
+    assert sensor.temperature() == 61.5
+    assert sensor.frequency_mhz() == 1500
+    assert sensor.max_frequency_mhz() == 1800
+    assert sensor.available()
+    sysfs.set()
+    assert sensor.temperature() is None and not sensor.available()
+
+
+@pytest.mark.parametrize("temp_c, threads", [(None, 4), (50, 4), (69.9, 4), (70, 2), (74.9, 2), (75, 1), (82, 1)])
+def test_threads_scale_with_temperature(sysfs, scheduler, temp_c, threads):
+    sysfs.set(temp_c=temp_c)
+    assert scheduler.threads(4) == threads
+
+
+def test_threads_never_drop_to_zero(sysfs, scheduler):
+    sysfs.set(temp_c=72)
+    assert scheduler.threads(1) == 1
+
+
+def test_ready_without_sensor_file(sysfs, scheduler):
+    scheduler.record(85)
+    assert scheduler.ready()
+
+
+def test_ready_below_start_temperature_only(sysfs, scheduler):
+    sysfs.set(temp_c=START_MAX_C - 1)
+    assert scheduler.ready()
+    sysfs.set(temp_c=START_MAX_C)
+    assert not scheduler.ready()
+
+
+def test_cooldown_after_a_hot_render(sysfs, scheduler, monkeypatch):
+    sysfs.set(temp_c=START_MAX_C - 5)
+    now = time.time()
+    monkeypatch.setattr(thermal.time, "time", lambda: now)
+    scheduler.record(START_MAX_C + 10)
+    assert scheduler.cooldown_remaining() == pytest.approx(10 * COOLDOWN_PER_C)
+    assert not scheduler.ready()
+
+    monkeypatch.setattr(thermal.time, "time", lambda: now + 10 * COOLDOWN_PER_C + 1)
+    assert scheduler.cooldown_remaining() == 0 and scheduler.ready()
+
+    scheduler.record(START_MAX_C - 3)  # a cool render leaves no cooldown
+    assert scheduler.ready()
+    scheduler.record(None)  # nothing measured: the previous state stays
+    assert scheduler.cooldown_remaining() == 0
+
+
+def test_firmware_flags_decide_throttling(sysfs):
+    sensor = sysfs.sensor()
+    sysfs.set(temp_c=60, freq_mhz=600, flags="0x50005")
+    assert sensor.firmware_flags() == 0x50005
+    assert sensor.throttled()  # currently throttled (bit 2)
+    sysfs.set(temp_c=60, freq_mhz=600, flags="0x50000")
+    assert not sensor.throttled()  # only "has happened" bits; a low idle clock is not throttling
+    sysfs.set(temp_c=80, freq_mhz=1800, flags="0x0")
+    assert sensor.throttled()
+
+
+def test_clock_fallback_needs_a_busy_cpu(sysfs, monkeypatch):
+    times = iter([(0, 100), (90, 200), (90, 200), (95, 300)])
+    monkeypatch.setattr(thermal, "_cpu_times", lambda: next(times))
+    sensor = sysfs.sensor()
+    sysfs.set(temp_c=60, freq_mhz=1000)
+    assert sensor.throttled()  # 90% busy at 1000 of 1800 MHz
+    assert not sensor.throttled()  # no time passed
+    assert not sensor.throttled()  # 5% busy: the governor clocked down
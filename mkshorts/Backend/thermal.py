@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import argparse
+import threading
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from termcolor import colored
+
+import alog
+
+# sysfs files; overridable so tests and other boards can point them elsewhere
+THERMAL_ZONE_PATH = os.getenv("MKSHORTS_THERMAL_ZONE", "/sys/class/thermal/thermal_zone0/temp")
+CPU_FREQ_PATH = os.getenv("MKSHORTS_CPU_FREQ", "/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq")
+CPU_MAX_FREQ_PATH = os.getenv("MKSHORTS_CPU_MAX_FREQ", "/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq")
+# The firmware's own throttling flags (what `vcgencmd get_throttled` prints), in hex
+GET_THROTTLED_PATH = os.getenv("MKSHORTS_THROTTLED", "/sys/devices/platform/soc/soc:firmware/get_throttled")
+PROC_STAT_PATH = "/proc/stat"
+# When the last render ended and how hot it got, shared by every main() on this node
+STATE_PATH = "/app/cache/thermal.json"
+
+# A Pi 4 starts throttling at 80°C (85°C hard limit)
+THROTTLE_C = 80
+# Above this a render gets fewer encoder threads, above HOT_C just one
+WARM_C = 70
+HOT_C = 75
+# A job does not start above this...
+START_MAX_C = 65
+# ...nor until the previous render's heat had time to go: this many seconds per degree
+# its peak was above START_MAX_C
+COOLDOWN_PER_C = 10
+# After this long a deferred job starts anyway, with reduced threads
+MAX_DEFER_SECONDS = 1800
+# get_throttled bits that mean "slowed down right now": ARM frequency capped,
+# currently throttled, soft temperature limit active
+THROTTLED_NOW_MASK = 0x2 | 0x4 | 0x8
+# Without the firmware flags, a core clocked below this share of its maximum while
+# at least BUSY_RATIO of the CPU time is in use counts as throttled; an idle
+# ondemand/schedutil governor clocks down on its own
+THROTTLE_FREQ_RATIO = 0.95
+BUSY_RATIO = 0.5
+SAMPLE_SECONDS = 2.0
+
+
+def _read_int(path: str, base: int = 10) -> Optional[int]:
+    try:
+        with open(path) as f:
+            return int(f.read().strip(), base)
+    except (OSError, ValueError):
+        return None
+
+
+def _cpu_times(path: str = PROC_STAT_PATH) -> Optional[tuple]:
+    # (busy, total) jiffies over all cores, from the aggregate "cpu" line
+    try:
+        with open(path) as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = sum(fields[3:5])  # idle + iowait
+    return sum(fields) - idle, sum(fields)
+
+
+class ThermalSensor:
+    """
+    Reads the SoC temperature, CPU clock and firmware throttling flags from sysfs.
+    Every reading is None when the file does not exist (not a Pi, or inside a
+    container without /sys).
+    """
+
+    def __init__(self, zone_path: str = THERMAL_ZONE_PATH, freq_path: str = CPU_FREQ_PATH,
+                 max_freq_path: str = CPU_MAX_FREQ_PATH, throttled_path: str = GET_THROTTLED_PATH):
+        self.zone_path = zone_path
+        self.freq_path = freq_path
+        self.max_freq_path = max_freq_path
+        self.throttled_path = throttled_path
+        self._last_times = _cpu_times()
+
+    def temperature(self) -> Optional[float]:
+        millidegrees = _read_int(self.zone_path)
+        return millidegrees / 1000 if millidegrees is not None else None
+
+    def frequency_mhz(self) -> Optional[float]:
+        khz = _read_int(self.freq_path)
+        return khz / 1000 if khz is not None else None
+
+    def max_frequency_mhz(self) -> Optional[float]:
+        khz = _read_int(self.max_freq_path)
+        return khz / 1000 if khz is not None else None
+
+    def firmware_flags(self) -> Optional[int]:
+        return _read_int(self.throttled_path, 16)
+
+    def busy(self) -> Optional[float]:
+        """
+        Share of CPU time in use since the previous call.
+        """
+        times = _cpu_times()
+        last, self._last_times = self._last_times, times
+        if times is None or last is None or times[1] <= last[1]:
+            return None
+        return (times[0] - last[0]) / (times[1] - last[1])
+
+    def throttled(self) -> bool:
+        temp = self.temperature()
+        if temp is not None and temp >= THROTTLE_C:
+            return True
+        flags = self.firmware_flags()
+        if flags is not None:
+            return bool(flags & THROTTLED_NOW_MASK)
+        freq, max_freq, busy = self.frequency_mhz(), self.max_frequency_mhz(), self.busy()
+        return bool(freq and max_freq and busy is not None and busy >= BUSY_RATIO
+                    and freq < THROTTLE_FREQ_RATIO * max_freq)
+
+    def available(self) -> bool:
+        return self.temperature() is not None
+
+
+def _load_state(path: str) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(path: str, state: Dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+class Scheduler:
+    """
+    Decides when a render may start and how many threads it gets, from the current
+    temperature and from how hot the previous render on this node ran.
+    """
+
+    def __init__(self, sensor: Optional[ThermalSensor] = None, state_path: str = STATE_PATH):
+        self.sensor = sensor or ThermalSensor()
+        self.state_path = state_path
+
+    def cooldown_remaining(self) -> float:
+        state = _load_state(self.state_path)
+        if "ended" not in state:
+            return 0.0
+        gap = max(0.0, state.get("peak_c", 0) - START_MAX_C) * COOLDOWN_PER_C
+        return max(0.0, state["ended"] + gap - time.time())
+
+    def ready(self) -> bool:
+        """
+        Whether a job may start now; always True without a sensor.
+        """
+        temp = self.sensor.temperature()
+        if temp is None:
+            return True
+        return temp < START_MAX_C and self.cooldown_remaining() <= 0
+
+    def wait_until_ready(self, max_wait: float = MAX_DEFER_SECONDS, poll: float = 15) -> float:
+        """
+        Defers the caller until the device has cooled down.
+
+        Returns:
+            float: The seconds waited.
+        """
+        start = time.monotonic()
+        announced = False
+        while not self.ready() and time.monotonic() - start < max_wait:
+            if not announced:
+                print(colored(f"[*] Deferring render: {self.sensor.temperature():.1f}°C, "
+                              f"cooldown {self.cooldown_remaining():.0f}s", "yellow"))
+                announced = True
+            time.sleep(poll)
+        waited = time.monotonic() - start
+        if announced:
+            alog.event("thermal_defer", waited_s=round(waited, 1), temp_c=self.sensor.temperature())
+        return waited
+
+    def threads(self, requested: int) -> int:
+        """
+        Scales an encoder thread count down when the device is warm.
+        """
+        temp = self.sensor.temperature()
+        if temp is None or temp < WARM_C:
+            return requested
+        if temp < HOT_C:
+            return max(1, requested // 2)
+        return 1
+
+    def record(self, peak_c: Optional[float]) -> None:
+        if peak_c is not None:
+            _save_state(self.state_path, {"ended": time.time(), "peak_c": peak_c})
+
+
+class ThermalWatch(threading.Thread):
+    """
+    Samples temperature and clock while a render runs and collects the spans in
+    which the CPU was throttled.
+    """
+
+    def __init__(self, sensor: ThermalSensor, interval: float = SAMPLE_SECONDS):
+        super().__init__(daemon=True)
+        self.sensor = sensor
+        self.interval = interval
+        self.stop = threading.Event()
+        self.started = time.monotonic()
+        self.temps: List[float] = []
+        self.freqs: List[float] = []
+        self.events: List[Dict] = []
+        self._throttle_start = None
+
+    def _sample(self) -> None:
+        now = time.monotonic() - self.started
+        temp, freq = self.sensor.temperature(), self.sensor.frequency_mhz()
+        if temp is not None:
+            self.temps.append(temp)
+        if freq is not None:
+            self.freqs.append(freq)
+        if self.sensor.throttled():
+            if self._throttle_start is None:
+                self._throttle_start = now
+                self.events.append({"at_s": round(now, 1), "temp_c": temp, "freq_mhz": freq})
+            self.events[-1]["seconds"] = round(now - self._throttle_start + self.interval, 1)
+            if freq is not None:
+                self.events[-1]["freq_mhz"] = min(self.events[-1]["freq_mhz"] or freq, freq)
+        else:
+            self._throttle_start = None
+
+    def run(self):
+        self._sample()
+        while not self.stop.wait(self.interval):
+            self._sample()
+
+    def summary(self, frames: Optional[int] = None) -> Dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "seconds": round(elapsed, 1),
+            "fps": round(frames / elapsed, 2) if frames and elapsed else None,
+            "peak_c": max(self.temps) if self.temps else None,
+            "min_freq_mhz": min(self.freqs) if self.freqs else None,
+            "max_freq_mhz": self.sensor.max_frequency_mhz(),
+            "throttled_s": round(sum(e.get("seconds", 0) for e in self.events), 1),
+            "throttle_events": self.events,
+        }
+
+
+@contextmanager
+def watch(label: str, scheduler: Scheduler, interval: float = SAMPLE_SECONDS):
+    """
+    Watches a render. Set `frames` on the yielded object before the block ends to get
+    the render fps next to the throttling in the "thermal" log event.
+
+    Example:
+        with watch("render", scheduler) as w:
+            path = render()
+            w.frames = count_frames(path)
+    """
+    watcher = ThermalWatch(scheduler.sensor, interval)
+    watcher.frames = None
+    if scheduler.sensor.available():
+        watcher.start()
+    try:
+        yield watcher
+    finally:
+        if watcher.is_alive():
+            watcher.stop.set()
+            watcher.join()
+            watcher._sample()
+            summary = watcher.summary(watcher.frames)
+            scheduler.record(summary["peak_c"])
+            alog.event("thermal", label=label, **summary)
+            if summary["throttle_events"]:
+                print(colored(f"[-] {label}: throttled {summary['throttled_s']}s, peak "
+                              f"{summary['peak_c']}°C, {summary['fps']} fps", "yellow"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the thermal state the render scheduler sees.")
+    parser.add_argument("--watch", type=float, help="Sample every N seconds until interrupted.")
+    args = parser.parse_args()
+    scheduler = Scheduler()
+    while True:
+        s = scheduler.sensor
+        print(json.dumps({"temp_c": s.temperature(), "freq_mhz": s.frequency_mhz(),
+                          "max_freq_mhz": s.max_frequency_mhz(), "firmware_flags": s.firmware_flags(),
+                          "throttled": s.throttled(),
+                          "ready": scheduler.ready(), "cooldown_s": round(scheduler.cooldown_remaining()),
+                          "threads_for_4": scheduler.threads(4)}))
+        if not args.watch:
+            break
+        time.sleep(args.watch)
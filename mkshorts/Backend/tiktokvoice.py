@@ -6,11 +6,14 @@
 
 # --- MODIFIED VERSION --- #
 
+import time
 import base64
 import requests
 import threading
 
-from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional
 from termcolor import colored
 from playsound import playsound
 
@@ -70,7 +73,6 @@ ENDPOINTS = [
     "https://tiktok-tts.weilnet.workers.dev/api/generation",
     "https://tiktoktts.com/api/tiktok-tts",
 ]
-current_endpoint = 0
 # in one conversion, the text can have a maximum length of 300 characters
 TEXT_BYTE_LIMIT = 300
 
@@ -94,11 +96,185 @@ def split_string(string: str, chunk_size: int) -> List[str]:
     return result
 
 
-# checking if the website that provides the service is available
-def get_api_response() -> requests.Response:
-    url = f'{ENDPOINTS[current_endpoint].split("/a")[0]}'
-    response = requests.get(url)
-    return response
+class EndpointManager:
+    """
+    Tracks rolling latency and error rate per endpoint and decides where to send
+    requests.
+
+    An endpoint that fails FAILURE_THRESHOLD times in a row is opened (skipped) for
+    OPEN_SECONDS, then gets a single half-open probe: success closes it again,
+    failure re-opens it. A request that runs past the primary endpoint's p95
+    latency is hedged to the next endpoint, and the first good answer wins.
+    """
+
+    WINDOW = 50
+    FAILURE_THRESHOLD = 3
+    OPEN_SECONDS = 60.0
+    # hedge delay until an endpoint has enough samples for a p95
+    DEFAULT_HEDGE_SECONDS = 4.0
+    MIN_SAMPLES = 5
+    REQUEST_TIMEOUT = 30
+
+    def __init__(self, endpoints: List[str]):
+        self.endpoints = endpoints
+        self.lock = threading.Lock()
+        self.latencies = [deque(maxlen=self.WINDOW) for _ in endpoints]
+        self.outcomes = [deque(maxlen=self.WINDOW) for _ in endpoints]
+        self.consecutive_failures = [0] * len(endpoints)
+        self.opened_at = [None] * len(endpoints)
+        self.probing = [False] * len(endpoints)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tts")
+        # Chunks of a long text run here, never in `executor`: a chunk waits on its
+        # endpoint calls, which would queue behind the chunks themselves
+        self.chunk_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tts-chunk")
+
+    def state(self, i: int) -> str:
+        if self.opened_at[i] is None:
+            return "closed"
+        if time.monotonic() - self.opened_at[i] >= self.OPEN_SECONDS:
+            return "half_open"
+        return "open"
+
+    def error_rate(self, i: int) -> float:
+        outcomes = self.outcomes[i]
+        return 1.0 - sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+    def percentile(self, i: int, q: float) -> Optional[float]:
+        samples = sorted(self.latencies[i])
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self, i: int) -> float:
+        if len(self.latencies[i]) < self.MIN_SAMPLES:
+            return self.DEFAULT_HEDGE_SECONDS
+        return self.percentile(i, 0.95)
+
+    def order(self) -> List[int]:
+        """
+        Returns the endpoints worth trying, best first. A half-open endpoint is
+        included only while nobody else is probing it.
+        """
+        with self.lock:
+            usable = []
+            for i in range(len(self.endpoints)):
+                state = self.state(i)
+                if state == "open" or (state == "half_open" and self.probing[i]):
+                    continue
+                usable.append(i)
+            return sorted(usable, key=lambda i: (self.error_rate(i), self.percentile(i, 0.5) or 0.0))
+
+    def _submit(self, i: int, text: str, voice: str):
+        # A half-open endpoint gets one probe: claim it here, when the call is actually
+        # made, so candidates that end up unused are not left marked as probing
+        with self.lock:
+            if self.state(i) == "half_open":
+                if self.probing[i]:
+                    return None
+                self.probing[i] = True
+        return self.executor.submit(self._call, i, text, voice)
+
+    def _submit_next(self, remaining: List[int], pending: Dict, text: str, voice: str) -> None:
+        while remaining:
+            i = remaining.pop(0)
+            future = self._submit(i, text, voice)
+            if future is not None:
+                pending[future] = i
+                return
+
+    def record(self, i: int, latency: float, ok: bool) -> None:
+        with self.lock:
+            self.outcomes[i].append(ok)
+            self.probing[i] = False
+            if ok:
+                self.latencies[i].append(latency)
+                self.consecutive_failures[i] = 0
+                self.opened_at[i] = None
+                return
+            self.consecutive_failures[i] += 1
+            if self.opened_at[i] is not None or self.consecutive_failures[i] >= self.FAILURE_THRESHOLD:
+                self.opened_at[i] = time.monotonic()
+                print(colored(f"[-] TTS endpoint {i} circuit open for {self.OPEN_SECONDS:.0f}s", "red"))
+
+    def _call(self, i: int, text: str, voice: str) -> str:
+        start = time.monotonic()
+        try:
+            audio = generate_audio(text, voice, endpoint=i, timeout=self.REQUEST_TIMEOUT)
+            data = extract_base64(audio, i)
+            if not data or data == "error":
+                raise ValueError("This voice is unavailable right now")
+        except Exception:
+            self.record(i, time.monotonic() - start, False)
+            raise
+        self.record(i, time.monotonic() - start, True)
+        return data
+
+    def request(self, text: str, voice: str) -> str:
+        """
+        Synthesizes one chunk of text, hedging to a second endpoint if the first is slow.
+
+        Returns:
+            str: The base64 audio.
+
+        Raises:
+            RuntimeError: If no endpoint is available or all attempts failed.
+        """
+        remaining = self.order()
+        pending = {}
+        self._submit_next(remaining, pending, text, voice)
+        if not pending:
+            raise RuntimeError("All TTS endpoints are open (rate limited or down)")
+
+        primary = next(iter(pending.values()))
+        errors = []
+        deadline = self.hedge_delay(primary)
+        while pending:
+            done, _ = wait(pending, timeout=deadline if remaining else None, return_when=FIRST_COMPLETED)
+            if not done:
+                # primary is slower than its p95: hedge
+                hedged = len(pending)
+                self._submit_next(remaining, pending, text, voice)
+                self.hedges += len(pending) - hedged
+                continue
+            for future in done:
+                i = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    errors.append(f"endpoint {i}: {e}")
+                    self._submit_next(remaining, pending, text, voice)
+                    continue
+                if i != primary:
+                    self.hedge_wins += 1
+                return data
+        raise RuntimeError("; ".join(errors) or "TTS request failed")
+
+    def stats(self) -> Dict:
+        """
+        Per-endpoint health for the run profile.
+        """
+        with self.lock:
+            return {
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "endpoints": [{
+                    "url": url,
+                    "state": self.state(i),
+                    "requests": len(self.outcomes[i]),
+                    "error_rate": round(self.error_rate(i), 3),
+                    "p50_s": self.percentile(i, 0.5),
+                    "p95_s": self.percentile(i, 0.95),
+                } for i, url in enumerate(self.endpoints)],
+            }
+
+
+endpoint_manager = EndpointManager(ENDPOINTS)
+
+
+def endpoint_stats() -> Dict:
+    return endpoint_manager.stats()
 
 
 # saving the audio file
@@ -109,14 +285,34 @@ def save_audio_file(base64_data: str, filename: str = "output.mp3") -> None:
 
 
 # send POST request to get the audio data
-def generate_audio(text: str, voice: str) -> bytes:
-    url = f"{ENDPOINTS[current_endpoint]}"
+def generate_audio(text: str, voice: str, endpoint: int = 0, timeout: float = None) -> bytes:
+    url = f"{ENDPOINTS[endpoint]}"
     headers = {"Content-Type": "application/json"}
     data = {"text": text, "voice": voice}
-    response = requests.post(url, headers=headers, json=data)
+    response = requests.post(url, headers=headers, json=data, timeout=timeout)
+    response.raise_for_status()
     return response.content
 
 
+# pull the base64 payload out of an endpoint's response
+def extract_base64(audio: bytes, endpoint: int) -> str:
+    if endpoint == 0:
+        return str(audio).split('"')[5]
+    return str(audio).split('"')[3].split(",")[1]
+
+
+# synthesizes text of any length; raises instead of printing, for voices.py
+def synthesize_base64(text: str, voice: str) -> str:
+    if len(text) < TEXT_BYTE_LIMIT:
+        return endpoint_manager.request(text, voice)
+    # Split longer text into smaller parts, requested in parallel
+    text_parts = split_string(text, 299)
+    futures = [endpoint_manager.chunk_executor.submit(endpoint_manager.request, part, voice)
+               for part in text_parts]
+    # Concatenate the base64 data in the correct order
+    return "".join(future.result() for future in futures)
+
+
 # creates an text to speech audio file
 def tts(
     text: str,
@@ -124,19 +320,6 @@ def tts(
     filename: str = "output.mp3",
     play_sound: bool = False,
 ) -> None:
-    # checking if the website is available
-    global current_endpoint
-
-    if get_api_response().status_code == 200:
-        print(colored("[+] TikTok TTS Service available!", "green"))
-    else:
-        current_endpoint = (current_endpoint + 1) % 2
-        if get_api_response().status_code == 200:
-            print(colored("[+] TTS Service available!", "green"))
-        else:
-            print(colored("[-] TTS Service not available and probably temporarily rate limited, try again later..." , "red"))
-            return
-
     # checking if arguments are valid
     if voice == "none":
         print(colored("[-] Please specify a voice", "red"))
@@ -152,56 +335,11 @@ def tts(
 
     # creating the audio file
     try:
-        if len(text) < TEXT_BYTE_LIMIT:
-            audio = generate_audio((text), voice)
-            if current_endpoint == 0:
-                audio_base64_data = str(audio).split('"')[5]
-            else:
-                audio_base64_data = str(audio).split('"')[3].split(",")[1]
-
-            if audio_base64_data == "error":
-                print(colored("[-] This voice is unavailable right now", "red"))
-                return
-
-        else:
-            # Split longer text into smaller parts
-            text_parts = split_string(text, 299)
-            audio_base64_data = [None] * len(text_parts)
-
-            # Define a thread function to generate audio for each text part
-            def generate_audio_thread(text_part, index):
-                audio = generate_audio(text_part, voice)
-                if current_endpoint == 0:
-                    base64_data = str(audio).split('"')[5]
-                else:
-                    base64_data = str(audio).split('"')[3].split(",")[1]
-
-                if audio_base64_data == "error":
-                    print(colored("[-] This voice is unavailable right now", "red"))
-                    return "error"
-
-                audio_base64_data[index] = base64_data
-
-            threads = []
-            for index, text_part in enumerate(text_parts):
-                # Create and start a new thread for each text part
-                thread = threading.Thread(
-                    target=generate_audio_thread, args=(text_part, index)
-                )
-                thread.start()
-                threads.append(thread)
-
-            # Wait for all threads to complete
-            for thread in threads:
-                thread.join()
-
-            # Concatenate the base64 data in the correct order
-            audio_base64_data = "".join(audio_base64_data)
-
+        audio_base64_data = synthesize_base64(text, voice)
         save_audio_file(audio_base64_data, filename)
         print(colored(f"[+] Audio file saved successfully as '{filename}'", "green"))
         if play_sound:
             playsound(filename)
 
     except Exception as e:
-        print(colored(f"[-] An error occurred during TTS: {e}", "red"))
\ No newline at end of file
+        print(colored(f"[-] An error occurred during TTS: {e}", "red"))
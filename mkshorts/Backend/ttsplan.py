@@ -0,0 +1,191 @@
+import uuid
+import subprocess
+
+import numpy as np
+
+from typing import List, Tuple
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+from tiktokvoice import TEXT_BYTE_LIMIT
+from voices import router, SENTENCE_DEADLINE_SECONDS
+
+# Silence detection runs on 16 kHz mono in 20 ms windows
+ANALYSIS_RATE = 16000
+WINDOW_SECONDS = 0.02
+# A window is silent this far below the clip's loudest window
+SILENCE_DB = -35.0
+# Pauses shorter than this are treated as part of a word
+MIN_GAP_SECONDS = 0.08
+# How much a gap's distance from the expected boundary counts against its length
+DRIFT_WEIGHT = 0.5
+# A sentence ending in one of these is sent as is; others get a period
+TERMINAL_PUNCTUATION = ".!?…。！？"
+
+
+def spoken(sentence: str) -> str:
+    # The period marks the boundary the silence detection looks for; "Really?." would
+    # be read out or paused on twice
+    return sentence if sentence.endswith(tuple(TERMINAL_PUNCTUATION)) else f"{sentence}."
+
+
+def pack_sentences(sentences: List[str], limit: int = TEXT_BYTE_LIMIT) -> List[List[int]]:
+    """
+    Packs consecutive sentences into as few requests as possible.
+
+    Filling each request greedily is optimal when the order must be kept. A sentence
+    that is longer than the limit on its own gets a request to itself, and the TikTok
+    backend splits it.
+
+    Args:
+        sentences (List[str]): The sentences, in order.
+        limit (int): Maximum characters per request.
+
+    Returns:
+        List[List[int]]: The sentence indices of each request.
+    """
+    requests = []
+    current, length = [], 0
+    for i, sentence in enumerate(sentences):
+        added = len(spoken(sentence)) + (1 if current else 0)  # and a space before it
+        if current and length + added >= limit:
+            requests.append(current)
+            current, length = [], 0
+            added = len(spoken(sentence))
+        current.append(i)
+        length += added
+    if current:
+        requests.append(current)
+    return requests
+
+
+def request_text(sentences: List[str], indices: List[int]) -> str:
+    return " ".join(spoken(sentences[i]) for i in indices)
+
+
+def _read_mono(path: str) -> np.ndarray:
+    cmd = [FFMPEG_BINARY, "-v", "error", "-i", path, "-f", "s16le", "-ac", "1",
+           "-ar", str(ANALYSIS_RATE), "-"]
+    raw = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(raw, dtype=np.int16).astype(np.float32)
+
+
+def silence_gaps(samples: np.ndarray, rate: int = ANALYSIS_RATE) -> Tuple[List[Tuple[float, float]], float]:
+    """
+    Finds the pauses between speech.
+
+    Returns:
+        Tuple[List[Tuple[float, float]], float]: (start, end) of every interior pause
+            in seconds, and the clip duration.
+    """
+    window = int(rate * WINDOW_SECONDS)
+    n = len(samples) // window
+    duration = len(samples) / rate
+    if n == 0:
+        return [], duration
+    rms = np.sqrt((samples[:n * window].reshape(n, window) ** 2).mean(axis=1))
+    threshold = rms.max() * 10 ** (SILENCE_DB / 20)
+    silent = rms <= threshold
+
+    # edges of silent runs
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], silent.astype(np.int8), [0]))))
+    gaps = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if start == 0 or end == n:
+            continue  # leading or trailing silence is not a boundary
+        if (end - start) * WINDOW_SECONDS >= MIN_GAP_SECONDS:
+            gaps.append((float(start * WINDOW_SECONDS), float(end * WINDOW_SECONDS)))
+    return gaps, duration
+
+
+def sentence_boundaries(gaps: List[Tuple[float, float]], duration: float, lengths: List[int]) -> List[float]:
+    """
+    Picks one pause per sentence boundary.
+
+    Every boundary has an expected position from the character counts; among the
+    pauses, in order, the ones that are long and close to those positions win
+    (commas pause too, but shorter and in the wrong place). Falls back to the
+    character estimate when there are not enough pauses.
+
+    Args:
+        gaps (List[Tuple[float, float]]): Interior pauses from silence_gaps.
+        duration (float): The clip duration.
+        lengths (List[int]): Character count per sentence.
+
+    Returns:
+        List[float]: len(lengths) - 1 boundary times.
+    """
+    total = sum(lengths) or 1
+    expected = [float(c) / total * duration for c in np.cumsum(lengths)[:-1]]
+    k, m = len(expected), len(gaps)
+    if k == 0:
+        return []
+    if m < k:
+        return expected
+
+    mids = [(s + e) / 2 for s, e in gaps]
+    cost = [[DRIFT_WEIGHT * abs(mids[j] - expected[b]) - (gaps[j][1] - gaps[j][0]) for j in range(m)]
+            for b in range(k)]
+    # best[b][j]: cheapest assignment of boundaries 0..b with boundary b on gap j
+    inf = float("inf")
+    best = [[inf] * m for _ in range(k)]
+    back = [[-1] * m for _ in range(k)]
+    best[0] = cost[0][:]
+    for b in range(1, k):
+        running, arg = inf, -1
+        for j in range(b, m):
+            if best[b - 1][j - 1] < running:
+                running, arg = best[b - 1][j - 1], j - 1
+            best[b][j] = running + cost[b][j]
+            back[b][j] = arg
+
+    j = min(range(k - 1, m), key=lambda j: best[k - 1][j])
+    chosen = []
+    for b in range(k - 1, -1, -1):
+        chosen.append(mids[j])
+        j = back[b][j]
+    return chosen[::-1]
+
+
+def split_durations(audio_path: str, sentences: List[str]) -> List[float]:
+    """
+    Recovers how long each sentence lasts inside one synthesized request.
+    """
+    gaps, duration = silence_gaps(_read_mono(audio_path))
+    bounds = sentence_boundaries(gaps, duration, [len(s) for s in sentences])
+    edges = [0.0, *bounds, duration]
+    return [b - a for a, b in zip(edges, edges[1:])]
+
+
+def synthesize(sentences: List[str], voice: str, directory: str = "/app/temp") -> Tuple[List[str], List[str], List[float]]:
+    """
+    Speaks a script with as few TTS requests as possible while keeping sentence timing.
+
+    Args:
+        sentences (List[str]): The script's sentences.
+        voice (str): The TikTok voice; the offline backend speaks its language instead
+            when TikTok is down or too slow (see voices.py).
+        directory (str): Where to write the audio files.
+
+    Returns:
+        Tuple[List[str], List[str], List[float]]: The audio file per request (in order),
+            the sentences that were spoken, and each one's duration.
+    """
+    plan = pack_sentences(sentences)
+    print(colored(f"[+] {len(sentences)} sentences in {len(plan)} TTS requests", "blue"))
+
+    paths, spoken, durations = [], [], []
+    for indices in plan:
+        path = f"{directory}/{uuid.uuid4()}.mp3"
+        try:
+            router.synthesize(request_text(sentences, indices), voice, path,
+                              deadline=SENTENCE_DEADLINE_SECONDS * len(indices))
+        except RuntimeError as e:
+            print(colored(f"[-] Failed to create TTS file: {path} ({e})", "red"))
+            continue  # skip these sentences
+
+        part = [sentences[i] for i in indices]
+        paths.append(path)
+        spoken.extend(part)
+        durations.extend(split_durations(path, part))
+    return paths, spoken, durations
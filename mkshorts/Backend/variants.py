@@ -0,0 +1,257 @@
+import os
+import re
+import copy
+import uuid
+import argparse
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from termcolor import colored
+from moviepy import AudioFileClip, concatenate_audioclips
+
+import alog
+import ratelimit
+from main import job_config, gather_footage, clean_dir, TEMP_DIR, SUBTITLE_DIR
+from gpt import generate_script, get_search_terms, generate_metadata, translate_script
+from ttsplan import synthesize
+from video import combine_videos, generate_video, generate_subtitles, render_preview, voice_language
+from bitrate import analyze_complexity, plan_bitrate
+from music import build_music_library, mix_music
+from probe import probe
+from stages import run_stage
+from thermal import Scheduler, watch
+from prefetch import hold_render_lock
+
+# generate_script writes in this language (see CONFIG["customPrompt"]); other variants get a translation
+SCRIPT_LANGUAGE = "en"
+OUTPUT_DIR = "/app/uptemp"
+
+# Sentence ends: a line break, ". ! ?" before a space or directly before Hangul (LLM
+# Korean output often drops the space), or the CJK full stops, written without one
+_SENTENCE_END = re.compile(r"\n+|(?<=[.!?])\s+|(?<=[.!?])(?=[\uac00-\ud7a3])|(?<=[。！？])\s*")
+
+
+def variant_config(data: Dict, variant: Dict) -> Dict:
+    """
+    The job's config with one variant's overrides (voice, language, youtube, ...) on top.
+    """
+    merged = copy.deepcopy(data)
+    for key, value in variant.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key].update(value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits a script in any language into sentences, keeping their punctuation.
+    """
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def prepare_variant(data: Dict, script: str, index: int) -> Dict:
+    """
+    Voiceover and subtitles for one variant, in its language.
+
+    Args:
+        data (Dict): The variant's config, from variant_config.
+        script (str): The story in SCRIPT_LANGUAGE.
+        index (int): The variant's position, used in file names.
+
+    Returns:
+        Dict: What the render and upload of the variant need.
+    """
+    voice = data["voice"] or "en_us_002"
+    # "language" overrides the voice's, e.g. for Indonesian voices, which transcribe as "en"
+    language = data.get("language") or voice_language(voice)
+    text = script if language == SCRIPT_LANGUAGE else translate_script(script, language, data["aiModel"])
+
+    directory = os.path.join(TEMP_DIR, f"variant-{index}")
+    os.makedirs(directory, exist_ok=True)
+    sentences = split_sentences(text)
+    audio_paths, sentences, durations = synthesize(sentences, voice, directory)
+
+    clips = [AudioFileClip(path) for path in audio_paths]
+    tts_path = os.path.join(directory, f"{uuid.uuid4()}.mp3")
+    try:
+        concatenate_audioclips(clips).write_audiofile(tts_path, logger=alog.ProgressLogger(f"voiceover-{index}"))
+    finally:
+        for clip in clips:
+            clip.close()
+
+    print(colored(f"[+] Variant {index}: {voice} ({language}), {len(sentences)} sentences", "blue"))
+    return {
+        "index": index,
+        "config": data,
+        "voice": voice,
+        "language": language,
+        "script": text,
+        "directory": directory,
+        "tts_path": tts_path,
+        "duration": probe(tts_path).duration,
+        # the language, not the voice: an override must reach the transcription too
+        "subtitles": generate_subtitles(tts_path, sentences, durations, language),
+    }
+
+
+def render_variants(overrides: Optional[Dict] = None, variants: Optional[List[Dict]] = None) -> List[Optional[str]]:
+    """
+    Publishes one story in several voices or languages from a single background.
+
+    The footage is searched, downloaded and combined once, for the longest voiceover;
+    every variant then trims it to its own length and is rendered in parallel with its
+    own voiceover, subtitles and metadata. Per-variant settings (renderer, colours,
+    renderWorkers, previewBeforeRender, youtube, ...) come from the variant's overrides;
+    threads, variantWorkers and isolateStages apply to the whole job.
+
+    Args:
+        overrides (Optional[Dict]): Job settings, as for main.main.
+        variants (Optional[List[Dict]]): Per-variant overrides, e.g.
+            [{"voice": "en_us_002"}, {"voice": "jp_001", "youtube": {"channel_id": "..."}}].
+            Defaults to CONFIG["variants"].
+
+    Returns:
+        List[Optional[str]]: The final video of each variant, None where it failed.
+    """
+    data = job_config(overrides)
+    variants = variants or data["variants"] or [{}]
+
+    # every uploading variant needs channels.list + videos.insert; check them all up front
+    uploads = sum(1 for variant in variants if variant_config(data, variant)["automateYoutubeUpload"])
+    quota = ratelimit.remaining()
+    alog.event("quota", **quota)
+    if uploads > quota["youtube"]["uploads"]:
+        raise ratelimit.QuotaExceeded(f"{uploads} variant uploads need {uploads * ratelimit.UPLOAD_UNITS} units, "
+                                      f"{quota['youtube']['units']} left today")
+
+    render_lock = hold_render_lock()
+    try:
+        clean_dir(TEMP_DIR)
+        clean_dir(SUBTITLE_DIR)
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+        script = generate_script(data["videoSubject"], data["paragraphNumber"], data["aiModel"],
+                                 SCRIPT_LANGUAGE, data["customPrompt"])
+        search_terms = get_search_terms(data["videoSubject"], 5, script, data["aiModel"])
+        video_paths = gather_footage(search_terms)
+
+        prepared = [prepare_variant(variant_config(data, variant), script, i)
+                    for i, variant in enumerate(variants)]
+        longest = max(v["duration"] for v in prepared)
+
+        scheduler = Scheduler()
+        if data["thermalScheduling"]:
+            scheduler.wait_until_ready()
+            data["threads"] = scheduler.threads(data["threads"])
+            data["variantWorkers"] = scheduler.threads(data["variantWorkers"])
+
+        if data["isolateStages"]:
+            combine_stage = functools.partial(run_stage, "video", "combine_videos")
+            render_stage = functools.partial(run_stage, "video", "generate_video")
+        else:
+            combine_stage, render_stage = combine_videos, generate_video
+            # in-process MoviePy renders share one address space: keep the threads: 1 OOM rule
+            data["variantWorkers"] = 1
+        # one background for all variants, as long as the longest voiceover
+        with watch("combine", scheduler) as w:
+            combined_path = combine_stage(video_paths=video_paths, max_duration=longest,
+                                          max_clip_duration=10, threads=data["threads"])
+            w.frames = int(longest * 24)
+        alog.event("variants", count=len(prepared), longest_s=round(longest, 2),
+                   durations=[round(v["duration"], 2) for v in prepared])
+
+        music_index = build_music_library(data["zipUrl"]) if data["useMusic"] else {}
+        complexity = None
+        if data["targetSizeMB"] or data["targetKbps"]:
+            complexity = analyze_complexity(combined_path)
+
+        for variant in prepared:
+            if music_index:
+                variant["tts_path"] = mix_music(variant["tts_path"], f"{TEMP_DIR}/{uuid.uuid4()}.wav", music_index)
+            vdata = variant["config"]
+            if not vdata["previewBeforeRender"]:
+                continue
+            # low-resolution and in-process, so one variant at a time before the parallel renders
+            preview = render_preview(
+                combined_video_path=combined_path,
+                tts_path=variant["tts_path"],
+                subtitles=variant["subtitles"],
+                subtitles_position=vdata["subtitlesPosition"],
+                text_color=vdata["color"],
+                bg_color=vdata["subtitle_background"],
+                output_dir=variant["directory"],
+                duration=variant["duration"]
+            )
+            variant["problems"] = preview["problems"]
+
+        def render(variant: Dict) -> Optional[str]:
+            vdata = variant["config"]
+            if variant.get("problems"):
+                print(colored(f"[-] Variant {variant['index']} ({variant['voice']}) failed preview: "
+                              f"{'; '.join(variant['problems'])}", "red"))
+                return None
+            video_kbps = None
+            if complexity is not None:
+                video_kbps = plan_bitrate(complexity, variant["duration"], vdata["targetSizeMB"], vdata["targetKbps"])
+            try:
+                return render_stage(
+                    combined_video_path=combined_path,
+                    tts_path=variant["tts_path"],
+                    subtitles=variant["subtitles"],
+                    threads=data["threads"],
+                    subtitles_position=vdata["subtitlesPosition"],
+                    text_color=vdata["color"],
+                    bg_color=vdata["subtitle_background"],
+                    subtitle_renderer=vdata["subtitleRenderer"],
+                    render_workers=vdata["renderWorkers"],
+                    segment_seconds=vdata["segmentSeconds"],
+                    output_path=os.path.join(OUTPUT_DIR, f"output-{variant['index']}-{variant['voice']}.mp4"),
+                    video_kbps=video_kbps,
+                    duration=variant["duration"],
+                )
+            except Exception as e:
+                print(colored(f"[-] Variant {variant['index']} ({variant['voice']}) failed: {e}", "red"))
+                return None
+
+        with watch("variants", scheduler) as w:
+            with ThreadPoolExecutor(max_workers=max(1, data["variantWorkers"])) as pool:
+                outputs = list(pool.map(render, prepared))
+            w.frames = sum(int(v["duration"] * 24) for v, path in zip(prepared, outputs) if path)
+
+        for variant, path in zip(prepared, outputs):
+            vdata = variant["config"]
+            if path is None or not vdata["automateYoutubeUpload"]:
+                continue
+            try:
+                # oauth2client/apiclient are imported only when an upload actually happens
+                from youtube import upload_video_brand
+                language = None if variant["language"] == SCRIPT_LANGUAGE else variant["language"]
+                title, desc, keywords = generate_metadata(vdata["videoSubject"], variant["script"],
+                                                          vdata["aiModel"], language)
+                upload_video_brand(
+                    video_path=path,
+                    title=title,
+                    description=desc,
+                    category="28",
+                    keywords=",".join(keywords),
+                    config=vdata["youtube"]
+                )
+            except Exception as e:
+                # the rendered file stays in outputs; the other variants still upload
+                print(colored(f"[-] Upload of variant {variant['index']} ({variant['voice']}) failed: {e}", "red"))
+                alog.event("variant_upload_failed", index=variant["index"], voice=variant["voice"], error=str(e))
+        return outputs
+    finally:
+        render_lock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render one story in several voices from a shared background.")
+    parser.add_argument("subject")
+    parser.add_argument("--voice", action="append", required=True, help="Repeat for each variant.")
+    args = parser.parse_args()
+    for path in render_variants({"videoSubject": args.subject}, [{"voice": v} for v in args.voice]):
+        print(path)
@@ -1,22 +1,22 @@
 import os
 import uuid
-import logging
 import moviepy.config as mpy_config
-import datetime
+import alog
+import renderprof
 
 
 import requests
-import srt_equalizer
-import assemblyai as aai
 
-from typing import List
+from typing import List, Optional
 from moviepy import *
 # from moviepy import VideoFileClip, AudioFileClip, TextClip, CompositeVideoClip, concatenate_videoclips, CompositeAudioClip
 from termcolor import colored
 from dotenv import load_dotenv
-from datetime import timedelta
 # from moviepy.video.fx import crop
 from moviepy.video.tools.subtitles import SubtitlesClip
+from subtitles import Subtitles
+from overlay import SubtitleStyle, burn_subtitles
+from probe import probe
 import pathlib
 
 # .env 파일을 절대경로로 안전하게 로드
@@ -25,15 +25,8 @@ load_dotenv(dotenv_path)
 
 ASSEMBLY_AI_API_KEY = os.getenv("ASSEMBLY_AI_API_KEY")
 
-# 로깅 설정 (main.py와 동일하게)
-logging.basicConfig(
-    filename='/app/log/alog.log',
-    filemode='a',
-    encoding='utf-8',
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
-logger = logging.getLogger(__name__)
+# 로깅 설정 (main.py와 같은 큐 기반 로거 사용)
+logger = alog.setup()
 
 # MoviePy 내부 로그도 alog.log에 기록되도록 설정
 mpy_config.logger = logger
@@ -57,109 +50,99 @@ def save_video(video_url: str, directory: str = "/app/temp") -> str:
     return video_path
 
 
-def __generate_subtitles_assemblyai(audio_path: str, voice: str) -> str:
+# TikTok voice prefix -> transcription language code, where the two differ
+LANGUAGE_MAPPING = {
+    "br": "pt",
+    "id": "en", #AssemblyAI doesn't have Indonesian 
+    "jp": "ja",
+    "kr": "ko",
+}
+
+
+def voice_language(voice: str) -> str:
+    """
+    Returns the language code for a voice, e.g. "ja" for "jp_001" or "en" for "en_us_002".
+    A bare prefix ("kr") or language code ("en") works too.
+    """
+    prefix = voice.split("_", 1)[0]
+    return LANGUAGE_MAPPING.get(prefix, prefix)
+
+
+def __generate_subtitles_assemblyai(audio_path: str, voice: str) -> Subtitles:
     """
-    Generates subtitles from a given audio file and returns the path to the subtitles.
+    Generates subtitles from a given audio file.
 
     Args:
         audio_path (str): The path to the audio file to generate subtitles from.
+        voice (str): The voice (or its language) the audio was spoken in.
 
     Returns:
-        str: The generated subtitles
+        Subtitles: The generated subtitles
     """
+    lang_code = voice_language(voice)
 
-    language_mapping = {
-        "br": "pt",
-        "id": "en", #AssemblyAI doesn't have Indonesian 
-        "jp": "ja",
-        "kr": "ko",
-    }
-
-    if voice in language_mapping:
-        lang_code = language_mapping[voice]
-    else:
-        lang_code = voice
+    # assemblyai is only imported when transcription is actually used
+    import assemblyai as aai
 
     aai.settings.api_key = ASSEMBLY_AI_API_KEY
     config = aai.TranscriptionConfig(language_code=lang_code)
     transcriber = aai.Transcriber(config=config)
     transcript = transcriber.transcribe(audio_path)
-    subtitles = transcript.export_subtitles_srt()
 
-    return subtitles
+    return Subtitles.from_srt(transcript.export_subtitles_srt())
 
 
-def __generate_subtitles_locally(sentences: List[str], audio_clips: List[AudioFileClip]) -> str:
+def __generate_subtitles_locally(sentences: List[str], durations: List[float]) -> Subtitles:
     """
-    Generates subtitles from a given audio file and returns the path to the subtitles.
+    Generates subtitles by laying the sentences back to back, each lasting as long as it is spoken.
 
     Args:
-        sentences (List[str]): all the sentences said out loud in the audio clips
-        audio_clips (List[AudioFileClip]): all the individual audio clips which will make up the final audio track
+        sentences (List[str]): all the sentences said out loud in the voiceover
+        durations (List[float]): how long each sentence lasts in the voiceover
     Returns:
-        str: The generated subtitles
+        Subtitles: The generated subtitles
     """
+    return Subtitles.from_durations(sentences, durations)
 
-    def convert_to_srt_time_format(total_seconds):
-        # Convert total seconds to the SRT time format: HH:MM:SS,mmm
-        if total_seconds == 0:
-            return "0:00:00,0"
-        return str(timedelta(seconds=total_seconds)).rstrip('0').replace('.', ',')
-
-    start_time = 0
-    subtitles = []
-
-    for i, (sentence, audio_clip) in enumerate(zip(sentences, audio_clips), start=1):
-        duration = audio_clip.duration
-        end_time = start_time + duration
 
-        # Format: subtitle index, start time --> end time, sentence
-        subtitle_entry = f"{i}\n{convert_to_srt_time_format(start_time)} --> {convert_to_srt_time_format(end_time)}\n{sentence}\n"
-        subtitles.append(subtitle_entry)
-
-        start_time += duration  # Update start time for the next subtitle
-
-    return "\n".join(subtitles)
-
-
-def generate_subtitles(audio_path: str, sentences: List[str], audio_clips: List[AudioFileClip], voice: str) -> str:
+def generate_subtitles(audio_path: str, sentences: List[str], durations: List[float], voice: str) -> Subtitles:
     """
-    Generates subtitles from a given audio file and returns the path to the subtitles.
+    Generates equalized subtitles for the voiceover.
 
     Args:
         audio_path (str): The path to the audio file to generate subtitles from.
-        sentences (List[str]): all the sentences said out loud in the audio clips
-        audio_clips (List[AudioFileClip]): all the individual audio clips which will make up the final audio track
+        sentences (List[str]): all the sentences said out loud in the voiceover
+        durations (List[float]): how long each sentence lasts, from ttsplan.synthesize
+        voice (str): The voice, or the language code it speaks, for the transcription
 
     Returns:
-        str: The path to the generated subtitles.
+        Subtitles: The subtitles, split into lines of at most 10 characters.
     """
-
-    def equalize_subtitles(srt_path: str, max_chars: int = 10) -> None:
-        # Equalize subtitles
-        srt_equalizer.equalize_srt_file(srt_path, srt_path, max_chars)
-
-    # Save subtitles
-    subtitles_path = f"/app/subtitles/{uuid.uuid4()}.srt"
-
     if ASSEMBLY_AI_API_KEY is not None and ASSEMBLY_AI_API_KEY != "":
         print(colored("[+] Creating subtitles using AssemblyAI", "blue"))
         subtitles = __generate_subtitles_assemblyai(audio_path, voice)
     else:
         print(colored("[+] Creating subtitles locally", "blue"))
-        subtitles = __generate_subtitles_locally(sentences, audio_clips)
-        # print(colored("[-] Local subtitle generation has been disabled for the time being.", "red"))
-        # print(colored("[-] Exiting.", "red"))
-        # sys.exit(1)
-
-    with open(subtitles_path, "w") as file:
-        file.write(subtitles)
+        subtitles = __generate_subtitles_locally(sentences, durations)
 
     # Equalize subtitles
-    equalize_subtitles(subtitles_path)
+    subtitles = subtitles.equalize(max_chars=10)
 
     print(colored("[+] Subtitles generated.", "green"))
 
+    return subtitles
+
+
+def export_subtitles(subtitles: Subtitles, directory: str = "/app/subtitles") -> str:
+    """
+    Writes subtitles to an SRT file for inspection or reuse outside the pipeline.
+
+    Returns:
+        str: The path to the SRT file.
+    """
+    subtitles_path = f"{directory}/{uuid.uuid4()}.srt"
+    with open(subtitles_path, "w") as file:
+        file.write(subtitles.to_srt())
     return subtitles_path
 
 
@@ -187,11 +170,12 @@ def combine_videos(video_paths: List[str], max_duration: int, max_clip_duration:
 
     clips = []
     tot_dur = 0
+    # Each file is opened (and probed by ffmpeg) once, every pass reuses it
+    sources = {video_path: VideoFileClip(video_path, audio=False) for video_path in video_paths}
     # Add downloaded clips over and over until the duration of the audio (max_duration) has been reached
     while tot_dur < max_duration:
         for video_path in video_paths:
-            clip = VideoFileClip(video_path)
-            clip = clip.without_audio()
+            clip = sources[video_path]
             # Check if clip is longer than the remaining audio
             if (max_duration - tot_dur) < clip.duration:
                 clip = clip.subclipped(0, (max_duration - tot_dur))
@@ -200,8 +184,10 @@ def combine_videos(video_paths: List[str], max_duration: int, max_clip_duration:
             clip = clip.with_fps(24)
 
             # Not all videos are same size,
-            # so we need to resize them
-            if round((clip.w/clip.h), 4) < 0.5625:
+            # so we need to resize them (prefetched footage is already 1080x1920)
+            if tuple(clip.size) == (1080, 1920):
+                pass
+            elif round((clip.w/clip.h), 4) < 0.5625:
                 clip = clip.cropped(width=clip.w, height=round(clip.w/0.5625), \
                                    x_center=clip.w / 2, \
                                    y_center=clip.h / 2)
@@ -209,7 +195,8 @@ def combine_videos(video_paths: List[str], max_duration: int, max_clip_duration:
                 clip = clip.cropped(width=round(0.5625*clip.h), height=clip.h, \
                                    x_center=clip.w / 2, \
                                    y_center=clip.h / 2)
-            clip = clip.resized((1080, 1920))
+            if tuple(clip.size) != (1080, 1920):
+                clip = clip.resized((1080, 1920))
 
             if clip.duration > max_clip_duration:
                 clip = clip.subclipped(0, max_clip_duration)
@@ -219,26 +206,201 @@ def combine_videos(video_paths: List[str], max_duration: int, max_clip_duration:
 
     final_clip = concatenate_videoclips(clips)
     final_clip = final_clip.with_fps(24)
-    final_clip.write_videofile(combined_video_path, threads=threads, fps=24)
+    with renderprof.profile("combine"):
+        final_clip.write_videofile(combined_video_path, threads=threads, fps=24, logger=alog.ProgressLogger("combine"))
 
     return combined_video_path
 
-def generate_video(combined_video_path: str, tts_path: str, subtitles_path: str, threads: int, subtitles_position: str, text_color: str, bg_color: str) -> str:
+def check_preview(video_duration: float, audio_duration: float, subtitles: Subtitles, frames: List) -> List[str]:
+    """
+    Automated checks run on a preview before the full render.
+
+    Args:
+        video_duration (float): Duration of the background video.
+        audio_duration (float): Duration of the voiceover.
+        subtitles (Subtitles): The subtitles.
+        frames (List): Sampled RGB frames of the preview.
+
+    Returns:
+        List[str]: The problems found, empty if the preview passed.
+    """
+    problems = []
+    if abs(video_duration - audio_duration) > 0.5:
+        problems.append(f"video {video_duration:.2f}s and audio {audio_duration:.2f}s differ")
+    if not any(text.strip() for text in subtitles.texts):
+        problems.append("subtitles are empty")
+    elif subtitles.end > audio_duration + 0.5:
+        problems.append(f"subtitles run until {subtitles.end:.2f}s, past the audio")
+    dark = sum(1 for frame in frames if frame.mean() < 8)
+    if frames and dark > len(frames) // 2:
+        problems.append(f"{dark}/{len(frames)} sampled frames are black")
+    return problems
+
+
+def render_preview(combined_video_path: str, tts_path: str, subtitles: Subtitles, subtitles_position: str, text_color: str, bg_color: str, output_dir: str = "/app/uptemp", scale: float = 0.25, fps: int = 8, sheet_grid: tuple = (4, 3), duration: Optional[float] = None) -> dict:
+    """
+    Renders a low-resolution proxy of the final video and a contact sheet of sampled
+    frames with subtitles, then runs the automated preview checks.
+
+    The background is decoded at reduced size by ffmpeg and encoded with the
+    ultrafast preset, so this takes a fraction of the full render.
+
+    Args:
+        combined_video_path (str): The path to the combined video.
+        tts_path (str): The path to the text-to-speech audio.
+        subtitles (Subtitles): The subtitles.
+        subtitles_position (str): The position of the subtitles.
+        output_dir (str): Where to write preview.mp4 and preview_sheet.png.
+        scale (float): Resolution relative to the full render.
+        fps (int): Preview frame rate.
+        sheet_grid (tuple): Contact sheet (columns, rows).
+        duration (Optional[float]): Preview only this much of a longer, shared background
+            (see generate_video).
+
+    Returns:
+        dict: The preview and sheet paths and the list of problems found.
+    """
+    from PIL import Image, ImageDraw
+
+    full_w, full_h = probe(combined_video_path).size
+    width, height = round(full_w * scale) // 2 * 2, round(full_h * scale) // 2 * 2
+
+    video_clip = VideoFileClip(combined_video_path, audio=False, target_resolution=(width, height))
+    if duration and duration < video_clip.duration:
+        video_clip = video_clip.subclipped(0, duration)
+    style = SubtitleStyle(font_size=max(8, round(100 * scale)), stroke_width=max(1, round(5 * scale)),
+                          color=text_color, bg_color=bg_color, position=subtitles_position)
+    result = burn_subtitles(video_clip, subtitles, style) if len(subtitles) else video_clip
+    audio = AudioFileClip(tts_path)
+    result = result.with_audio(audio)
+
+    preview_path = os.path.join(output_dir, "preview.mp4")
+    result.write_videofile(preview_path, fps=fps, codec="libx264", preset="ultrafast",
+                           audio_codec="aac", audio_bitrate="48k", threads=2, logger=None)
+
+    columns, rows = sheet_grid
+    count = columns * rows
+    times = [video_clip.duration * (i + 0.5) / count for i in range(count)]
+    frames = [result.get_frame(t) for t in times]
+    sheet = Image.new("RGB", (columns * width, rows * height))
+    draw = ImageDraw.Draw(sheet)
+    for i, (t, frame) in enumerate(zip(times, frames)):
+        x, y = (i % columns) * width, (i // columns) * height
+        sheet.paste(Image.fromarray(frame), (x, y))
+        draw.text((x + 4, y + 4), f"{t:.1f}s", fill="yellow")
+    sheet_path = os.path.join(output_dir, "preview_sheet.png")
+    sheet.save(sheet_path)
+
+    problems = check_preview(video_clip.duration, audio.duration, subtitles, frames)
+    audio.close()
+    video_clip.close()
+    for problem in problems:
+        print(colored(f"[-] Preview check: {problem}", "red"))
+    if not problems:
+        print(colored(f"[+] Preview passed: {preview_path}", "green"))
+    return {"preview": preview_path, "sheet": sheet_path, "problems": problems}
+
+
+def generate_video(combined_video_path: str, tts_path: str, subtitles: Subtitles, threads: int, subtitles_position: str, text_color: str, bg_color: str, subtitle_renderer: str = "moviepy", output_path: str = "/app/uptemp/output.mp4", render_workers: int = 1, segment_seconds: float = 10.0, fragmented: bool = False, video_kbps: Optional[int] = None, duration: Optional[float] = None) -> str:
     """
     This function creates the final video, with subtitles and audio.
 
     Args:
         combined_video_path (str): The path to the combined video.
         tts_path (str): The path to the text-to-speech audio.
-        subtitles_path (str): The path to the subtitles.
+        subtitles (Subtitles): The subtitles.
         threads (int): The number of threads to use for the video processing.
         subtitles_position (str): The position of the subtitles.
+        subtitle_renderer (str): "moviepy" for SubtitlesClip/TextClip compositing,
+            "numpy" for the cached-patch overlay in overlay.py, "ass" to burn an
+            ASS file in with ffmpeg's libass filter.
+        output_path (str): Where to write the final video.
+        render_workers (int): Above 1, the timeline is split into segments that are
+            rendered in parallel worker processes (see segments.py).
+        segment_seconds (float): Target segment length for parallel rendering.
+        fragmented (bool): Write a fragmented MP4 whose bytes are final as soon as they
+            are written, so it can be uploaded while encoding (see streamupload.py).
+            Otherwise the moov atom is moved to the front of the file.
+        video_kbps (Optional[int]): Average video bitrate (see bitrate.plan_bitrate);
+            None leaves the bitrate to libx264's default CRF.
+        duration (Optional[float]): Use only this much of the background, for a background
+            shared by several voiceovers (see variants.py). None uses all of it.
 
     Returns:
         str: The path to the final video.
     """
+    # imported here so `import main` does not pay for the encoder options, the upload
+    # client and the ASS writer on every cold start
+    from bitrate import encoder_args, FASTSTART_ARGS
+    from streamupload import FRAGMENT_ARGS
+
+    rate_args = encoder_args(video_kbps) if video_kbps else []
+    movflags = FRAGMENT_ARGS if fragmented else FASTSTART_ARGS
+    if subtitle_renderer == "ass":
+        from ass_subtitles import to_ass, burn_ass
+        style = SubtitleStyle(color=text_color, bg_color=bg_color, position=subtitles_position)
+        # the ASS file is only an export for ffmpeg's subtitle filter
+        ass_path = f"/app/subtitles/{uuid.uuid4()}.ass"
+        with open(ass_path, "w") as file:
+            file.write(to_ass(subtitles, style))
+        trim_args = ["-t", f"{duration:.3f}"] if duration else []
+        return burn_ass(combined_video_path, tts_path, ass_path, output_path, threads,
+                        extra_args=rate_args + movflags + trim_args)
+
+    if render_workers > 1:
+        from segments import render_segmented
+        return render_segmented(combined_video_path, tts_path, subtitles, output_path,
+                                workers=render_workers, segment_seconds=segment_seconds,
+                                subtitle_renderer=subtitle_renderer, subtitles_position=subtitles_position,
+                                text_color=text_color, bg_color=bg_color, encoder_args=rate_args,
+                                extra_args=movflags, duration=duration)
+
     video_clip = VideoFileClip(combined_video_path)
+    if duration and duration < video_clip.duration:
+        video_clip = video_clip.subclipped(0, duration)
+    result = overlay_subtitles(video_clip, subtitles, subtitle_renderer,
+                               subtitles_position, text_color, bg_color)
+
+    # 오디오를 붙이고, 길이 맞춤
+    audio = AudioFileClip(tts_path)
+    result.audio = audio
+
+    print(colored(f"[DEBUG] video_clip.duration: {video_clip.duration}", "yellow"))
+    print(colored(f"[DEBUG] audio.duration: {audio.duration}", "yellow"))
+    if abs(video_clip.duration - audio.duration) > 0.1:
+        print(colored(f"[WARNING] 영상과 오디오 길이가 다릅니다!", "red"))
+
+    with renderprof.profile("render"):
+        result.write_videofile(output_path, threads=threads or 2, fps=video_clip.fps, codec="libx264", audio_codec="aac",
+                               ffmpeg_params=rate_args + movflags, logger=alog.ProgressLogger("render"))
+
+    return output_path
+
+
+def overlay_subtitles(video_clip, subtitles: Subtitles, subtitle_renderer: str, subtitles_position: str, text_color: str, bg_color: str):
+    """
+    Returns the clip with subtitles drawn by the selected in-process renderer.
 
+    Args:
+        video_clip (VideoClip): The background clip.
+        subtitles (Subtitles): The subtitles, timed relative to the clip.
+        subtitle_renderer (str): "numpy" or "moviepy".
+
+    Returns:
+        VideoClip: The subtitled clip.
+    """
+    if not len(subtitles):
+        return video_clip
+    if subtitle_renderer == "numpy":
+        style = SubtitleStyle(color=text_color, bg_color=bg_color, position=subtitles_position)
+        return burn_subtitles(video_clip, subtitles, style)
+    return _composite_subtitles(video_clip, subtitles, text_color, bg_color)
+
+
+def _composite_subtitles(video_clip, subtitles: Subtitles, text_color: str, bg_color: str):
+    """
+    Overlays subtitles with MoviePy's SubtitlesClip and CompositeVideoClip.
+    """
     generator = lambda txt: TextClip(
         text=txt,
         font="/app/fonts/bold_font.ttf",
@@ -257,25 +419,11 @@ def generate_video(combined_video_path: str, tts_path: str, subtitles_path: str,
     )
 
     # SRT 자막을 영상 중앙에 위치, duration 속성 명시
-    subtitles = SubtitlesClip(subtitles_path, make_textclip=generator).with_position(('center', 'center'))
+    subtitles = SubtitlesClip(list(subtitles), make_textclip=generator).with_position(('center', 'center'))
     subtitles.duration = video_clip.duration
 
     # 영상+자막 합성, 사이즈 명시 (duration 인자 없이)
-    result = CompositeVideoClip([
+    return CompositeVideoClip([
         video_clip,
         subtitles
     ], size=video_clip.size)
-
-    # 오디오를 붙이고, 길이 맞춤
-    audio = AudioFileClip(tts_path)
-    result.audio = audio
-
-    print(colored(f"[DEBUG] video_clip.duration: {video_clip.duration}", "yellow"))
-    print(colored(f"[DEBUG] audio.duration: {audio.duration}", "yellow"))
-    if abs(video_clip.duration - audio.duration) > 0.1:
-        print(colored(f"[WARNING] 영상과 오디오 길이가 다릅니다!", "red"))
-
-    output_path = "/app/uptemp/output.mp4"
-    result.write_videofile(output_path, threads=threads or 2, fps=video_clip.fps, codec="libx264", audio_codec="aac")
-
-    return output_path
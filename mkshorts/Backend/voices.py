@@ -0,0 +1,212 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+import subprocess
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+from termcolor import colored
+from moviepy.config import FFMPEG_BINARY
+
+# Time a request gets per sentence it contains before the next backend takes over
+SENTENCE_DEADLINE_SECONDS = 8.0
+# No attempt is planned shorter than this
+MIN_ATTEMPT_SECONDS = 1.0
+# Latency samples kept per backend
+WINDOW = 50
+
+
+class TTSBackend:
+    """
+    A speech engine. Subclasses write `text` spoken in `voice` to `path` (MP3) or raise.
+    """
+
+    name = "base"
+    # Latency guess until the router has measured the backend
+    SECONDS_PER_CHAR = 0.02
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, voice: str) -> bool:
+        return True
+
+    def synthesize(self, text: str, voice: str, path: str) -> None:
+        raise NotImplementedError
+
+
+class TikTokBackend(TTSBackend):
+    """
+    The TikTok voices through tiktokvoice's endpoints; unavailable while every
+    endpoint's circuit is open.
+    """
+
+    name = "tiktok"
+
+    def available(self) -> bool:
+        from tiktokvoice import endpoint_manager
+        with endpoint_manager.lock:
+            return any(endpoint_manager.state(i) != "open" for i in range(len(endpoint_manager.endpoints)))
+
+    def supports(self, voice: str) -> bool:
+        from tiktokvoice import VOICES
+        return voice in VOICES
+
+    def synthesize(self, text: str, voice: str, path: str) -> None:
+        from tiktokvoice import synthesize_base64, save_audio_file
+        save_audio_file(synthesize_base64(text, voice), path)
+
+
+class EspeakBackend(TTSBackend):
+    """
+    espeak-ng, on the device: robotic, but needs no network and runs many times
+    faster than real time on a Pi 4.
+    """
+
+    name = "espeak"
+    SECONDS_PER_CHAR = 0.005
+    # TikTok voice prefix -> espeak-ng voice; the longest matching prefix wins
+    VOICE_MAPPING = {
+        "en_us": "en-us", "en_uk": "en-gb", "en_au": "en-gb", "en": "en-us",
+        "fr": "fr", "de": "de", "es": "es", "mx": "es-419", "br": "pt-br",
+        "id": "id", "jp": "ja", "kr": "ko",
+    }
+    WORDS_PER_MINUTE = 165
+
+    def __init__(self, binary: Optional[str] = None):
+        self.binary = binary or shutil.which("espeak-ng")
+
+    def available(self) -> bool:
+        return self.binary is not None
+
+    def espeak_voice(self, voice: str) -> Optional[str]:
+        parts = voice.split("_")
+        for n in range(len(parts), 0, -1):
+            mapped = self.VOICE_MAPPING.get("_".join(parts[:n]))
+            if mapped:
+                return mapped
+        return None
+
+    def supports(self, voice: str) -> bool:
+        return self.espeak_voice(voice) is not None
+
+    def synthesize(self, text: str, voice: str, path: str) -> None:
+        wav_path = f"{path}.wav"
+        try:
+            subprocess.run([self.binary, "-v", self.espeak_voice(voice), "-s", str(self.WORDS_PER_MINUTE),
+                            "-w", wav_path, text], check=True, capture_output=True)
+            subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-i", wav_path, "-ar", "44100",
+                            "-c:a", "libmp3lame", "-q:a", "4", path], check=True)
+        finally:
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class VoiceRouter:
+    """
+    Picks a backend per request. Backends are listed best-sounding first; one is
+    skipped when it is unavailable, cannot speak the voice, or its recent latency
+    would not fit the deadline. A backend that overruns or fails hands over to the
+    next with whatever time is left, keeping enough for the ones after it.
+    """
+
+    def __init__(self, backends: List[TTSBackend]):
+        self.backends = backends
+        self.lock = threading.Lock()
+        # seconds per character, per backend
+        self.latencies = {b.name: deque(maxlen=WINDOW) for b in backends}
+        self.failures = {b.name: 0 for b in backends}
+        self.used = {b.name: 0 for b in backends}
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="voice")
+
+    def expected_seconds(self, backend: TTSBackend, text: str) -> float:
+        with self.lock:
+            samples = sorted(self.latencies[backend.name])
+        # p90 per character, so one slow answer does not rule a backend out
+        per_char = samples[min(len(samples) - 1, int(0.9 * len(samples)))] if samples else backend.SECONDS_PER_CHAR
+        return max(MIN_ATTEMPT_SECONDS, per_char * max(len(text), 1))
+
+    def synthesize(self, text: str, voice: str, path: str, deadline: float) -> str:
+        """
+        Speaks `text` into `path` within `deadline` seconds if any backend can.
+
+        Returns:
+            str: The name of the backend that produced the file.
+
+        Raises:
+            RuntimeError: If every usable backend failed or ran out of time.
+        """
+        start = time.monotonic()
+        candidates = [b for b in self.backends if b.supports(voice) and b.available()]
+        errors = []
+        for n, backend in enumerate(candidates):
+            remaining = deadline - (time.monotonic() - start)
+            # leave the fallbacks the time they are known to need
+            reserve = sum(self.expected_seconds(b, text) for b in candidates[n + 1:])
+            budget = remaining - reserve
+            last = n + 1 == len(candidates)
+            if not last and self.expected_seconds(backend, text) > budget:
+                errors.append(f"{backend.name}: skipped, {budget:.1f}s left")
+                continue
+
+            attempt = time.monotonic()
+            # an abandoned attempt may still finish later, so it must not write to `path`,
+            # nor to the part file of a retry of the same sentence
+            part_path = f"{path}.{backend.name}.{uuid.uuid4().hex[:8]}.mp3"
+            future = self.executor.submit(backend.synthesize, text, voice, part_path)
+            try:
+                # the last resort is waited for even past the deadline: late beats a missing sentence
+                future.result(timeout=None if last else budget)
+            except FutureTimeout:
+                errors.append(f"{backend.name}: no answer in {budget:.1f}s")
+                self._record(backend, None, text)
+                # nobody reads it any more: remove the file once the attempt ends
+                future.add_done_callback(lambda _, p=part_path: _remove(p))
+                continue
+            except Exception as e:
+                errors.append(f"{backend.name}: {e}")
+                self._record(backend, None, text)
+                _remove(part_path)
+                continue
+            os.replace(part_path, path)
+            self._record(backend, time.monotonic() - attempt, text)
+            if n:
+                print(colored(f"[-] TTS fell back to {backend.name} ({'; '.join(errors)})", "yellow"))
+            return backend.name
+        raise RuntimeError("; ".join(errors) or f"No TTS backend can speak {voice}")
+
+    def _record(self, backend: TTSBackend, seconds: Optional[float], text: str) -> None:
+        with self.lock:
+            if seconds is None:
+                self.failures[backend.name] += 1
+            else:
+                self.latencies[backend.name].append(seconds / max(len(text), 1))
+                self.used[backend.name] += 1
+
+    def stats(self) -> Dict:
+        """
+        Per-backend usage for the run profile.
+        """
+        stats = {}
+        for b in self.backends:
+            with self.lock:
+                samples = sorted(self.latencies[b.name])
+                stats[b.name] = {"used": self.used[b.name], "failures": self.failures[b.name]}
+            stats[b.name]["available"] = b.available()
+            stats[b.name]["ms_per_char"] = round(1000 * samples[len(samples) // 2], 1) if samples else None
+        return stats
+
+
+router = VoiceRouter([TikTokBackend(), EspeakBackend()])
+
+
+def backend_stats() -> Dict:
+    return router.stats()
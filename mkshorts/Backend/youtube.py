@@ -1,17 +1,23 @@
 import os
 import sys
+import json
 import time
 import random
+import datetime
+import threading
 import httplib2
 
 from termcolor import colored
 from oauth2client.file import Storage
-from apiclient.discovery import build
+from apiclient.discovery import build_from_document
 from apiclient.errors import HttpError
 from apiclient.http import MediaFileUpload
 from oauth2client.tools import argparser, run_flow
 from oauth2client.client import flow_from_clientsecrets
 
+import ratelimit
+from streamupload import RequestsTransport, start_session, stream_upload
+
 # Explicitly tell the underlying HTTP transport library not to retry, since
 # we are handling retry logic ourselves.
 httplib2.RETRIES = 1
@@ -58,6 +64,22 @@ https://developers.google.com/api-client-library/python/guide/aaa_client_secrets
 """
 
 VALID_PRIVACY_STATUSES = ("public", "private", "unlisted")  
+
+# build() would fetch (or parse) the discovery document on every upload; it changes
+# rarely, so a copy on the HDD is refreshed weekly and a stale one is used when offline
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest"
+DISCOVERY_CACHE_PATH = "/app/cache/youtube_v3_discovery.json"
+DISCOVERY_MAX_AGE = 7 * 86400
+
+# channels.list results per (credentials file, channel); access to a brand channel
+# seldom changes, and a wrong cache entry only means the upload itself fails
+CHANNEL_CACHE_PATH = "/app/cache/youtube_channels.json"
+CHANNEL_CACHE_SECONDS = 7 * 86400
+
+# Tokens live an hour; refresh when less than this is left, so an upload never
+# starts with a token that expires halfway
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=15)
+HTTP_TIMEOUT = 120
   
   
 def get_authenticated_service():
@@ -78,12 +100,114 @@ def get_authenticated_service():
         flags = argparser.parse_args()
         credentials = run_flow(flow, storage, flags)
 
-    return build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
-                 http=credentials.authorize(httplib2.Http()))
+    return build_from_document(discovery_document(), http=credentials.authorize(httplib2.Http()))
 
-def initialize_upload(youtube, options, config):
-    """브랜드 계정 업로드 초기화"""
-    body = {
+
+def discovery_document() -> str:
+    """
+    Returns the YouTube Data API discovery document, from DISCOVERY_CACHE_PATH
+    unless that is older than DISCOVERY_MAX_AGE.
+    """
+    try:
+        if time.time() - os.path.getmtime(DISCOVERY_CACHE_PATH) < DISCOVERY_MAX_AGE:
+            with open(DISCOVERY_CACHE_PATH) as f:
+                return f.read()
+    except OSError:
+        pass
+    try:
+        resp, content = httplib2.Http(timeout=HTTP_TIMEOUT).request(DISCOVERY_URL)
+        if resp.status != 200:
+            raise httplib2.HttpLib2Error(f"HTTP {resp.status}")
+        document = content.decode("utf-8")
+        json.loads(document)
+    except (httplib2.HttpLib2Error, OSError, ValueError) as e:
+        if os.path.exists(DISCOVERY_CACHE_PATH):
+            print(colored(f"[-] Discovery document refresh failed ({e}), using cached copy", "yellow"))
+            with open(DISCOVERY_CACHE_PATH) as f:
+                return f.read()
+        raise
+    os.makedirs(os.path.dirname(DISCOVERY_CACHE_PATH), exist_ok=True)
+    with open(f"{DISCOVERY_CACHE_PATH}.tmp", "w") as f:
+        f.write(document)
+    os.replace(f"{DISCOVERY_CACHE_PATH}.tmp", DISCOVERY_CACHE_PATH)
+    return document
+
+
+def refresh_if_expiring(credentials) -> None:
+    """
+    Refreshes an access token that expires within TOKEN_REFRESH_MARGIN. Credentials
+    from a Storage write the new token back to their file.
+    """
+    expiry = credentials.token_expiry
+    if expiry is None or expiry - datetime.datetime.utcnow() < TOKEN_REFRESH_MARGIN:
+        credentials.refresh(httplib2.Http(timeout=HTTP_TIMEOUT))
+
+
+class YouTubeClient:
+    """
+    One brand account's API service. Its authorized httplib2.Http keeps the
+    connections to googleapis.com open across uploads.
+    """
+
+    def __init__(self, config):
+        self.credentials = get_brand_credentials(config)
+        self.http = self.credentials.authorize(httplib2.Http(timeout=HTTP_TIMEOUT))
+        self.service = build_from_document(discovery_document(), http=self.http)
+        self.credentials_path = config['credentials_path']
+
+    def fresh(self):
+        """The service, with a token that is good for at least TOKEN_REFRESH_MARGIN."""
+        refresh_if_expiring(self.credentials)
+        return self.service
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(config) -> YouTubeClient:
+    """
+    Returns the client for config['credentials_path'], creating it on first use.
+    """
+    path = config['credentials_path']
+    with _clients_lock:
+        if path not in _clients:
+            _clients[path] = YouTubeClient(config)
+        return _clients[path]
+
+
+def _load_channel_cache():
+    try:
+        with open(CHANNEL_CACHE_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def validate_channel(client: YouTubeClient, channel_id):
+    """
+    Checks that the account can reach the channel, at most once per CHANNEL_CACHE_SECONDS.
+    """
+    key = f"{client.credentials_path}:{channel_id}"
+    cache = _load_channel_cache()
+    if time.time() - cache.get(key, 0) < CHANNEL_CACHE_SECONDS:
+        return
+
+    ratelimit.youtube.charge("channels.list")
+    channels = client.fresh().channels().list(id=channel_id, part='id').execute()
+    if not channels['items']:
+        raise Exception(f"채널 {channel_id} 접근 실패 또는 존재하지 않음")
+
+    cache[key] = time.time()
+    os.makedirs(os.path.dirname(CHANNEL_CACHE_PATH), exist_ok=True)
+    with open(f"{CHANNEL_CACHE_PATH}.tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(f"{CHANNEL_CACHE_PATH}.tmp", CHANNEL_CACHE_PATH)
+
+
+def video_body(options, config):
+    """업로드할 영상 리소스 (snippet, status)"""
+    return {
         'snippet': {
             'title': options['title'],
             'description': options['description'],
@@ -97,6 +221,13 @@ def initialize_upload(youtube, options, config):
         }
     }
 
+
+def initialize_upload(youtube, options, config):
+    """브랜드 계정 업로드 초기화"""
+    body = video_body(options, config)
+
+    # 1600 units; fails here instead of after the upload when today's budget is spent
+    ratelimit.youtube.charge("videos.insert")
     insert_request = youtube.videos().insert(
         part=",".join(body.keys()),
         body=body,
@@ -203,22 +334,14 @@ def get_brand_credentials(config):
 def upload_video_brand(video_path, title, description, category, keywords, config):
     """브랜드 계정 전용 업로드 함수"""
     try:
-        # 브랜드 계정 인증
-        credentials = get_brand_credentials(config)
-        youtube = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
-                       http=credentials.authorize(httplib2.Http()))
-
-        # 채널 확인
-        channels = youtube.channels().list(
-            id=config['channel_id'],
-            part='snippet'
-        ).execute()
-        
-        if not channels['items']:
-            raise Exception(f"채널 {config['channel_id']} 접근 실패 또는 존재하지 않음")
+        # 브랜드 계정 인증 (클라이언트와 연결은 업로드 간에 재사용)
+        client = get_client(config)
+
+        # 채널 확인 (캐시된 결과가 있으면 API 호출 생략)
+        validate_channel(client, config['channel_id'])
 
         # 업로드 실행
-        response = initialize_upload(youtube, {
+        response = initialize_upload(client.fresh(), {
             'file': video_path,
             'title': title,
             'description': description,
@@ -231,4 +354,56 @@ def upload_video_brand(video_path, title, description, category, keywords, confi
 
     except HttpError as e:
         print(colored(f"[HTTP 오류] {e.resp.status}: {e.content}", "red"))
-        raise
\ No newline at end of file
+        if e.resp.status == 403 and b"quotaExceeded" in (e.content or b""):
+            ratelimit.youtube.exhaust()
+        if e.resp.status == 401:
+            # revoked token: authenticate again on the next upload
+            with _clients_lock:
+                _clients.pop(config['credentials_path'], None)
+        raise
+
+
+class AuthorizedTransport(RequestsTransport):
+    """
+    RequestsTransport with the brand account's OAuth token, refreshed before it expires.
+    """
+
+    def __init__(self, credentials):
+        super().__init__()
+        self.credentials = credentials
+
+    def headers(self):
+        refresh_if_expiring(self.credentials)
+        return {"Authorization": f"Bearer {self.credentials.access_token}"}
+
+
+def upload_video_brand_streaming(render, video_path, title, description, category, keywords, config):
+    """
+    브랜드 계정 업로드, 인코딩과 동시에 진행
+
+    Args:
+        render (Callable[[], str]): Writes a fragmented MP4 to video_path
+            (generate_video with fragmented=True).
+        video_path (str): The file the render writes.
+
+    Returns:
+        dict: The uploaded video resource.
+    """
+    client = get_client(config)
+
+    # 채널 확인 (렌더링 시작 전에 실패하도록)
+    validate_channel(client, config['channel_id'])
+
+    body = video_body({
+        'title': title,
+        'description': description,
+        'category': category,
+        'keywords': keywords
+    }, config)
+    ratelimit.youtube.charge("videos.insert")
+    transport = AuthorizedTransport(client.credentials)
+    session_url = start_session(transport, body)
+    response = stream_upload(render, video_path, session_url, transport)
+
+    print(colored(f"[업로드 성공] Video ID: {response['id']}", "green"))
+    return response